@@ -10,12 +10,39 @@ FULL FIX:
 """
 
 import os
+import gc
+import sys
+import csv
+import gzip
 import json
+import math
 import time
+import random
+import logging
+import logging.handlers
+import bisect
+import heapq
+import argparse
+import atexit
+import tempfile
+import hmac
+import marshal
+import multiprocessing
+import cProfile
+import functools
+import hashlib
+import queue
+import threading
 import unicodedata
-from typing import Dict, List, Tuple, Any
+from collections import OrderedDict, deque
+from itertools import islice
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Any, Optional, Iterable, Iterator, Deque
 
-from flask import Flask, request, jsonify, render_template_string
+from urllib.parse import urlencode, quote
+from flask import (Flask, Response, request, jsonify, render_template_string, make_response, has_request_context,
+                   redirect, g)
+from werkzeug.wsgi import ClosingIterator
 
 # ===== dotenv (local) =====
 try:
@@ -24,18 +51,64 @@ try:
 except Exception:
     pass
 
+# ===== encoder / nén tuỳ chọn (không có thì dùng json + gzip chuẩn) =====
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+try:
+    import brotli
+except Exception:
+    brotli = None
+
+try:
+    import msgpack
+except Exception:
+    msgpack = None
+
 import gspread
+import requests
 from oauth2client.service_account import ServiceAccountCredentials
 
+# ===== multi-tenant: file này được nạp thêm 1 module riêng cho mỗi shop,
+# kèm _TENANT_CONFIG (xem phần Multi-tenant ở cuối file) =====
+_TENANT: Dict[str, Any] = globals().get("_TENANT_CONFIG") or {}
+TENANT_NAME = str(_TENANT.get("name", ""))
+# process con của pool parse song song (spawn nạp lại file này): chỉ cần hàm parse,
+# không mở access log / trace, không warm-up, không dựng tenant
+_PARSE_CHILD = multiprocessing.parent_process() is not None
+
+def _cfg(key: str, env: str, default: str = "") -> str:
+    """Cấu hình riêng của tenant nếu có, không thì lấy từ env."""
+    if key in _TENANT:
+        return str(_TENANT[key]).strip()
+    return os.getenv(env, default).strip()
+
 APP_SECRET_KEY = os.getenv("APP_SECRET_KEY", "devkey").strip()
 
-GOOGLE_SHEET_ID  = os.getenv("GOOGLE_SHEET_ID", "").strip()
-GOOGLE_SHEET_TAB = os.getenv("GOOGLE_SHEET_TAB", "Book Shopee").strip()
-CREDS_JSON_RAW   = os.getenv("GOOGLE_SHEETS_CREDS_JSON", "").strip()
+GOOGLE_SHEET_ID  = _cfg("sheet_id", "GOOGLE_SHEET_ID")
+GOOGLE_SHEET_TAB = _cfg("tab", "GOOGLE_SHEET_TAB", "Book Shopee")
+CREDS_JSON_RAW   = _cfg("creds_json", "GOOGLE_SHEETS_CREDS_JSON")
+# trỏ gspread vào API giả lập local (sheets_sim.py), vd http://127.0.0.1:8089 -> không cần creds
+SHEETS_API_BASE  = _cfg("sheets_api_base", "SHEETS_API_BASE").rstrip("/")
+
+# token cho các API nội bộ của shop (thống kê, debug...)
+ADMIN_TOKEN = _cfg("admin_token", "ADMIN_TOKEN")
+
+# secret ký HMAC cho webhook refresh (Apps Script onEdit gọi về)
+REFRESH_WEBHOOK_SECRET = _cfg("webhook_secret", "REFRESH_WEBHOOK_SECRET")
+
+# nhân bản snapshot giữa các instance (xem mục Replication):
+# REPLICATION_ROLE=primary -> instance này fetch Google + phát snapshot
+# REPLICA_OF=<URL primary>  -> instance này chỉ kéo snapshot từ primary, không gọi Google
+REPLICATION_ROLE   = _cfg("replication_role", "REPLICATION_ROLE").lower()
+REPLICA_OF         = _cfg("replica_of", "REPLICA_OF").rstrip("/")
+REPLICATION_SECRET = _cfg("replication_secret", "REPLICATION_SECRET")
 
 # ✅ Banner theo yêu cầu
-BRAND_BANNER  = "NgânMiu.Store - Check Đơn Hàng Shopee"
-BRAND_FOOTER  = "© NgânMiu.Store – Tra cứu đơn hàng Shopee"
+BRAND_BANNER  = _TENANT.get("banner") or "NgânMiu.Store - Check Đơn Hàng Shopee"
+BRAND_FOOTER  = _TENANT.get("footer") or "© NgânMiu.Store – Tra cứu đơn hàng Shopee"
 
 app = Flask(__name__)
 app.secret_key = APP_SECRET_KEY
@@ -51,27 +124,115 @@ def _norm(s: str) -> str:
     s = " ".join(s.split())
     return s
 
+def _fold(s: str) -> str:
+    """_norm + đ -> d (NFD không tách được đ): so trạng thái "Đã giao" với "da giao"."""
+    return _norm(s).replace("đ", "d")
+
 def _safe(s: Any) -> str:
     return "" if s is None else str(s)
 
-def _money_vnd(x: Any) -> str:
+def _money_int(x: Any) -> Optional[int]:
     """
     COD có thể là: 8000, '8000', '8.000', '8,000', '8000đ', ''
-    -> format '8.000đ'
+    -> 8000 (None nếu không có số)
     """
     s = _safe(x).strip()
     if not s:
-        return ""
+        return None
     digits = "".join(ch for ch in s if ch.isdigit())
     if not digits:
-        return ""
+        return None
     try:
-        n = int(digits)
+        return int(digits)
     except Exception:
+        return None
+
+def _money_vnd(x: Any) -> str:
+    """
+    COD có thể là: 8000, '8000', '8.000', '8,000', '8000đ', ''
+    -> format '8.000đ'
+    """
+    n = x if isinstance(x, int) else _money_int(x)
+    if n is None:
         return ""
     return f"{n:,}".replace(",", ".") + "đ"
 
 
+# =========================================================
+# Rate limit /api/search (token bucket theo IP, in-process)
+# =========================================================
+RATE_LIMIT_RPS   = float(os.getenv("RATE_LIMIT_RPS", "2"))     # token nạp lại / giây
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "10"))  # dung lượng bucket
+RATE_LIMIT_KEYS  = int(os.getenv("RATE_LIMIT_MAX_KEYS", "10000"))
+# số proxy tin cậy đứng trước app (Vercel = 1). 0 -> bỏ qua X-Forwarded-For
+TRUSTED_PROXY_COUNT = int(os.getenv("TRUSTED_PROXY_COUNT", "1"))
+
+class _RateLimiter:
+    """
+    Mỗi key 1 bucket [tokens, last_ts]. OrderedDict làm LRU:
+    key ít dùng nhất bị đẩy ra khi vượt max_keys -> RAM có giới hạn.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+        self.evicted = 0
+
+    def hit(self, key: str) -> float:
+        """Return 0 nếu được phép, ngược lại số giây cần chờ."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            b = self._buckets.get(key)
+            if b is None:
+                b = [self.burst, now]
+                self._buckets[key] = b
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._buckets.move_to_end(key)
+                b[0] = min(self.burst, b[0] + (now - b[1]) * self.rate)
+                b[1] = now
+
+            if b[0] >= 1.0:
+                b[0] -= 1.0
+                self.allowed += 1
+                return 0.0
+            self.limited += 1
+            return (1.0 - b[0]) / self.rate
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "keys": len(self._buckets),
+            "evicted": self.evicted,
+            "rps": self.rate,
+            "burst": self.burst,
+        }
+
+_SEARCH_LIMITER = _RateLimiter(RATE_LIMIT_RPS, RATE_LIMIT_BURST, RATE_LIMIT_KEYS)
+
+def _client_ip() -> str:
+    """
+    X-Forwarded-For: client, proxy1, proxy2 — mỗi proxy tin cậy nối thêm 1 IP vào cuối.
+    Lấy IP thứ TRUSTED_PROXY_COUNT tính từ phải -> client không giả mạo được.
+    """
+    if TRUSTED_PROXY_COUNT > 0:
+        xff = request.headers.get("X-Forwarded-For", "")
+        parts = [p.strip() for p in xff.split(",") if p.strip()]
+        if len(parts) >= TRUSTED_PROXY_COUNT:
+            return parts[-TRUSTED_PROXY_COUNT]
+    return request.remote_addr or "?"
+
+
 # =========================================================
 # Google Sheet connect
 # =========================================================
@@ -79,9 +240,48 @@ _SHEET_CLIENT = None
 _SHEET_WS = None
 
 # cache dữ liệu sheet (giảm spam API)
+# KHÔNG giữ ma trận raw của gspread: fetch xong -> parse thẳng vào snapshot (_SNAP_*)
+# -> nhả từng dòng raw ngay sau khi parse (đỡ RAM trên Vercel)
 _CACHE_AT = 0.0
-_CACHE_TTL = 10.0  # giây
-_CACHE_VALUES = None
+_CACHE_LOCK = threading.RLock()
+
+# TTL tự điều chỉnh theo tần suất sheet thay đổi thật:
+# - fetch về mà dữ liệu y hệt -> giãn TTL (x1.5), tối đa _CACHE_TTL_MAX
+# - dữ liệu đổi -> rút TTL (/2), tối thiểu _CACHE_TTL_MIN
+_CACHE_TTL_MIN = float(_cfg("cache_ttl_min", "CACHE_TTL_MIN", "5"))
+_CACHE_TTL_MAX = float(_cfg("cache_ttl_max", "CACHE_TTL_MAX", "120"))
+_CACHE_TTL = float(_cfg("cache_ttl", "CACHE_TTL", "10"))  # giây, TTL hiện tại
+
+# có webhook -> sheet tự báo khi sửa, TTL chỉ còn là lưới an toàn (poll chậm)
+if REFRESH_WEBHOOK_SECRET:
+    _CACHE_TTL = _CACHE_TTL_MIN = _CACHE_TTL_MAX = float(_cfg("cache_safety_ttl", "CACHE_SAFETY_TTL", "300"))
+
+# replica: chu kỳ hỏi primary (không đổi -> 304, gần như không tốn gì)
+if REPLICA_OF:
+    _CACHE_TTL = _CACHE_TTL_MIN = _CACHE_TTL_MAX = float(_cfg("replication_pull_s", "REPLICATION_PULL_S", "5"))
+
+_CACHE_HASH: Optional[int] = None
+_FETCH_COUNT = 0
+_CHANGE_COUNT = 0
+_CHANGE_EWMA = 0.0       # tỉ lệ fetch có thay đổi (trung bình trượt)
+_CHANGE_TIMES: Deque[float] = deque(maxlen=3600)  # mốc thời gian các lần đổi (giữ 1 giờ gần nhất)
+
+# tăng mỗi lần dữ liệu thay đổi (full fetch hoặc patch từ webhook)
+_SNAPSHOT_VERSION = 0
+
+# trạng thái fetch gần nhất, cho readiness probe đọc (không gọi Google)
+_FETCH_STATE: Dict[str, Any] = {"last_ok_at": 0.0, "last_fetch_ms": None,
+                                "last_error": "", "last_error_at": 0.0, "errors": 0}
+
+_GOOGLE_API_ORIGIN = "https://sheets.googleapis.com"
+
+class _SimSession(requests.Session):
+    """Session cho gspread: đổi origin Google -> SHEETS_API_BASE, không gắn OAuth."""
+
+    def request(self, method, url, *args, **kwargs):
+        if url.startswith(_GOOGLE_API_ORIGIN):
+            url = SHEETS_API_BASE + url[len(_GOOGLE_API_ORIGIN):]
+        return super().request(method, url, *args, **kwargs)
 
 def _connect_sheet():
     global _SHEET_CLIENT, _SHEET_WS
@@ -91,6 +291,13 @@ def _connect_sheet():
     if not GOOGLE_SHEET_ID:
         raise RuntimeError("Thiếu GOOGLE_SHEET_ID trong .env")
 
+    if SHEETS_API_BASE:
+        _SHEET_CLIENT = gspread.authorize(None, session=_SimSession())
+        if FETCH_CHUNK_ROWS:
+            _SHEET_CLIENT.set_timeout(FETCH_CHUNK_TIMEOUT)
+        _SHEET_WS = _SHEET_CLIENT.open_by_key(GOOGLE_SHEET_ID).worksheet(GOOGLE_SHEET_TAB)
+        return
+
     if not CREDS_JSON_RAW:
         raise RuntimeError("Thiếu GOOGLE_SHEETS_CREDS_JSON trong .env")
 
@@ -105,25 +312,262 @@ def _connect_sheet():
     ]
     creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
     _SHEET_CLIENT = gspread.authorize(creds)
+    if FETCH_CHUNK_ROWS:
+        _SHEET_CLIENT.set_timeout(FETCH_CHUNK_TIMEOUT)  # chunk treo -> hết giờ, tải lại riêng chunk đó
 
     sh = _SHEET_CLIENT.open_by_key(GOOGLE_SHEET_ID)
     _SHEET_WS = sh.worksheet(GOOGLE_SHEET_TAB)
 
-def _get_all_values_cached() -> List[List[str]]:
-    global _CACHE_AT, _CACHE_VALUES
-    now = time.time()
-    if _CACHE_VALUES is not None and (now - _CACHE_AT) < _CACHE_TTL:
-        return _CACHE_VALUES
+def _fetch_values() -> List[List[str]]:
+    return _fetch_values_hashed()[0]
+
+def _fetch_values_hashed() -> Tuple[List[List[str]], Optional[List[int]]]:
+    """Cả sheet. Tab lớn + FETCH_CHUNK_ROWS -> tải theo chunk, kèm hash từng dòng đã tính sẵn."""
     _connect_sheet()
-    vals = _SHEET_WS.get_all_values()
-    _CACHE_VALUES = vals
-    _CACHE_AT = now
-    return vals
+    total = int(getattr(_SHEET_WS, "row_count", 0) or 0)
+    if FETCH_CHUNK_ROWS and total > FETCH_CHUNK_ROWS:
+        return _fetch_chunked(total)
+    return _SHEET_WS.get_all_values(), None
+
+
+# =========================================================
+# Tab rất lớn: tải cả sheet theo chunk dòng song song thay vì 1 get_all_values khổng lồ
+# FETCH_CHUNK_ROWS=20000 -> sheet (theo metadata) > 20000 dòng thì chia A1:ZZ20000, A20001:ZZ40000, ...
+# chunk cuối mở tới hết sheet: dòng thêm sau lúc đọc metadata vẫn lấy đủ
+# - FETCH_CHUNK_WORKERS chunk tải cùng lúc; chunk lỗi / quá FETCH_CHUNK_TIMEOUT chỉ tải lại
+#   chunk đó (FETCH_CHUNK_RETRIES lần, backoff), chunk khác không phải tải lại
+# - chunk về tới đâu ghép vào chỗ + hash dòng tới đó (trong lúc chờ chunk khác)
+# - mỗi chunk = 1 read request, tính vào quota Google (mặc định 60/phút/user) -> chunk đừng nhỏ quá
+# =========================================================
+FETCH_CHUNK_ROWS = int(_cfg("fetch_chunk_rows", "FETCH_CHUNK_ROWS", "0"))  # 0 = tắt, get_all_values như cũ
+FETCH_CHUNK_WORKERS = int(os.getenv("FETCH_CHUNK_WORKERS", "4"))
+FETCH_CHUNK_RETRIES = int(os.getenv("FETCH_CHUNK_RETRIES", "3"))
+FETCH_CHUNK_TIMEOUT = float(os.getenv("FETCH_CHUNK_TIMEOUT", "30"))
+
+_CHUNK_STATS: Dict[str, Any] = {"fetches": 0, "chunks": 0, "retries": 0, "failed": 0,
+                                "last_chunks": 0, "last_slowest_ms": None}
+
+def _fetch_chunk(a: int, b: int) -> Tuple[List[List[str]], float]:
+    """Dòng a..b (1-based, b=0: tới hết sheet), có retry. Return (rows, ms)."""
+    rng = f"A{a}:ZZ{b}" if b else f"A{a}:ZZ"
+    t0 = time.perf_counter()
+    for attempt in range(FETCH_CHUNK_RETRIES + 1):
+        try:
+            return _SHEET_WS.get_values(rng), (time.perf_counter() - t0) * 1000.0
+        except Exception:
+            if attempt >= FETCH_CHUNK_RETRIES:
+                raise
+            _CHUNK_STATS["retries"] += 1
+            time.sleep(min(8.0, 0.5 * 2 ** attempt) * (0.5 + random.random()))
+
+def _fetch_chunked(total: int) -> Tuple[List[List[str]], List[int]]:
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    bounds = [(a, a + FETCH_CHUNK_ROWS - 1) for a in range(1, total - FETCH_CHUNK_ROWS + 1, FETCH_CHUNK_ROWS)]
+    bounds.append((len(bounds) * FETCH_CHUNK_ROWS + 1, 0))
+    parts: List[Any] = [None] * len(bounds)
+    hparts: List[Any] = [None] * len(bounds)
+    slowest = 0.0
+    ex = ThreadPoolExecutor(max(1, min(FETCH_CHUNK_WORKERS, len(bounds))), thread_name_prefix="fetch-chunk")
+    try:
+        futs = {ex.submit(_fetch_chunk, a, b): i for i, (a, b) in enumerate(bounds)}
+        for fut in as_completed(futs):
+            i = futs[fut]
+            rows, ms = fut.result()  # chunk hết lượt retry vẫn lỗi -> cả lần fetch lỗi, giữ snapshot cũ
+            a, b = bounds[i]
+            if b:
+                # dòng trắng cuối range API không trả -> đệm lại cho đúng số dòng
+                rows.extend([] for _ in range(b - a + 1 - len(rows)))
+            parts[i] = rows
+            hparts[i] = [_row_hash(row) for row in rows]
+            slowest = max(slowest, ms)
+    except Exception:
+        _CHUNK_STATS["failed"] += 1
+        ex.shutdown(wait=False, cancel_futures=True)
+        raise
+    ex.shutdown()
+
+    values = [row for p in parts for row in p]
+    hashes = [h for p in hparts for h in p]
+    del parts, hparts
+    while hashes and hashes[-1] == _EMPTY_ROW_HASH:  # get_all_values không trả dòng trắng cuối
+        values.pop()
+        hashes.pop()
+    _CHUNK_STATS["fetches"] += 1
+    _CHUNK_STATS["chunks"] += len(bounds)
+    _CHUNK_STATS.update(last_chunks=len(bounds), last_slowest_ms=round(slowest, 1))
+    return values, hashes
+
+def _refresh_snapshot(force: bool = False) -> bool:
+    """
+    Hết TTL (hoặc force) -> fetch cả sheet, có đổi thì cập nhật snapshot.
+    Return True nếu snapshot đổi.
+    """
+    global _CACHE_AT
+    if not force and _SNAP_BUILT_VERSION >= 0 and (time.time() - _CACHE_AT) < _CACHE_TTL:
+        return False
+    with _CACHE_LOCK:
+        now = time.time()
+        if not force and _SNAP_BUILT_VERSION >= 0 and (now - _CACHE_AT) < _CACHE_TTL:
+            return False
+        if REPLICA_OF:
+            return _repl_pull(now)
+        with _profile_run("refresh"):
+            # tiering: trong COLD_TTL chỉ tải vùng hot
+            hot_only = HOT_ROWS > 0 and not force and _SNAP_BUILT_VERSION >= 0 and (now - _COLD_AT) < COLD_TTL
+            t0 = time.perf_counter()
+            hashes = None
+            try:
+                if hot_only:
+                    vals = _fetch_hot_rows()
+                else:
+                    vals, hashes = _fetch_values_hashed()
+            except Exception as e:
+                _FETCH_STATE["last_error"] = str(e)
+                _FETCH_STATE["last_error_at"] = time.time()
+                _FETCH_STATE["errors"] += 1
+                raise
+            _FETCH_STATE["last_fetch_ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+            _FETCH_STATE["last_ok_at"] = time.time()
+            _CACHE_AT = now
+            if hot_only:
+                return _load_hot(vals, now)
+            return _load_full(vals, now, hashes)
+
+def _load_full(vals: List[List[str]], now: float, hashes: Optional[List[int]] = None) -> bool:
+    """values cả sheet -> snapshot. Return True nếu snapshot đổi."""
+    global _COLD_AT
+    with _CACHE_LOCK:
+        if not HOT_ROWS:
+            return _load_values(vals, now, hashes=hashes)
+
+        # refresh full có tiering: dòng cold đã rời RAM -> build lại từ đầu vào dict mới,
+        # tách cold xong mới đưa hot + archive mới ra cùng lúc (request vẫn đọc bản cũ)
+        _snap_reset()
+        _load_values(vals, now, rebuild=True, hashes=hashes, publish=False)
+        _compact_cold(_SNAPSHOT_VERSION)
+        _COLD_AT = now
+        return True
+
+def _load_values(values: List[List[str]], now: float, rebuild: bool = False,
+                 hashes: Optional[List[int]] = None, publish: bool = True) -> bool:
+    """
+    Đưa ma trận values (get_all_values) vào snapshot.
+    values bị tiêu thụ: dòng nào parse xong bị set None.
+    rebuild=True: build kể cả khi dữ liệu không đổi (snapshot vừa bị reset).
+    hashes: _row_hash từng dòng nếu đã tính sẵn (fetch theo chunk).
+    """
+    global _SNAPSHOT_VERSION
+    with _CACHE_LOCK:
+        if hashes is None:
+            hashes = [_row_hash(row) for row in values]
+        changed = _track_change(_sheet_digest(hashes), now)
+        if not changed and not rebuild and _SNAP_BUILT_VERSION >= 0:
+            _repl_on_load(values, hashes, _SNAPSHOT_VERSION, changed=False)
+            return False
+        _SNAPSHOT_VERSION += 1
+        _repl_on_load(values, hashes, _SNAPSHOT_VERSION, full=rebuild or _SNAP_BUILT_VERSION < 0)
+        _build_snapshot(values, hashes, _SNAPSHOT_VERSION, publish)
+        return True
+
+# hash 1 dòng bỏ ô rỗng cuối: get_values(range) không pad như get_all_values
+_EMPTY_ROW_HASH = hash(())
+
+def _row_hash(row: List[str]) -> int:
+    n = len(row)
+    while n and not row[n - 1]:
+        n -= 1
+    return hash(tuple(row[:n])) if n else _EMPTY_ROW_HASH
+
+# digest cả sheet = tổng hash (dòng, nội dung) -> vá được theo từng dòng
+_DIGEST_MASK = (1 << 64) - 1
+
+def _digest_term(r: int, h: int) -> int:
+    return 0 if h == _EMPTY_ROW_HASH else hash((r, h)) & _DIGEST_MASK
+
+def _sheet_digest(hashes: List[int]) -> int:
+    return sum(_digest_term(r, h) for r, h in enumerate(hashes)) & _DIGEST_MASK
+
+def _track_change(digest: int, now: float) -> bool:
+    """Ghi nhận 1 lần fetch, chỉnh _CACHE_TTL. Return True nếu dữ liệu khác lần trước."""
+    global _CACHE_HASH, _CACHE_TTL, _FETCH_COUNT, _CHANGE_COUNT, _CHANGE_EWMA
+    first = _CACHE_HASH is None
+    changed = digest != _CACHE_HASH
+    _CACHE_HASH = digest
+    _FETCH_COUNT += 1
+    if first:
+        return True
+
+    _CHANGE_EWMA = 0.8 * _CHANGE_EWMA + 0.2 * (1.0 if changed else 0.0)
+    if changed:
+        _CHANGE_COUNT += 1
+        _CHANGE_TIMES.append(now)
+        _CACHE_TTL = max(_CACHE_TTL_MIN, _CACHE_TTL / 2.0)
+    else:
+        _CACHE_TTL = min(_CACHE_TTL_MAX, _CACHE_TTL * 1.5)
+    while _CHANGE_TIMES and now - _CHANGE_TIMES[0] > 3600:
+        _CHANGE_TIMES.popleft()
+    return changed
+
+def _refresh_stats() -> Dict[str, Any]:
+    return {
+        "interval": round(_CACHE_TTL, 2),
+        "interval_min": _CACHE_TTL_MIN,
+        "interval_max": _CACHE_TTL_MAX,
+        "fetches": _FETCH_COUNT,
+        "changes": _CHANGE_COUNT,
+        "change_ratio": round(_CHANGE_EWMA, 3),
+        "changes_last_hour": len(_CHANGE_TIMES),
+        "version": _SNAPSHOT_VERSION,
+        "chunked": dict(_CHUNK_STATS, chunk_rows=FETCH_CHUNK_ROWS) if FETCH_CHUNK_ROWS else None,
+    }
+
+def _refresh_rows(row_start: int, row_end: int) -> int:
+    """
+    Chỉ tải lại các dòng [row_start..row_end] (1-based, giống số dòng trên sheet)
+    rồi vá thẳng vào snapshot. Return số dòng đã vá.
+    Chưa có snapshot / sửa vào vùng header -> tải full luôn.
+    """
+    global _SNAPSHOT_VERSION, _COLD_AT
+    if row_start < 1 or row_end < row_start:
+        raise ValueError("Khoảng dòng không hợp lệ")
+
+    with _CACHE_LOCK:
+        # replica: không tự gọi Google, kéo bản mới nhất từ primary
+        if REPLICA_OF or _SNAP_BUILT_VERSION < 0 or row_start <= _HEADER_SCAN_ROWS:
+            _refresh_snapshot(force=True)
+            return _SNAP_LEN
+        if HOT_ROWS and row_start - 1 < _HOT_START:
+            # sửa vào đơn cũ đã nằm trong archive -> lần refresh tới làm full + compact lại
+            _COLD_AT = 0.0
+            _refresh_snapshot(force=True)
+            return _SNAP_LEN
+
+        _connect_sheet()
+        fresh = _SHEET_WS.get_values(f"{row_start}:{row_end}")
+        # dòng bị xoá trắng -> API không trả về -> coi như rỗng
+        rows = [fresh[i] if i < len(fresh) else [] for i in range(row_end - row_start + 1)]
+
+        _SNAPSHOT_VERSION += 1
+        digest = _patch_snapshot(row_start - 1, rows, _SNAPSHOT_VERSION)
+        # digest vá theo dòng -> lần poll sau so sánh đúng, không tính đổi 2 lần
+        _track_change(digest, time.time())
+        return len(rows)
+
+def _sign_payload(body: bytes) -> str:
+    return "sha256=" + hmac.new(REFRESH_WEBHOOK_SECRET.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+def _verify_signature(body: bytes, sig: str) -> bool:
+    if not REFRESH_WEBHOOK_SECRET or not sig:
+        return False
+    return hmac.compare_digest(_sign_payload(body), sig.strip())
 
 
 # =========================================================
 # Detect header row + map columns
 # =========================================================
+_HEADER_SCAN_ROWS = 10
+
 def _detect_header_row(values: List[List[str]]) -> int:
     """
     Scan 1..10 rows để tìm row có nhiều header đặc trưng.
@@ -133,7 +577,7 @@ def _detect_header_row(values: List[List[str]]) -> int:
         return 2
 
     candidates = []
-    max_scan = min(10, len(values))
+    max_scan = min(_HEADER_SCAN_ROWS, len(values))
     for r in range(max_scan):
         row = values[r]
         joined = " | ".join(_norm(c) for c in row if c)
@@ -221,84 +665,1528 @@ def _build_card(item: Dict[str, str], idx: int) -> Dict[str, str]:
 
     return {"html": "\n".join(html), "mvd_copy": mvd_copy}
 
+def _item_card(it: Dict[str, Any], idx: int) -> Dict[str, str]:
+    return _build_card({
+        "mvd": it.get("mvd", ""),
+        "status": it.get("status", ""),
+        "product": it.get("product", ""),
+        "cod": it.get("cod", ""),
+        "name": it.get("receiver", ""),
+        "phone": it.get("phone", ""),
+        "addr": it.get("addr", ""),
+    }, idx)
+
 
 # =========================================================
 # Read & search rows
 # =========================================================
-def _read_items_from_sheet() -> Tuple[List[Dict[str, str]], str]:
-    values = _get_all_values_cached()
-    if not values or len(values) < 2:
-        return [], "Sheet rỗng"
+_COL_WANTS = {
+    "name":    ["Tên", "ten"],
+    "mvd":     ["MVĐ", "MVD", "mvd", "mã vận đơn", "ma van don"],
+    "status":  ["Trạng thái", "trang thai"],
+    "phone":   ["SĐT nhận", "SDT nhận", "sdt nhan", "so dt nhan"],
+    "addr":    ["Địa chỉ", "dia chi"],
+    "recv":    ["Người nhận", "nguoi nhan"],
+    "prod":    ["Sản Phẩm", "Sản phẩm", "san pham", "SP"],
+    "cod":     ["COD", "cod"],
+}
 
-    hdr_idx = _detect_header_row(values)
-    if hdr_idx >= len(values):
-        hdr_idx = 0
+def _parse_row(row: List[str], cols: Dict[str, int], r: int) -> Optional[Dict[str, Any]]:
+    if not any(c.strip() for c in row):
+        return None
+
+    def get(col: int) -> str:
+        if col < 0:
+            return ""
+        return row[col].strip() if col < len(row) else ""
+
+    name_row = get(cols["name"])
+    if not name_row:
+        return None
+
+    cod_n = _money_int(get(cols["cod"]))
+    return {
+        "_row": r,  # ✅ dùng để sort mới→cũ
+        "name_key": name_row,
+        "receiver": get(cols["recv"]),
+        "mvd": get(cols["mvd"]),
+        # trạng thái chỉ vài giá trị lặp lại -> intern, 1 object dùng chung
+        "status": sys.intern(get(cols["status"])),
+        "phone": get(cols["phone"]),
+        "addr": get(cols["addr"]),
+        "product": get(cols["prod"]),
+        "cod": _money_vnd(cod_n),
+        "cod_n": cod_n or 0,
+    }
 
-    header = values[hdr_idx]
-    mp = _build_header_map(header)
+def _phone_key(s: str) -> str:
+    d = "".join(ch for ch in s if ch.isdigit())
+    if d.startswith("84") and len(d) >= 11:
+        d = "0" + d[2:]
+    return d
 
-    col_name   = _pick_col(mp, ["Tên", "ten"])
-    col_mvd    = _pick_col(mp, ["MVĐ", "MVD", "mvd", "mã vận đơn", "ma van don"])
-    col_status = _pick_col(mp, ["Trạng thái", "trang thai"])
-    col_phone  = _pick_col(mp, ["SĐT nhận", "SDT nhận", "sdt nhan", "so dt nhan"])
-    col_addr   = _pick_col(mp, ["Địa chỉ", "dia chi"])
-    col_recv   = _pick_col(mp, ["Người nhận", "nguoi nhan"])
-    col_prod   = _pick_col(mp, ["Sản Phẩm", "Sản phẩm", "san pham", "SP"])
-    col_cod    = _pick_col(mp, ["COD", "cod"])
+def _mvd_key(s: str) -> str:
+    return "".join(s.split()).upper()
 
-    items = []
-    for r in range(hdr_idx + 1, len(values)):
-        row = values[r]
-        if not any(c.strip() for c in row):
-            continue
 
-        def get(col: int) -> str:
-            if col < 0:
-                return ""
-            return row[col].strip() if col < len(row) else ""
+# =========================================================
+# Snapshot đã parse + index, cập nhật theo từng dòng
+# =========================================================
+# dòng (0-based) -> item / hash nội dung dòng
+_SNAP_ITEMS: Dict[int, Dict[str, Any]] = {}
+_SNAP_ROW_HASH: Dict[int, int] = {}
+# key chuẩn hoá -> dòng (int nếu chỉ 1 dòng, set nếu nhiều: SĐT/MVĐ gần như
+# luôn duy nhất, 1 set rỗng ~200 byte x vài trăm nghìn dòng là đáng kể)
+_IDX_NAME: Dict[str, Any] = {}
+_IDX_PHONE: Dict[str, Any] = {}
+_IDX_MVD: Dict[str, Any] = {}
+
+_SNAP_BUILT_VERSION = -1
+_SNAP_HEADER: Tuple[int, Tuple[Tuple[str, int], ...]] = (-1, ())
+_SNAP_COLS: Dict[str, int] = {}
+_SNAP_LEN = 0
+_SNAP_DIGEST = 0
+_SNAP_LAST_SYNC: Dict[str, Any] = {}
+# request đọc snapshot qua _HOT_TIER (xem _snap_publish); build lại từ đầu thì
+# dựng vào dict mới rồi mới gán lại 1 lần dưới lock này -> không ai thấy index dở dang.
+# Vá dòng (webhook / vùng hot / refresh có diff) thì copy-on-write (_snap_begin_edit):
+# dict đã publish không bao giờ bị sửa nữa
+_SNAP_LOCK = threading.Lock()
+_SNAP_COW = False  # True: set dòng trong index còn dùng chung với bản đã publish -> sửa trên bản sao
+
+def _index_add(idx: Dict[str, Any], key: str, r: int):
+    if not key:
+        return
+    cur = idx.get(key)
+    if cur is None:
+        idx[key] = r
+    elif isinstance(cur, set):
+        if _SNAP_COW:
+            idx[key] = cur | {r}
+        else:
+            cur.add(r)
+    elif cur != r:
+        idx[key] = {cur, r}
+
+def _index_remove(idx: Dict[str, Any], key: str, r: int):
+    cur = idx.get(key)
+    if cur is None:
+        return
+    if isinstance(cur, set):
+        if _SNAP_COW:
+            cur = idx[key] = cur - {r}
+        else:
+            cur.discard(r)
+        if len(cur) == 1:
+            idx[key] = next(iter(cur))
+    elif cur == r:
+        del idx[key]
+
+def _index_get(idx: Dict[str, Any], key: str) -> Any:
+    """Tập dòng của key (set hoặc tuple 1 phần tử), không có -> ()."""
+    cur = idx.get(key)
+    if cur is None:
+        return ()
+    return cur if isinstance(cur, set) else (cur,)
 
-        name_row = get(col_name)
-        if not name_row:
+# =========================================================
+# Tổng hợp đơn (đếm theo trạng thái, tổng COD, thiếu MVĐ)
+# cộng/trừ theo từng dòng trong _snap_put -> luôn khớp snapshot
+# =========================================================
+# trạng thái coi là đã xong (không còn COD chờ thu), so với _fold(status)
+_DONE_STATUS = ("da giao", "giao thanh cong", "hoan", "huy")
+
+def _agg_new() -> Dict[str, Any]:
+    return {"orders": 0, "cod_total": 0, "cod_pending": 0,
+            "missing_mvd": 0, "missing_mvd_cod": 0, "by_status": {}}
+
+_AGG: Dict[str, Any] = _agg_new()
+_MISSING_MVD_ROWS: set = set()
+
+def _agg_apply(it: Dict[str, Any], sign: int, agg: Optional[Dict[str, Any]] = None):
+    """Cộng (sign=+1) / trừ (-1) 1 đơn vào agg (mặc định _AGG của snapshot)."""
+    main = agg is None
+    if main:
+        agg = _AGG
+    cod = it.get("cod_n", 0)
+    missing = not it.get("mvd")
+    st_norm = _fold(it.get("status", ""))
+    pending = not any(k in st_norm for k in _DONE_STATUS)
+
+    agg["orders"] += sign
+    agg["cod_total"] += sign * cod
+    if pending:
+        agg["cod_pending"] += sign * cod
+    if missing:
+        agg["missing_mvd"] += sign
+        agg["missing_mvd_cod"] += sign * cod
+        if main and sign > 0:
+            _MISSING_MVD_ROWS.add(it["_row"])
+        elif main:
+            _MISSING_MVD_ROWS.discard(it["_row"])
+
+    key = it.get("status", "") or "(trống)"
+    b = agg["by_status"].get(key)
+    if b is None:
+        b = agg["by_status"][key] = {"orders": 0, "cod": 0, "missing_mvd": 0}
+    b["orders"] += sign
+    b["cod"] += sign * cod
+    b["missing_mvd"] += sign * missing
+    if b["orders"] <= 0:
+        del agg["by_status"][key]
+
+def _agg_merge(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    out = _agg_new()
+    for src in (a, b):
+        if not src:
             continue
+        for k in ("orders", "cod_total", "cod_pending", "missing_mvd", "missing_mvd_cod"):
+            out[k] += src[k]
+        for st, v in src["by_status"].items():
+            d = out["by_status"].setdefault(st, {"orders": 0, "cod": 0, "missing_mvd": 0})
+            for k in d:
+                d[k] += v[k]
+    return out
+
+def _snap_put(r: int, it: Optional[Dict[str, Any]]):
+    old = _SNAP_ITEMS.pop(r, None)
+    if old is not None:
+        _index_remove(_IDX_NAME, old["name_norm"], r)
+        _index_remove(_IDX_PHONE, _phone_key(old["phone"]), r)
+        _index_remove(_IDX_MVD, _mvd_key(old["mvd"]), r)
+        _agg_apply(old, -1)
+    if it is None:
+        if old is not None:
+            _watch_log(r, old, None)
+        return
+    it["name_norm"] = _norm(it["name_key"])
+    _SNAP_ITEMS[r] = it
+    _index_add(_IDX_NAME, it["name_norm"], r)
+    _index_add(_IDX_PHONE, _phone_key(it["phone"]), r)
+    _index_add(_IDX_MVD, _mvd_key(it["mvd"]), r)
+    _agg_apply(it, +1)
+    if old != it:
+        _watch_log(r, old, it)
+
+def _snap_reset():
+    """Bắt đầu build lại từ đầu vào dict mới; bản cũ vẫn phục vụ request tới lúc _snap_publish."""
+    global _SNAP_ITEMS, _SNAP_ROW_HASH, _IDX_NAME, _IDX_PHONE, _IDX_MVD, _MISSING_MVD_ROWS, _AGG
+    global _SNAP_LEN, _SNAP_COW
+    _SNAP_ITEMS, _SNAP_ROW_HASH = {}, {}
+    _IDX_NAME, _IDX_PHONE, _IDX_MVD = {}, {}, {}
+    _MISSING_MVD_ROWS = set()
+    _AGG = _agg_new()
+    _SNAP_LEN = 0
+    _SNAP_COW = False
+
+def _snap_begin_edit():
+    """
+    Trước khi vá snapshot đang được đọc: chép nông items / index / tổng hợp rồi vá trên bản sao,
+    _snap_publish đổi sang cùng lúc -> request không bao giờ thấy 1 lần vá nhiều dòng làm dở.
+    Đang build vào dict mới (chưa publish) thì không cần chép.
+    """
+    global _SNAP_ITEMS, _IDX_NAME, _IDX_PHONE, _IDX_MVD, _MISSING_MVD_ROWS, _AGG, _SNAP_COW
+    if _SNAP_ITEMS is not _HOT_TIER.get("items"):
+        return
+    _SNAP_COW = bool(_SNAP_ITEMS)  # bản publish trống -> không có set nào dùng chung
+    _SNAP_ITEMS = dict(_SNAP_ITEMS)
+    _IDX_NAME, _IDX_PHONE, _IDX_MVD = dict(_IDX_NAME), dict(_IDX_PHONE), dict(_IDX_MVD)
+    _MISSING_MVD_ROWS = set(_MISSING_MVD_ROWS)
+    _AGG = dict(_AGG, by_status={k: dict(v) for k, v in _AGG["by_status"].items()})
 
-        it = {
-            "_row": r,  # ✅ dùng để sort mới→cũ
-            "name_key": name_row,
-            "receiver": get(col_recv),
-            "mvd": get(col_mvd),
-            "status": get(col_status),
-            "phone": get(col_phone),
-            "addr": get(col_addr),
-            "product": get(col_prod),
-            "cod": _money_vnd(get(col_cod)),
-        }
+def _snap_publish(version: int):
+    """
+    Cho request thấy snapshot hiện tại (gọi sau mỗi lần build / vá xong).
+    Request lấy _HOT_TIER 1 lần rồi chỉ đọc qua đó -> luôn thấy 1 bản trọn vẹn.
+    """
+    global _HOT_TIER, _SNAP_BUILT_VERSION, _SNAP_COW
+    _SNAP_COW = False
+    tier = {"items": _SNAP_ITEMS, "name": _IDX_NAME, "phone": _IDX_PHONE, "mvd": _IDX_MVD,
+            "agg": _AGG, "missing": _MISSING_MVD_ROWS, "len": _SNAP_LEN, "version": version,
+            "cold": _COLD}  # archive đi cùng vùng hot đã tách ra nó
+    with _SNAP_LOCK:
+        _HOT_TIER = tier
+        _SNAP_BUILT_VERSION = version
+
+def _iter_release(values: List[Any], start: int) -> Iterator[Tuple[int, List[str]]]:
+    """Duyệt values từ start, dòng nào đã yield thì set None -> GC thu hồi dần."""
+    for r in range(start, len(values)):
+        row = values[r]
+        values[r] = None
+        yield r, row
+
+def _snap_row(r: int, row: List[str], h: int, cols: Dict[str, int]) -> str:
+    """Cập nhật 1 dòng dữ liệu. Return 'ins' / 'upd' / 'del' / '' (không đổi)."""
+    global _SNAP_DIGEST
+    old_h = _SNAP_ROW_HASH.get(r, _EMPTY_ROW_HASH)
+    if old_h == h and (r in _SNAP_ROW_HASH or h == _EMPTY_ROW_HASH):
+        return ""
+    _SNAP_DIGEST = (_SNAP_DIGEST - _digest_term(r, old_h) + _digest_term(r, h)) & _DIGEST_MASK
+    _SNAP_ROW_HASH[r] = h
+
+    existed = r in _SNAP_ITEMS
+    it = _parse_row(row, cols, r) if h != _EMPTY_ROW_HASH else None
+    _snap_put(r, it)
+    if it is None:
+        return "del" if existed else ""
+    return "upd" if existed else "ins"
+
+def _build_snapshot(values: List[List[str]], hashes: List[int], version: int, publish: bool = True):
+    """
+    Đồng bộ snapshot với 1 lần fetch full. So hash từng dòng với lần trước:
+    chỉ dòng thêm/sửa/xoá mới bị parse lại và vá index.
+    Header đổi (vị trí hoặc thứ tự cột) -> build lại từ đầu.
+    publish=False: người gọi còn xử lý tiếp (tách cold) rồi tự _snap_publish.
+    """
+    global _SNAP_HEADER, _SNAP_COLS, _SNAP_LEN, _SNAP_DIGEST, _SNAP_LAST_SYNC
+
+    t0 = time.perf_counter()
+    rss0 = _rss_mb()
+    n = len(values)
+    if n < 2:
+        _snap_reset()
+        _watch_reset(version)
+        _SNAP_LEN = n
+        _SNAP_DIGEST = _sheet_digest(hashes)
+        if publish:
+            _snap_publish(version)
+            _watch_notify()
+        return
+
+    hdr_idx = _detect_header_row(values)
+    if hdr_idx >= n:
+        hdr_idx = 0
+    mp = _build_header_map(values[hdr_idx])
+    cols = {k: _pick_col(mp, w) for k, w in _COL_WANTS.items()}
+    header_sig = (hdr_idx, tuple(sorted(cols.items())))
+
+    if header_sig != _SNAP_HEADER:
+        _snap_reset()  # build vào dict mới, request vẫn đọc bản cũ tới cuối hàm
+        _SNAP_HEADER = header_sig
+        _SNAP_COLS = cols
+    _snap_begin_edit()  # cùng header: vá theo dòng trên bản sao
+
+    # snapshot trống (khởi động / header đổi / rebuild tier) -> không log từng dòng,
+    # người đang theo dõi nhận lại toàn bộ
+    fresh = not _SNAP_ROW_HASH
+    if fresh:
+        _watch_reset(version)
+
+    counts = {"ins": 0, "upd": 0, "del": 0, "": 0}
+    workers = 1
+    # snapshot trống + sheet lớn -> parse song song; None = không chạy được, làm tuần tự
+    if (not _SNAP_ROW_HASH and PARSE_WORKERS > 1 and not _PARSE_POOL_BROKEN and not _TENANT
+            and n - hdr_idx - 1 >= PARSE_PARALLEL_MIN_ROWS):
+        ins = _parallel_parse(values, hashes, hdr_idx, cols)
+        if ins is not None:
+            counts["ins"], workers = ins, PARSE_WORKERS
+    if workers == 1:
+        _WATCH_STATE["muted"] = fresh
+        try:
+            for r, row in _iter_release(values, 0):
+                if r <= hdr_idx:
+                    _SNAP_ROW_HASH[r] = hashes[r]
+                    continue
+                counts[_snap_row(r, row, hashes[r], cols)] += 1
+        finally:
+            _WATCH_STATE["muted"] = False
+
+    # sheet ngắn lại -> xoá các dòng thừa
+    for r in range(n, _SNAP_LEN):
+        _SNAP_ROW_HASH.pop(r, None)
+        if r in _SNAP_ITEMS:
+            _snap_put(r, None)
+            counts["del"] += 1
+
+    _SNAP_LEN = n
+    _trim_tail()
+    _SNAP_DIGEST = _sheet_digest(hashes)
+    if publish:
+        _snap_publish(version)
+    _SNAP_LAST_SYNC = {
+        "version": version,
+        "kind": "full",
+        "inserted": counts["ins"],
+        "updated": counts["upd"],
+        "deleted": counts["del"],
+        "scanned": n,
+        "ms": round((time.perf_counter() - t0) * 1000.0, 3),
+        "rss_before_mb": rss0,
+        "rss_after_mb": _rss_mb(),
+        "peak_rss_mb": _peak_rss_mb(),
+        "workers": workers,
+    }
+    if publish:
+        _watch_notify()
+
+def _trim_tail():
+    """Bỏ các dòng trắng ở cuối (get_all_values không trả về chúng)."""
+    global _SNAP_LEN
+    while _SNAP_LEN and _SNAP_ROW_HASH.get(_SNAP_LEN - 1, _EMPTY_ROW_HASH) == _EMPTY_ROW_HASH:
+        _SNAP_ROW_HASH.pop(_SNAP_LEN - 1, None)
+        _SNAP_LEN -= 1
+
+# =========================================================
+# Build song song: sheet rất lớn lúc snapshot còn trống (khởi động / header đổi)
+# chia dòng thành chunk, process con parse + _norm + build index riêng từng chunk,
+# process chính gộp lại. Ít hơn PARSE_PARALLEL_MIN_ROWS dòng -> tuần tự như cũ.
+# Tắt mặc định: PARSE_WORKERS=4 (hoặc "auto" = số core) để bật.
+# Pool dùng spawn/forkserver, không fork: fork từ process đang chạy thread (warm-up,
+# access log, replica push) có thể kẹt khoá trong process con. Đổi lại mỗi chunk
+# được pickle sang con, và con nạp lại app.py (_PARSE_CHILD: không chạy phần khởi động).
+# Tenant không dùng: module của shop nạp bằng tên riêng, process con không import được.
+#   python bench_parallel.py --rows 300000
+# =========================================================
+_PARSE_WORKERS_RAW = os.getenv("PARSE_WORKERS", "0").strip().lower()
+PARSE_WORKERS = (os.cpu_count() or 1) if _PARSE_WORKERS_RAW == "auto" else int(_PARSE_WORKERS_RAW or 0)
+PARSE_PARALLEL_MIN_ROWS = int(os.getenv("PARSE_PARALLEL_MIN_ROWS", "100000"))
+PARSE_START_METHOD = os.getenv("PARSE_START_METHOD", "spawn").strip().lower()
+if PARSE_START_METHOD not in ("spawn", "forkserver"):
+    PARSE_START_METHOD = "spawn"
+_PARSE_POOL_BROKEN = False  # pool lỗi 1 lần (vd serverless không có /dev/shm) -> thôi, tuần tự
+
+def _parse_chunk(job: Tuple[int, List[Any], Dict[str, int]]):
+    """Chạy trong process con: parse các dòng từ r0 -> items + index + tổng hợp riêng của chunk."""
+    r0, rows, cols = job
+    items: List[Dict[str, Any]] = []
+    name: Dict[str, Any] = {}
+    phone: Dict[str, Any] = {}
+    mvd: Dict[str, Any] = {}
+    agg = _agg_new()
+    missing = []
+    for r, row in enumerate(rows, r0):
+        it = _parse_row(row, cols, r)
+        if it is None:
+            continue
+        it["name_norm"] = _norm(it["name_key"])
         items.append(it)
+        _index_add(name, it["name_norm"], r)
+        _index_add(phone, _phone_key(it["phone"]), r)
+        _index_add(mvd, _mvd_key(it["mvd"]), r)
+        _agg_apply(it, +1, agg)
+        if not it["mvd"]:
+            missing.append(r)
+    return items, name, phone, mvd, agg, missing
+
+def _index_merge(idx: Dict[str, Any], part: Dict[str, Any]):
+    """Gộp index của 1 chunk vào idx (sửa tại chỗ)."""
+    for k, v in part.items():
+        cur = idx.get(k)
+        if cur is None:
+            idx[k] = v
+            continue
+        rows = cur if isinstance(cur, set) else {cur}
+        if isinstance(v, set):
+            rows.update(v)
+        else:
+            rows.add(v)
+        idx[k] = rows
+
+def _parallel_parse(values: List[Any], hashes: List[int], hdr_idx: int, cols: Dict[str, int]) -> Optional[int]:
+    """Build snapshot (đang trống) từ values bằng process pool. Return số đơn, None = không chạy được."""
+    global _PARSE_POOL_BROKEN, _AGG
+    from concurrent.futures import ProcessPoolExecutor
+
+    n = len(values)
+    size = max(1000, -(-(n - hdr_idx - 1) // (PARSE_WORKERS * 4)))
+    jobs = ((a, values[a:a + size], cols) for a in range(hdr_idx + 1, n, size))
+    try:
+        ctx = multiprocessing.get_context(PARSE_START_METHOD)
+        with ProcessPoolExecutor(PARSE_WORKERS, mp_context=ctx) as ex:
+            parts = list(ex.map(_parse_chunk, jobs))
+    except Exception:
+        _PARSE_POOL_BROKEN = True
+        return None
+
+    ins = 0
+    agg = _AGG
+    for items, name, phone, mvd, part_agg, missing in parts:
+        for it in items:
+            it["status"] = sys.intern(it["status"])  # pickle về -> intern lại cho dùng chung
+            _SNAP_ITEMS[it["_row"]] = it
+        _index_merge(_IDX_NAME, name)
+        _index_merge(_IDX_PHONE, phone)
+        _index_merge(_IDX_MVD, mvd)
+        agg = _agg_merge(agg, part_agg)
+        _MISSING_MVD_ROWS.update(missing)
+        ins += len(items)
+    _AGG = agg
+    for r in range(n):
+        if r <= hdr_idx or hashes[r] != _EMPTY_ROW_HASH:
+            _SNAP_ROW_HASH[r] = hashes[r]
+        values[r] = None
+    return ins
+
+def _patch_snapshot(r0: int, rows: List[List[str]], version: int) -> int:
+    """
+    Vá các dòng r0.. (0-based) từ webhook. Return digest mới của cả sheet.
+    Phần tử None = dòng không đổi, bỏ qua (patch nhận từ primary).
+    """
+    global _SNAP_LEN, _SNAP_LAST_SYNC
+    t0 = time.perf_counter()
+    _repl_on_patch(r0, rows, version)
+    _snap_begin_edit()
+    counts = {"ins": 0, "upd": 0, "del": 0, "": 0}
+    for i, row in enumerate(rows):
+        if row is not None:
+            counts[_snap_row(r0 + i, row, _row_hash(row), _SNAP_COLS)] += 1
+
+    _SNAP_LEN = max(_SNAP_LEN, r0 + len(rows))
+    _trim_tail()
+
+    _snap_publish(version)
+    _watch_notify()
+    _SNAP_LAST_SYNC = {
+        "version": version,
+        "kind": "patch",
+        "inserted": counts["ins"],
+        "updated": counts["upd"],
+        "deleted": counts["del"],
+        "scanned": len(rows),
+        "ms": round((time.perf_counter() - t0) * 1000.0, 3),
+    }
+    return _SNAP_DIGEST
+
+def _sync_snapshot() -> str:
+    """Đảm bảo snapshot còn hạn (TTL). Return "" hoặc thông báo lỗi."""
+    _refresh_snapshot()
+    return "" if _HOT_TIER["len"] >= 2 else "Sheet rỗng"
 
-    return items, ""
+def _rss_mb() -> float:
+    """RSS hiện tại (MB). Linux đọc /proc, nơi khác trả 0."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 1048576.0, 1)
+    except Exception:
+        return 0.0
 
-def _search_by_name(q: str) -> List[Dict[str, str]]:
+def _peak_rss_mb() -> float:
+    """RSS cao nhất từ lúc process chạy (MB)."""
+    try:
+        import resource
+        kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(kb / (1048576.0 if sys.platform == "darwin" else 1024.0), 1)
+    except Exception:
+        return 0.0
+
+def _snapshot_stats() -> Dict[str, Any]:
+    tier = _HOT_TIER
+    return {
+        "version": tier["version"],
+        "items": len(tier["items"]),
+        "names": len(tier["name"]),
+        "phones": len(tier["phone"]),
+        "mvds": len(tier["mvd"]),
+        "last_sync": _SNAP_LAST_SYNC,
+    }
+
+def _read_items_from_sheet() -> Tuple[List[Dict[str, Any]], str]:
+    msg = _sync_snapshot()
+    if msg:
+        return [], msg
+    items = dict(_HOT_TIER["items"])
+    return [items[r] for r in sorted(items)], ""
+
+def _rows_to_items(rows, items: Optional[Dict[int, Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    items = _HOT_TIER["items"] if items is None else items
+    # ✅ mới nhất lên trước (nlargest: không sort cả tập khi match rộng)
+    top = heapq.nlargest(_SEARCH_LIMIT, rows) if len(rows) > _SEARCH_LIMIT else sorted(rows, reverse=True)
+    return [it for it in map(items.get, top) if it is not None]
+
+
+# =========================================================
+# Chiến lược so khớp tên (app.py = exact, back.py cũ = substring)
+# Mỗi strategy: (qn đã _norm, tier) -> tập dòng khớp, chạy trên index dùng chung.
+# tier = bộ index của 1 vùng dữ liệu (hot trong RAM / cold từ archive)
+# =========================================================
+_SEARCH_LIMIT = 25
+SEARCH_STRATEGY = _cfg("search_strategy", "SEARCH_STRATEGY", "exact").lower()
+
+# tìm theo SĐT nhận / MVĐ khi tên không khớp (mặc định tắt: trang tra cứu chỉ hứa tìm theo tên)
+SEARCH_BY_PHONE_MVD = os.getenv("SEARCH_BY_PHONE_MVD", "").strip() == "1"
+
+# bản snapshot request đang đọc, thay cả dict mỗi lần snapshot đổi (_snap_publish)
+_HOT_TIER: Dict[str, Any] = {}
+
+def _tier_keys(tier: Dict[str, Any]) -> List[str]:
+    """Name key đã sort của 1 tier, tính lần đầu cần (mỗi version 1 dict tier mới)."""
+    keys = tier.get("sorted_keys")
+    if keys is None:
+        keys = tier["sorted_keys"] = sorted(tier["name"])
+    return keys
+
+def _name_keys() -> List[str]:
+    return _tier_keys(_HOT_TIER)
+
+def _union_rows(tier: Dict[str, Any], keys: Iterable[str]) -> set:
+    idx = tier["name"]
+    out = set()
+    for k in keys:
+        out.update(_index_get(idx, k))
+    return out
+
+def _match_exact(qn: str, tier: Dict[str, Any]) -> set:
+    """Phạm Hùng / pham hung -> OK; hùng -> KHÔNG"""
+    return set(_index_get(tier["name"], qn))
+
+def _match_prefix(qn: str, tier: Dict[str, Any]) -> set:
+    """pham h -> Phạm Hùng, Phạm Hà..."""
+    keys = _tier_keys(tier)
+    i = bisect.bisect_left(keys, qn)
+    hits = []
+    while i < len(keys) and keys[i].startswith(qn):
+        hits.append(keys[i])
+        i += 1
+    return _union_rows(tier, hits)
+
+def _match_substring(qn: str, tier: Dict[str, Any]) -> set:
+    """hung -> Phạm Hùng, Hùng Anh... (hành vi của back.py cũ)"""
+    return _union_rows(tier, (k for k in _tier_keys(tier) if qn in k))
+
+def _edit_distance_within(a: str, b: str, k: int) -> bool:
+    """Levenshtein(a, b) <= k, dừng sớm khi cả hàng DP đã vượt k."""
+    if abs(len(a) - len(b)) > k:
+        return False
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        best = i
+        for j, cb in enumerate(b, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if cur[j] < best:
+                best = cur[j]
+        if best > k:
+            return False
+        prev = cur
+    return prev[-1] <= k
+
+def _match_fuzzy(qn: str, tier: Dict[str, Any]) -> set:
+    """Cho phép gõ sai ~1 ký tự / 6 ký tự: phm hung, pham hunh -> Phạm Hùng"""
+    exact = _match_exact(qn, tier)
+    if exact:
+        return exact
+    k = max(1, len(qn) // 6)
+    return _union_rows(tier, (key for key in _tier_keys(tier) if _edit_distance_within(qn, key, k)))
+
+_STRATEGIES = {
+    "exact": _match_exact,
+    "prefix": _match_prefix,
+    "substring": _match_substring,
+    "fuzzy": _match_fuzzy,
+}
+
+def _strategy(strategy: Optional[str]):
+    fn = _STRATEGIES.get((strategy or SEARCH_STRATEGY).lower())
+    if fn is None:
+        raise ValueError(f"Không có kiểu tìm '{strategy}' (chọn: {', '.join(_STRATEGIES)})")
+    return fn
+
+def _search_tier(q: str, fn, tier: Dict[str, Any]) -> set:
+    """Tên; bật SEARCH_BY_PHONE_MVD thì không thấy tên sẽ thử SĐT nhận, rồi MVĐ. Return tập dòng."""
+    qn = _norm(q)
+    if qn:
+        rows = fn(qn, tier)
+        if rows or not SEARCH_BY_PHONE_MVD:
+            return rows
+    if not SEARCH_BY_PHONE_MVD:
+        return set()
+    pk = _phone_key(q)
+    if len(pk) >= 9 and pk in tier["phone"]:
+        return set(_index_get(tier["phone"], pk))
+    return set(_index_get(tier["mvd"], _mvd_key(q)))
+
+def _search_by_name(q: str, strategy: Optional[str] = None) -> List[Dict[str, Any]]:
     """
-    Chỉ match khi nhập ĐÚNG & ĐỦ họ tên (sau normalize)
+    Mặc định (SEARCH_STRATEGY=exact) chỉ match khi nhập ĐÚNG & ĐỦ họ tên (sau normalize)
     Ví dụ:
     - Phạm Hùng  -> OK
     - pham hung  -> OK
     - hùng       -> KHÔNG OK
     """
+    fn = _strategy(strategy)
     qn = _norm(q)
-    items, _ = _read_items_from_sheet()
+    if not qn:
+        return []
+    _sync_snapshot()
+    hot = _HOT_TIER
+    return _rows_to_items(fn(qn, hot), hot["items"])
 
-    out = []
-    for it in items:
-        name_norm = _norm(it.get("name_key", ""))
+def _search(q: str, strategy: Optional[str] = None, scope: str = "") -> List[Dict[str, Any]]:
+    """
+    Tìm trong vùng hot (RAM) trước. Bật tiering (HOT_ROWS) thì:
+    - hot không thấy -> tìm tiếp archive cold (Bloom nói chắc chắn không có -> khỏi nạp)
+    - scope="all"    -> luôn gộp cả cold (đơn cũ)
+    Query vừa trượt gần đây (cùng snapshot) -> trả [] luôn từ negative cache.
+    """
+    fn = _strategy(strategy)
+    t0, ver = time.perf_counter(), _SNAP_BUILT_VERSION
+    _sync_snapshot()
+    _alog_stage("sync", t0)
+    _alog(snapshot="refreshed" if ver != _SNAP_BUILT_VERSION else "cached")
+    nk = (fn.__name__, scope, _norm(q))
+    if _neg_hit(nk):
+        _alog(cache="neg")
+        return []
+    t0 = time.perf_counter()
+    hot = _HOT_TIER
+    out = _rows_to_items(_search_tier(q, fn, hot), hot["items"])
+    _alog_stage("hot", t0)
+    _alog(cache="hot")
+    if HOT_ROWS and not (out and scope != "all") and len(out) < _SEARCH_LIMIT and _cold_may_have(q, fn, hot["cold"]):
+        t1 = time.perf_counter()
+        cold = _cold_tier(hot["cold"])
+        if cold is not None:
+            # archive vừa compact lại có thể chứa dòng mà bản hot đang đọc vẫn còn giữ
+            seen = {it["_row"] for it in out}
+            more = [it for it in _rows_to_items(_search_tier(q, fn, cold), cold["items"]) if it["_row"] not in seen]
+            out = (out + more)[:_SEARCH_LIMIT]
+            _alog(cache="hot+cold")
+        _alog_stage("cold", t1)
+    if not out:
+        _neg_put(nk, time.perf_counter() - t0, hot["version"])
+    return out
 
-        # ✅ so khớp CHUẨN TÊN (exact match)
-        if qn == name_norm:
-            out.append(it)
 
-    # ✅ mới nhất lên trước
-    out.sort(key=lambda x: int(x.get("_row", 0)), reverse=True)
+# =========================================================
+# Query trượt (gõ sai, tên Zalo, đơn chưa nhập): phần lớn traffic
+# - negative cache: query vừa trượt -> trả [] ngay, hết hạn sau NEG_CACHE_TTL giây,
+#   xoá sạch khi snapshot đổi version (đơn mới vào là thấy ngay)
+# - Bloom filter trên tên / SĐT / MVĐ của archive cold, dựng lúc compact:
+#   cold phải nạp file -> Bloom trả "chắc chắn không có" thì khỏi nạp / khỏi tìm cold
+# - vùng hot (và cả sheet khi tắt tiering) không có Bloom, cố ý:
+#   tra exact trên hot đã là 1 lần get dict O(1), ngang 1 lần kiểm Bloom (k lần hash),
+#   prefix / contains / fuzzy thì Bloom không trả lời được (chỉ biết key đúng y hệt),
+#   và hot đổi theo từng dòng webhook mà Bloom không xoá được key -> phải dựng lại liên tục.
+#   Query trượt lặp lại trên hot đã có negative cache lo.
+# =========================================================
+NEG_CACHE_TTL = float(os.getenv("NEG_CACHE_TTL", "30"))
+NEG_CACHE_MAX = int(os.getenv("NEG_CACHE_MAX", "4096"))
+BLOOM_FP_RATE = float(os.getenv("BLOOM_FP_RATE", "0.01"))
+
+_NEG_CACHE: "OrderedDict[Tuple[str, str, str], float]" = OrderedDict()  # key -> hết hạn lúc
+_NEG_LOCK = threading.Lock()
+_NEG_VERSION = -1
+_MISS_STATS: Dict[str, Any] = {"searches": 0, "misses": 0, "neg_hits": 0, "bloom_checks": 0,
+                               "bloom_rejects": 0, "cold_loads_avoided": 0, "miss_ms_ewma": 0.0}
+
+class _Bloom:
+    """Bloom filter trên bytearray; k vị trí bit từ 1 lần blake2b (double hashing)."""
+
+    def __init__(self, n: int, fp: float = 0.01):
+        self.m = max(64, int(-max(1, n) * math.log(fp) / (math.log(2) ** 2)))
+        self.k = max(1, round(self.m / max(1, n) * math.log(2)))
+        self.bits = bytearray((self.m + 7) // 8)
+        self.n = 0
+
+    def _pos(self, key: str) -> Iterator[int]:
+        d = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(d[:8], "little")
+        h2 = int.from_bytes(d[8:], "little") | 1
+        return ((h1 + i * h2) % self.m for i in range(self.k))
+
+    def add(self, key: str):
+        for i in self._pos(key):
+            self.bits[i >> 3] |= 1 << (i & 7)
+        self.n += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[i >> 3] & (1 << (i & 7)) for i in self._pos(key))
+
+def _neg_hit(key: Tuple[str, str, str]) -> bool:
+    global _NEG_VERSION
+    _MISS_STATS["searches"] += 1
+    with _NEG_LOCK:
+        if _NEG_VERSION != _SNAP_BUILT_VERSION:
+            _NEG_CACHE.clear()
+            _NEG_VERSION = _SNAP_BUILT_VERSION
+            return False
+        exp = _NEG_CACHE.get(key)
+        if exp is None:
+            return False
+        if exp < time.time():
+            del _NEG_CACHE[key]
+            return False
+        _MISS_STATS["neg_hits"] += 1
+    _MISS_STATS["misses"] += 1
+    return True
+
+def _neg_put(key: Tuple[str, str, str], cost_s: float, version: int):
+    """Ghi query trượt trên snapshot version. Cache đã sang version khác -> bỏ (kết quả cũ)."""
+    _MISS_STATS["misses"] += 1
+    _MISS_STATS["miss_ms_ewma"] = 0.9 * _MISS_STATS["miss_ms_ewma"] + 0.1 * cost_s * 1000.0
+    if NEG_CACHE_TTL <= 0:
+        return
+    with _NEG_LOCK:
+        if version != _NEG_VERSION:
+            return
+        _NEG_CACHE[key] = time.time() + NEG_CACHE_TTL
+        _NEG_CACHE.move_to_end(key)
+        if len(_NEG_CACHE) > NEG_CACHE_MAX:
+            _NEG_CACHE.popitem(last=False)
+
+def _cold_may_have(q: str, fn, cold: Dict[str, Any]) -> bool:
+    """False = chắc chắn cold không có kết quả. Chỉ chặn được khi so tên khớp đúng (exact)."""
+    bloom = cold["bloom"]
+    if bloom is None or fn is not _match_exact:
+        return True
+    _MISS_STATS["bloom_checks"] += 1
+    keys = (_norm(q), _phone_key(q), _mvd_key(q)) if SEARCH_BY_PHONE_MVD else (_norm(q),)
+    for key in keys:
+        if key and key in bloom:
+            return True
+    _MISS_STATS["bloom_rejects"] += 1
+    if not cold["loaded"]:
+        _MISS_STATS["cold_loads_avoided"] += 1
+    return False
+
+def _miss_stats() -> Dict[str, Any]:
+    out = dict(_MISS_STATS)
+    n = out["searches"]
+    out["miss_rate"] = round(out["misses"] / n, 4) if n else 0.0
+    out["neg_hit_rate"] = round(out["neg_hits"] / out["misses"], 4) if out["misses"] else 0.0
+    out["miss_ms_ewma"] = round(out["miss_ms_ewma"], 3)
+    # mỗi lần trúng negative cache tiết kiệm ~ 1 lần tìm trượt trung bình
+    out["est_saved_ms"] = round(out["neg_hits"] * out["miss_ms_ewma"], 1)
+    out["neg_cache_size"] = len(_NEG_CACHE)
+    bloom = _COLD["bloom"]
+    out["bloom"] = {"keys": bloom.n, "bits": bloom.m, "k": bloom.k} if bloom is not None else None
+    return out
 
-    return out[:25]
+# =========================================================
+# Hot/cold: HOT_ROWS dòng cuối sheet (đơn gần đây) ở RAM, refresh theo TTL
+# bằng get_values(range) chỉ vùng hot; phần cũ hơn nén ra file archive,
+# chỉ nạp khi cần, refresh full mỗi COLD_TTL giây.
+# =========================================================
+HOT_ROWS = int(_cfg("hot_rows", "HOT_ROWS", "0"))  # 0 = tắt, cả sheet trong RAM như cũ
+COLD_TTL = float(_cfg("cold_ttl", "COLD_TTL", "21600"))
+ARCHIVE_PATH = _cfg("archive_path", "ARCHIVE_PATH",
+                    os.path.join(tempfile.gettempdir(), f"checkdonhang_cold{TENANT_NAME and '_' + TENANT_NAME}.jsonl.gz"))
+
+_HOT_START = 0       # dòng (0-based) đầu tiên của vùng hot
+_COLD_AT = 0.0       # lần refresh full gần nhất
+_COLD_LOAD_LOCK = threading.Lock()
+
+def _cold_new(rows: int = 0, **kw) -> Dict[str, Any]:
+    """Archive cold: mỗi lần compact 1 dict mới (đổi cùng vùng hot trong _snap_publish)."""
+    cold = {"loaded": False, "rows": rows, "items": {}, "name": {}, "phone": {}, "mvd": {},
+            "sorted_keys": [], "loads": 0, "agg": {}, "bloom": None}  # bloom None = chưa compact
+    cold.update(kw)
+    return cold
+
+_COLD: Dict[str, Any] = _cold_new()
+_snap_publish(_SNAP_BUILT_VERSION)  # _HOT_TIER ban đầu (trống) cho request tới trước lần build đầu
+
+def _compact_cold(version: int):
+    """
+    Sau 1 lần build full (chưa publish): đẩy dòng < hot_start ra archive, bỏ khỏi RAM,
+    rồi publish vùng hot + archive mới cùng lúc.
+    """
+    global _HOT_START, _COLD
+    hdr_idx = _SNAP_HEADER[0]
+    hot_start = max(hdr_idx + 1, _SNAP_LEN - HOT_ROWS)
+    agg = _agg_new()
+    tmp = ARCHIVE_PATH + ".tmp"
+    n = 0
+    rows = sorted(r for r in _SNAP_ITEMS if r < hot_start)
+    bloom = _Bloom(3 * len(rows), BLOOM_FP_RATE)
+    _WATCH_STATE["muted"] = True  # chuyển sang archive, không phải đơn bị xoá
+    try:
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            for r in rows:
+                it = _SNAP_ITEMS[r]
+                f.write(json.dumps(it, ensure_ascii=False) + "\n")
+                _agg_apply(it, +1, agg)
+                for key in (it["name_norm"], _phone_key(it["phone"]), _mvd_key(it["mvd"])):
+                    if key:
+                        bloom.add(key)
+                _snap_put(r, None)  # hash dòng vẫn giữ -> digest cả sheet không đổi
+                n += 1
+    finally:
+        _WATCH_STATE["muted"] = False
+    with _COLD_LOAD_LOCK:
+        os.replace(tmp, ARCHIVE_PATH)
+    _HOT_START = hot_start
+    _COLD = _cold_new(n, agg=agg, bloom=bloom, loads=_COLD["loads"])
+    _snap_publish(version)
+    _watch_notify()
+
+def _cold_tier(cold: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Nạp archive vào cold (lazy, 1 lần cho mỗi lần compact)."""
+    if cold["loaded"]:
+        return cold
+    if not cold["rows"] or not os.path.exists(ARCHIVE_PATH):
+        return None
+    with _COLD_LOAD_LOCK:
+        if cold["loaded"]:
+            return cold
+        items: Dict[int, Dict[str, Any]] = {}
+        name: Dict[str, Any] = {}
+        phone: Dict[str, Any] = {}
+        mvd: Dict[str, Any] = {}
+        with gzip.open(ARCHIVE_PATH, "rt", encoding="utf-8") as f:
+            for line in f:
+                it = json.loads(line)
+                r = it["_row"]
+                items[r] = it
+                _index_add(name, it["name_norm"], r)
+                _index_add(phone, _phone_key(it["phone"]), r)
+                _index_add(mvd, _mvd_key(it["mvd"]), r)
+        cold.update(items=items, name=name, phone=phone, mvd=mvd, sorted_keys=sorted(name),
+                    loaded=True, loads=cold["loads"] + 1)
+        return cold
+
+def _fetch_hot_rows() -> List[List[str]]:
+    """Chỉ tải vùng hot: từ _HOT_START tới hết sheet (A{n}:ZZ = mở tới dòng cuối)."""
+    _connect_sheet()
+    return _SHEET_WS.get_values(f"A{_HOT_START + 1}:ZZ")
+
+def _load_hot(rows: List[List[str]], now: float) -> bool:
+    global _SNAPSHOT_VERSION
+    with _CACHE_LOCK:
+        # sheet ngắn lại -> các dòng hot phía sau coi như trắng
+        rows = list(rows) + [[] for _ in range(max(0, _SNAP_LEN - _HOT_START - len(rows)))]
+        hashes = [_row_hash(row) for row in rows]
+        dirty = any(_SNAP_ROW_HASH.get(_HOT_START + i, _EMPTY_ROW_HASH) != h for i, h in enumerate(hashes))
+        if not dirty:
+            _track_change(_SNAP_DIGEST, now)
+            return False
+        _SNAPSHOT_VERSION += 1
+        _track_change(_patch_snapshot(_HOT_START, rows, _SNAPSHOT_VERSION), now)
+        return True
+
+def _tier_stats() -> Dict[str, Any]:
+    return {
+        "enabled": HOT_ROWS > 0,
+        "hot_rows": HOT_ROWS,
+        "hot_start_row": _HOT_START + 1,
+        "hot_items": len(_HOT_TIER["items"]),
+        "cold_rows": _COLD["rows"],
+        "cold_loaded": _COLD["loaded"],
+        "cold_loads": _COLD["loads"],
+        "cold_age_s": round(time.time() - _COLD_AT, 1) if _COLD_AT else None,
+        "archive": ARCHIVE_PATH if HOT_ROWS else "",
+    }
+
+
+# =========================================================
+# Gợi ý tên khi đang gõ (prefix trên mảng name key đã sort)
+# =========================================================
+# prefix ngắn + nhiều tên/lần -> dò được cả danh sách khách rồi đem tra exact ở /api/search:
+# prefix >= 4 ký tự, tối đa 5 tên, và tính chung rate limit với /api/search
+SUGGEST_MIN_PREFIX = int(os.getenv("SUGGEST_MIN_PREFIX", "4"))
+SUGGEST_MAX_K = 5
+
+# song song với _name_keys(): tên hiển thị + điểm (dòng đơn mới nhất, khách mới đặt lên trước)
+_SUGGEST: Dict[str, Any] = {"version": -1, "keys": [], "display": [], "score": []}
+_SUGGEST_CACHE: "OrderedDict[Tuple[str, int], List[str]]" = OrderedDict()
+_SUGGEST_CACHE_MAX = 4096
+
+def _suggest_index() -> Dict[str, Any]:
+    global _SUGGEST
+    tier = _HOT_TIER
+    if _SUGGEST["version"] != tier["version"]:
+        version = tier["version"]
+        keys = _tier_keys(tier)
+        items, name = tier["items"], tier["name"]
+        display, score = [], []
+        for k in keys:
+            r = max(_index_get(name, k), default=-1)
+            it = items.get(r)
+            display.append(it["name_key"] if it else k)
+            score.append(r)
+        _SUGGEST = {"version": version, "keys": keys, "display": display, "score": score}
+        _SUGGEST_CACHE.clear()
+    return _SUGGEST
+
+def _suggest(prefix: str, k: int) -> List[str]:
+    """Top-k tên (hiển thị có dấu) có key bắt đầu bằng prefix (đã _norm)."""
+    idx = _suggest_index()
+    ck = (prefix, k)
+    hit = _SUGGEST_CACHE.get(ck)
+    if hit is not None:
+        return hit
+
+    keys = idx["keys"]
+    lo = bisect.bisect_left(keys, prefix)
+    hi = bisect.bisect_left(keys, prefix + "\uffff")
+    score = idx["score"]
+    top = heapq.nlargest(k, range(lo, hi), key=score.__getitem__) if hi - lo > k else \
+        sorted(range(lo, hi), key=score.__getitem__, reverse=True)
+    out = [idx["display"][i] for i in top]
+
+    _SUGGEST_CACHE[ck] = out
+    if len(_SUGGEST_CACHE) > _SUGGEST_CACHE_MAX:
+        _SUGGEST_CACHE.popitem(last=False)
+    return out
+
+
+# =========================================================
+# Response: JSON nhanh + nén gzip/brotli + msgpack cho tool nội bộ
+# chọn theo Accept / Accept-Encoding của client
+# =========================================================
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+_MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+# X-Bytes-Saved so với jsonify mặc định (ascii escape, không nén);
+# tốn thêm 1 lần json.dumps / response -> chỉ bật khi cần đo
+_SERIAL_REPORT_BASELINE = os.getenv("SERIAL_REPORT_BASELINE", "").strip() == "1"
+
+_SERIAL_STATS = {"responses": 0, "raw_bytes": 0, "sent_bytes": 0,
+                 "gzip": 0, "br": 0, "msgpack": 0}
+
+def _dumps_json(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    # ensure_ascii=False: tiếng Việt giữ nguyên UTF-8, nhỏ hơn nhiều so với \uXXXX
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _wants_msgpack() -> bool:
+    if msgpack is None:
+        return False
+    acc = request.accept_mimetypes
+    # phải ghi rõ msgpack trong Accept; "*/*" của trình duyệt vẫn nhận JSON
+    best = max((q for mt, q in acc if mt in _MSGPACK_TYPES), default=0)
+    return best > 0 and best >= acc.quality("application/json")
+
+def _pick_encoding(size: int) -> str:
+    if size < COMPRESS_MIN_BYTES:
+        return ""
+    enc = request.accept_encodings
+    if brotli is not None and enc.quality("br") > 0:
+        return "br"
+    if enc.quality("gzip") > 0:
+        return "gzip"
+    return ""
+
+def _send(obj: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    t0 = time.perf_counter()
+    if _wants_msgpack():
+        body = msgpack.packb(obj, use_bin_type=True)
+        mimetype = "application/msgpack"
+        _SERIAL_STATS["msgpack"] += 1
+    else:
+        body = _dumps_json(obj)
+        mimetype = "application/json"
+
+    raw_len = len(body)
+    encoding = _pick_encoding(raw_len)
+    if encoding == "br":
+        body = brotli.compress(body, quality=5)
+    elif encoding == "gzip":
+        body = gzip.compress(body, compresslevel=5)
+
+    resp = Response(body, status=status, mimetype=mimetype)
+    resp.headers["Vary"] = "Accept, Accept-Encoding"
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+        _SERIAL_STATS[encoding] += 1
+    resp.headers["X-Bytes-Saved"] = str(max(0, _json_baseline_len(obj, raw_len) - len(body)))
+    if headers:
+        resp.headers.update(headers)
+
+    _SERIAL_STATS["responses"] += 1
+    _SERIAL_STATS["raw_bytes"] += raw_len
+    _SERIAL_STATS["sent_bytes"] += len(body)
+    _alog_stage("send", t0)
+    return resp
+
+def _json_baseline_len(obj: Any, raw_len: int) -> int:
+    """Cỡ body nếu trả bằng jsonify mặc định (ascii escape, không nén) — để tính bytes tiết kiệm."""
+    if not _SERIAL_REPORT_BASELINE:
+        return raw_len
+    return len(json.dumps(obj).encode("ascii"))
+
+def _serial_stats() -> Dict[str, Any]:
+    out = dict(_SERIAL_STATS)
+    out["saved_bytes"] = out["raw_bytes"] - out["sent_bytes"]
+    out["encoder"] = "orjson" if orjson is not None else "json"
+    out["brotli"] = brotli is not None
+    out["msgpack_available"] = msgpack is not None
+    return out
+
+
+# =========================================================
+# Trace query thật của /api/search (opt-in) -> replay bằng replay_trace.py
+# TRACE_PATH=/var/log/cdh_trace.jsonl -> mỗi dòng 1 JSON, xoay file theo TRACE_MAX_MB
+# tên / SĐT / MVĐ không ghi thô: chỉ ghi HMAC(TRACE_SALT, _trace_key(q)) cắt 16 hex
+# TRACE_SALT bắt buộc, đặt riêng (replay cần đúng salt này): không có -> không ghi trace
+# =========================================================
+TRACE_PATH = _cfg("trace_path", "TRACE_PATH")
+if TRACE_PATH and TENANT_NAME and "trace_path" not in _TENANT:
+    TRACE_PATH = f"{TRACE_PATH}.{TENANT_NAME}"  # không để nhiều shop xoay chung 1 file
+TRACE_SAMPLE = float(os.getenv("TRACE_SAMPLE", "1"))
+TRACE_MAX_MB = float(os.getenv("TRACE_MAX_MB", "20"))
+TRACE_BACKUPS = int(os.getenv("TRACE_BACKUPS", "5"))
+# không lấy APP_SECRET_KEY ("devkey" mặc định): salt đoán được -> dò ngược hash ra tên / SĐT khách
+TRACE_SALT = os.getenv("TRACE_SALT", "").strip().encode("utf-8")
+if TRACE_PATH and not TRACE_SALT:
+    print("TRACE_PATH đã đặt nhưng thiếu TRACE_SALT -> không ghi trace", file=sys.stderr)
+    TRACE_PATH = ""
+
+def _trace_hash(qn: str) -> str:
+    return hmac.new(TRACE_SALT, qn.encode("utf-8"), hashlib.sha256).hexdigest()[:16]
+
+def _trace_key(q: str) -> str:
+    """Dạng chuẩn để hash: SĐT / MVĐ theo khoá index (gõ 0911 111 111 hay 84911111111 như nhau), tên theo _norm."""
+    kind = _query_kind(q)
+    if kind == "phone":
+        return _phone_key(q)
+    if kind == "mvd":
+        return _mvd_key(q)
+    return _norm(q)
+
+def _trace_logger() -> Optional[logging.Logger]:
+    if _PARSE_CHILD or not TRACE_PATH or not TRACE_SALT:
+        return None
+    log = logging.getLogger("checkdonhang.trace" + (TENANT_NAME and "." + TENANT_NAME))
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    if not log.handlers:
+        h = logging.handlers.RotatingFileHandler(TRACE_PATH, maxBytes=int(TRACE_MAX_MB * 1024 * 1024),
+                                                 backupCount=TRACE_BACKUPS, encoding="utf-8")
+        h.setFormatter(logging.Formatter("%(message)s"))
+        log.addHandler(h)
+    return log
+
+# tạo lúc import: không phải khoá khi request đầu tiên đến song song
+_TRACE_LOG = _trace_logger()
+
+def _trace(q: str, data: Dict[str, Any], status: int, n: int, t0: float):
+    """1 dòng trace: thời điểm, hash query, độ dài, mode/scope, kết quả, latency server."""
+    if _TRACE_LOG is None or (TRACE_SAMPLE < 1 and random.random() >= TRACE_SAMPLE):
+        return
+    qn = _trace_key(q)
+    rec = {
+        "t": round(time.time(), 3),
+        "h": _trace_hash(qn) if qn else "",
+        "len": len(qn),
+        "mode": data.get("mode") or "",
+        "scope": data.get("scope") or "",
+        "st": status,
+        "n": n,
+        "ms": round((time.perf_counter() - t0) * 1000.0, 3),
+        "ver": _SNAP_BUILT_VERSION,
+    }
+    _TRACE_LOG.info(json.dumps(rec, separators=(",", ":")))
+
+
+# =========================================================
+# Access log JSON (opt-in): route, loại query, số kết quả, cache, latency từng bước, lỗi
+# ACCESS_LOG=stdout (Vercel gom log stdout) | đường dẫn file (xoay theo ACCESS_LOG_MAX_MB)
+# - request chỉ gom vài số vào g rồi put_nowait vào queue có giới hạn; json.dumps, hash query,
+#   ghi file/stdout đều ở thread riêng -> log không bao giờ làm request chờ
+# - queue đầy -> bỏ bản ghi + đếm "dropped" (/health)
+# - lấy mẫu ACCESS_LOG_SAMPLE, nhưng lỗi (>= 500 / exception) và request chậm luôn ghi
+# - query không ghi thô: qh = _trace_hash (join được với trace), qlen, qtype
+# =========================================================
+ACCESS_LOG = _cfg("access_log", "ACCESS_LOG")
+if ACCESS_LOG and ACCESS_LOG != "stdout" and TENANT_NAME and "access_log" not in _TENANT:
+    ACCESS_LOG = f"{ACCESS_LOG}.{TENANT_NAME}"
+ACCESS_LOG_SAMPLE = float(os.getenv("ACCESS_LOG_SAMPLE", "1"))
+ACCESS_LOG_SLOW_MS = float(os.getenv("ACCESS_LOG_SLOW_MS", "500"))
+ACCESS_LOG_BUFFER = int(os.getenv("ACCESS_LOG_BUFFER", "10000"))
+ACCESS_LOG_MAX_MB = float(os.getenv("ACCESS_LOG_MAX_MB", "50"))
+ACCESS_LOG_BACKUPS = int(os.getenv("ACCESS_LOG_BACKUPS", "5"))
+
+_ALOG_STATS: Dict[str, int] = {"queued": 0, "dropped": 0, "sampled_out": 0, "written": 0}
+
+class _DropQueueHandler(logging.handlers.QueueHandler):
+    """Queue đầy -> bỏ bản ghi + đếm, không bao giờ chờ."""
+
+    def prepare(self, record):
+        return record  # format (json.dumps) để thread ghi làm
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            _ALOG_STATS["queued"] += 1
+        except queue.Full:
+            _ALOG_STATS["dropped"] += 1
+
+class _AlogListener(logging.handlers.QueueListener):
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+    def enqueue_sentinel(self):
+        try:
+            self.queue.put(self._sentinel, timeout=5)  # lúc tắt: chờ chút cho queue vơi
+        except queue.Full:
+            pass
+
+class _AlogFormatter(logging.Formatter):
+    """record.msg là dict -> 1 dòng JSON (chạy trên thread ghi)."""
+
+    def format(self, record) -> str:
+        line = getattr(record, "alog_line", None)
+        if line is not None:  # RotatingFileHandler format 2 lần (kiểm tra xoay file + ghi)
+            return line
+        rec = dict(record.msg)
+        q = rec.pop("_q", None)
+        if q is not None:
+            qn = _norm(q)
+            rec["qh"] = _trace_hash(qn) if qn else ""
+            rec["qlen"] = len(qn)
+            rec["qtype"] = _query_kind(q)
+        _ALOG_STATS["written"] += 1
+        record.alog_line = json.dumps(rec, ensure_ascii=False, separators=(",", ":"))
+        return record.alog_line
+
+def _query_kind(q: str) -> str:
+    q = q.strip()
+    if len(q) < 2:
+        return "short"
+    if len(_phone_key(q)) >= 9 and not any(ch.isalpha() for ch in q):
+        return "phone"
+    if " " not in q and any(ch.isdigit() for ch in q) and any(ch.isalpha() for ch in q):
+        return "mvd"
+    return "name"
+
+def _access_logger() -> Tuple[Optional[logging.Logger], Optional[logging.handlers.QueueListener]]:
+    if _PARSE_CHILD or not ACCESS_LOG:
+        return None, None
+    if ACCESS_LOG == "stdout":
+        h: logging.Handler = logging.StreamHandler(sys.stdout)
+    else:
+        h = logging.handlers.RotatingFileHandler(ACCESS_LOG, maxBytes=int(ACCESS_LOG_MAX_MB * 1024 * 1024),
+                                                 backupCount=ACCESS_LOG_BACKUPS, encoding="utf-8")
+    h.setFormatter(_AlogFormatter())
+    q: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=max(1, ACCESS_LOG_BUFFER))
+    log = logging.getLogger("checkdonhang.access" + (TENANT_NAME and "." + TENANT_NAME))
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    for old in list(log.handlers):
+        log.removeHandler(old)
+    log.addHandler(_DropQueueHandler(q))
+    listener = _AlogListener(q, h)
+    listener.start()
+    atexit.register(listener.stop)  # flush phần còn trong queue
+    return log, listener
+
+_ACCESS_LOG, _ACCESS_LISTENER = _access_logger()
+
+def _alog(**kv):
+    """Gắn thêm field vào access log của request hiện tại (no-op khi tắt / ngoài request)."""
+    if _ACCESS_LOG is None or not has_request_context():
+        return
+    a = g.get("alog")
+    if a is not None:
+        a.update(kv)
+
+def _alog_stage(name: str, t0: float):
+    """Cộng dồn ms của 1 bước (sync / hot / cold / render / send) từ t0 tới giờ."""
+    if _ACCESS_LOG is None or not has_request_context():
+        return
+    a = g.get("alog")
+    if a is not None:
+        st = a["stages"]
+        st[name] = round(st.get(name, 0.0) + (time.perf_counter() - t0) * 1000.0, 3)
+
+def _alog_error(e: BaseException):
+    if _ACCESS_LOG is None:
+        return
+    tb = e.__traceback__
+    while tb is not None and tb.tb_next is not None:
+        tb = tb.tb_next
+    where = f"{os.path.basename(tb.tb_frame.f_code.co_filename)}:{tb.tb_lineno}" if tb is not None else ""
+    _alog(err=f"{type(e).__name__}: {e}"[:300], where=where)
+
+@app.before_request
+def _alog_begin():
+    if _ACCESS_LOG is not None:
+        g.alog = {"_t0": time.perf_counter(), "stages": {}}
+
+@app.after_request
+def _alog_response(resp):
+    a = g.get("alog") if _ACCESS_LOG is not None else None
+    if a is not None:
+        a["st"] = resp.status_code
+        a["bytes"] = resp.content_length
+    return resp
+
+@app.teardown_request
+def _alog_end(exc):
+    a = g.get("alog") if _ACCESS_LOG is not None else None
+    if a is None:
+        return
+    if exc is not None:
+        _alog_error(exc)
+    g.pop("alog", None)
+    ms = (time.perf_counter() - a.pop("_t0")) * 1000.0
+    st = a.pop("st", 500)
+    if not (st >= 500 or "err" in a or ms >= ACCESS_LOG_SLOW_MS
+            or ACCESS_LOG_SAMPLE >= 1 or random.random() < ACCESS_LOG_SAMPLE):
+        _ALOG_STATS["sampled_out"] += 1
+        return
+    rule = request.url_rule
+    rec = {"t": round(time.time(), 3), "m": request.method, "route": rule.rule if rule else request.path,
+           "st": st, "ms": round(ms, 3), **a}
+    if TENANT_NAME:
+        rec["tenant"] = TENANT_NAME
+    if ACCESS_LOG_SAMPLE < 1:
+        rec["sample"] = ACCESS_LOG_SAMPLE
+    _ACCESS_LOG.info(rec)
+
+def _alog_stats() -> Dict[str, Any]:
+    out: Dict[str, Any] = dict(_ALOG_STATS)
+    out["enabled"] = _ACCESS_LOG is not None
+    if _ACCESS_LISTENER is not None:
+        out["backlog"] = _ACCESS_LISTENER.queue.qsize()
+        out["sample"] = ACCESS_LOG_SAMPLE
+    return out
+
+
+# =========================================================
+# Profile theo yêu cầu (cProfile) cho /api/search, /api/refresh và lần refresh sheet
+# - PROFILE_SAMPLE=0.01 -> profile ngẫu nhiên 1% lần chạy
+# - header X-Profile: <ts>.<hex HMAC-SHA256(PROFILE_SECRET, ts)> -> profile đúng request đó,
+#   response trả về X-Profile-Id
+# giữ PROFILE_KEEP bản gần nhất trong RAM, tải ở /api/profiles/<id>?format=pstats|speedscope
+# cả 2 đều tắt (mặc định) -> decorator trả nguyên hàm, không tốn gì
+# =========================================================
+PROFILE_SAMPLE = float(os.getenv("PROFILE_SAMPLE", "0"))
+PROFILE_SECRET = _cfg("profile_secret", "PROFILE_SECRET")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+_PROFILING = PROFILE_SAMPLE > 0 or bool(PROFILE_SECRET)
+
+_PROFILES: "deque[Dict[str, Any]]" = deque(maxlen=PROFILE_KEEP)
+# 1 profile 1 lúc (cProfile 3.12+ không cho 2 profiler chạy song song) -> bận thì bỏ qua
+_PROFILE_LOCK = threading.Lock()
+_PROFILE_SEQ = 0
+
+def _profile_sig(ts: str) -> str:
+    return hmac.new(PROFILE_SECRET.encode("utf-8"), ts.encode("utf-8"), hashlib.sha256).hexdigest()
+
+def _profile_trigger() -> str:
+    """"header" / "sample" / "" (lần này không profile)."""
+    if PROFILE_SECRET and has_request_context():
+        ts, _, sig = request.headers.get("X-Profile", "").partition(".")
+        try:
+            fresh = abs(time.time() - float(ts)) <= _REFRESH_MAX_SKEW
+        except ValueError:
+            fresh = False
+        if fresh and hmac.compare_digest(_profile_sig(ts), sig):
+            return "header"
+    if PROFILE_SAMPLE > 0 and random.random() < PROFILE_SAMPLE:
+        return "sample"
+    return ""
+
+@contextmanager
+def _profile_run(kind: str, label: str = ""):
+    """Profile khối lệnh nếu được kích hoạt. Yield dict, có "id" sau khi đã lưu profile."""
+    global _PROFILE_SEQ
+    box: Dict[str, Any] = {}
+    trigger = _profile_trigger() if _PROFILING else ""
+    if not trigger or not _PROFILE_LOCK.acquire(blocking=False):
+        yield box
+        return
+    prof = cProfile.Profile()
+    t0 = time.perf_counter()
+    try:
+        prof.enable()
+        try:
+            yield box
+        finally:
+            prof.disable()
+    finally:
+        _PROFILE_LOCK.release()
+        prof.create_stats()
+        _PROFILE_SEQ += 1
+        box["id"] = _PROFILE_SEQ
+        _PROFILES.append({
+            "id": _PROFILE_SEQ, "kind": kind, "trigger": trigger, "label": label,
+            "at": round(time.time(), 3), "ms": round((time.perf_counter() - t0) * 1000.0, 3),
+            "stats": prof.stats,
+        })
+
+def _profiled(kind: str):
+    """Decorator cho view: profile cả request."""
+    def deco(fn):
+        if not _PROFILING:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _profile_run(kind, request.path) as box:
+                resp = fn(*args, **kwargs)
+            if "id" in box:
+                resp = make_response(resp)
+                resp.headers["X-Profile-Id"] = str(box["id"])
+            return resp
+        return wrapper
+    return deco
+
+def _profile_top(stats: Dict[Any, Any], n: int = 10) -> List[Dict[str, Any]]:
+    rows = sorted(stats.items(), key=lambda kv: kv[1][2], reverse=True)[:n]
+    return [{"func": f"{f[0]}:{f[1]}({f[2]})", "calls": v[1], "tottime_ms": round(v[2] * 1000.0, 3),
+             "cumtime_ms": round(v[3] * 1000.0, 3)} for f, v in rows]
+
+def _profile_speedscope(p: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    pstats -> speedscope "sampled". cProfile không giữ stack thật: mỗi hàm 1 sample
+    nặng = tottime, stack dựng theo caller tốn nhiều cumtime nhất (gần đúng, đủ để đọc flame graph).
+    """
+    stats = p["stats"]
+    frames: List[Dict[str, Any]] = []
+    fidx: Dict[Any, int] = {}
+
+    def frame(func) -> int:
+        if func not in fidx:
+            fidx[func] = len(frames)
+            frames.append({"name": func[2], "file": func[0], "line": func[1]})
+        return fidx[func]
+
+    samples, weights = [], []
+    for func, (_, _, tt, _, _) in stats.items():
+        if tt <= 0:
+            continue
+        stack, cur, seen = [func], func, {func}
+        while len(stack) < 64:
+            callers = stats.get(cur, (0, 0, 0, 0, {}))[4]
+            if not callers:
+                break
+            cur = max(callers, key=lambda c: callers[c][3])
+            if cur in seen:
+                break
+            seen.add(cur)
+            stack.append(cur)
+        samples.append([frame(f) for f in reversed(stack)])
+        weights.append(round(tt * 1000.0, 4))
+    name = f"{p['kind']} #{p['id']} {p['label']}".strip()
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "checkdonhang",
+        "shared": {"frames": frames},
+        "profiles": [{"type": "sampled", "name": name, "unit": "milliseconds",
+                      "startValue": 0, "endValue": round(sum(weights), 4),
+                      "samples": samples, "weights": weights}],
+    }
+
+
+# =========================================================
+# Theo dõi đơn của 1 khách (tên đúng đủ hoặc SĐT nhận) thay cho bấm tìm đi tìm lại
+# snapshot ghi lại mỗi dòng đổi (version, dòng, tên/SĐT cũ+mới) vào log có giới hạn;
+# ?since=<version> -> chỉ trả đơn của khách đó đổi sau version này.
+# Snapshot build lại từ đầu / since quá cũ so với log -> trả toàn bộ ("reset": true)
+# Chỉ theo dõi vùng hot (đơn gần đây, nơi MVĐ mới xuất hiện).
+# =========================================================
+WATCH_LOG_MAX = int(os.getenv("WATCH_LOG_MAX", "20000"))
+WATCH_MAX_WAIT = float(os.getenv("WATCH_MAX_WAIT", "25"))         # long-poll tối đa (giây)
+WATCH_SSE_MAX_S = float(os.getenv("WATCH_SSE_MAX_S", "600"))      # 1 kết nối SSE tối đa, client tự nối lại
+WATCH_MAX_WAITERS = int(os.getenv("WATCH_MAX_WAITERS", "256"))    # mỗi người chờ giữ 1 thread
+
+# (version, dòng, {tên, SĐT} cũ + mới); dòng None = mốc reset
+_WATCH_LOG: "deque[Tuple[int, Optional[int], Optional[frozenset]]]" = deque(maxlen=WATCH_LOG_MAX)
+_WATCH_COND = threading.Condition()
+_WATCH_STATE: Dict[str, Any] = {"muted": False, "waiters": 0, "notified": 0, "sent": 0}
+
+def _watch_log(r: int, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]):
+    if _WATCH_STATE["muted"]:
+        return
+    keys = set()
+    for it in (old, new):
+        if it is not None:
+            keys.add(it["name_norm"])
+            keys.add(_phone_key(it["phone"]))
+    keys.discard("")
+    _WATCH_LOG.append((_SNAPSHOT_VERSION, r, frozenset(keys)))
+
+def _watch_reset(version: int):
+    _WATCH_LOG.append((version, None, None))
+
+def _watch_notify():
+    with _WATCH_COND:
+        _WATCH_STATE["notified"] += 1
+        _WATCH_COND.notify_all()
+
+def _watch_key(q: str) -> Tuple[str, str]:
+    # theo SĐT nhận chỉ khi tìm theo SĐT / MVĐ được bật, như /api/search
+    pk = _phone_key(q) if SEARCH_BY_PHONE_MVD else ""
+    return _norm(q), (pk if len(pk) >= 9 else "")
+
+def _watch_rows(qn: str, pk: str, tier: Dict[str, Any]) -> set:
+    rows = set(_index_get(tier["name"], qn)) if qn else set()
+    if pk:
+        rows.update(_index_get(tier["phone"], pk))
+    return rows
+
+def _watch_diff(qn: str, pk: str, since: int) -> Tuple[int, Optional[Dict[str, Any]]]:
+    """
+    Đơn của khách đổi sau version since. Return (version đã xét tới, diff);
+    diff None = không có gì đổi tới version đó.
+    """
+    tier = _HOT_TIER
+    cur, snap = tier["version"], tier["items"]
+    log = list(_WATCH_LOG)
+    reset = since < 0 or since > cur or (len(log) == WATCH_LOG_MAX and since < log[0][0])
+    rows = set()
+    for v, r, keys in log:
+        if reset:
+            break
+        if v <= since or v > cur:
+            continue
+        if r is None:
+            reset = True
+        elif qn in keys or pk in keys:
+            rows.add(r)
+
+    def match(it: Dict[str, Any]) -> bool:
+        return it["name_norm"] == qn or bool(pk and _phone_key(it["phone"]) == pk)
+
+    if reset:
+        items = [snap[r] for r in sorted(_watch_rows(qn, pk, tier), reverse=True) if r in snap]
+        return cur, {"version": cur, "reset": True, "removed": [],
+                     "changed": [dict(_item_card(it, i), row=it["_row"]) for i, it in enumerate(items, start=1)]}
+    if not rows:
+        return cur, None
+    changed, removed = [], []
+    for r in sorted(rows, reverse=True):
+        it = snap.get(r)
+        if it is not None and match(it):
+            changed.append(dict(_item_card(it, len(changed) + 1), row=r))
+        else:
+            removed.append(r)
+    return cur, {"version": cur, "reset": False, "changed": changed, "removed": removed}
+
+def _watch_wait(qn: str, pk: str, since: int, timeout: float) -> Tuple[int, Optional[Dict[str, Any]]]:
+    """
+    Chờ tới khi đơn của khách đổi hoặc hết timeout. Return (version đã xét tới, diff/None).
+    Không có webhook thì tự refresh theo TTL trong lúc chờ.
+    """
+    deadline = time.time() + timeout
+    while True:
+        _sync_snapshot()
+        # chỉ tiến tới đúng version đã xét: bản publish chen vào giữa sẽ được xét ở vòng sau
+        since, d = _watch_diff(qn, pk, since)
+        if d is not None:
+            with _WATCH_COND:
+                _WATCH_STATE["sent"] += 1
+            return since, d
+        left = deadline - time.time()
+        if left <= 0:
+            return since, None
+        with _WATCH_COND:
+            # publish trước notify -> xét version trong khoá thì không lỡ notify nào
+            if _HOT_TIER["version"] == since:
+                _WATCH_COND.wait(min(left, max(1.0, _CACHE_TTL)))
+
+def _watch_join() -> bool:
+    """Giữ 1 chỗ chờ. False = đã đủ WATCH_MAX_WAITERS người chờ."""
+    with _WATCH_COND:
+        if _WATCH_STATE["waiters"] >= WATCH_MAX_WAITERS:
+            return False
+        _WATCH_STATE["waiters"] += 1
+        return True
+
+def _watch_leave():
+    with _WATCH_COND:
+        _WATCH_STATE["waiters"] -= 1
+
+def _watch_stats() -> Dict[str, Any]:
+    return {"waiters": _WATCH_STATE["waiters"], "notified": _WATCH_STATE["notified"],
+            "sent": _WATCH_STATE["sent"], "log": len(_WATCH_LOG),
+            "log_from_version": _WATCH_LOG[0][0] if _WATCH_LOG else None}
 
 
 # =========================================================
@@ -532,7 +2420,8 @@ body{
   <div class="search-box">
     <h2>🔎 Tra cứu đơn hàng</h2>
     <div class="search-row">
-      <input id="q" placeholder="Nhập tên zalo của bạn + mã số (vd: Ngân Miu + mã só)">
+      <input id="q" list="sug" autocomplete="off" placeholder="Nhập tên zalo của bạn + mã số (vd: Ngân Miu + mã só)">
+      <datalist id="sug"></datalist>
       <button onclick="doSearch()">Tìm</button>
     </div>
     <div id="msg" class="msg"></div>
@@ -547,7 +2436,28 @@ body{
 </div>
 
 <script>
-async function doSearch(){
+// multi-tenant qua /t/<shop>/ -> API nằm dưới cùng prefix
+const BASE = location.pathname.replace(/\/+$/, "");
+
+// tìm xong thì theo dõi luôn (SSE): đơn đổi (vd có MVĐ) -> tự tải lại, khỏi bấm tìm lại
+// kết quả GET có thể là bản cũ ở edge nên không có version: nối không kèm since,
+// event đầu (reset) chỉ là mốc version hiện tại; sau đó server tự theo dõi tiếp từ version
+// của event vừa gửi (EventSource nối lại cũng gửi Last-Event-ID = version đó)
+let watch = null, watchQ = "";
+function startWatch(q){
+  if(watch && watchQ === q) return;
+  if(watch){ watch.close(); watch = null; }
+  if(!window.EventSource) return;
+  watchQ = q;
+  let first = true;
+  watch = new EventSource(BASE + "/api/watch?q=" + encodeURIComponent(q));
+  watch.addEventListener("change", ()=>{
+    if(first){ first = false; return; }
+    doSearch(true);
+  });
+}
+
+async function doSearch(updated){
   const q = document.getElementById("q").value.trim();
   const msg = document.getElementById("msg");
   const results = document.getElementById("results");
@@ -564,11 +2474,12 @@ async function doSearch(){
   }
 
   try{
-    const res = await fetch("/api/search",{
-      method:"POST",
-      headers:{"Content-Type":"application/json"},
-      body:JSON.stringify({q})
-    });
+    // GET theo query đã bỏ dấu -> edge (Vercel) cache được, lần tra lặp lại không gọi tới Python
+    // watch báo đổi -> POST (không qua cache) để chắc chắn thấy bản mới
+    const res = updated === true
+      ? await fetch(BASE + "/api/search", {method: "POST", headers: {"Content-Type": "application/json"},
+                                           body: JSON.stringify({q})})
+      : await fetch(BASE + "/api/search?q=" + encodeURIComponent(foldVi(q)));
     const js = await res.json();
 
     if(!js.ok){
@@ -582,9 +2493,17 @@ async function doSearch(){
       msg.textContent="❌ Không tìm thấy đơn phù hợp";
       msg.className="msg err";
       msg.style.display="block";
+      startWatch(q);  // đơn chưa nhập -> nhập xong tự hiện
       return;
     }
 
+    if(updated === true){
+      msg.textContent="🔔 Đơn của bạn vừa được cập nhật";
+      msg.className="msg";
+      msg.style.display="block";
+    }
+    startWatch(q);
+
     js.items.forEach(it=>{
       const div=document.createElement("div");
       div.innerHTML=it.html;
@@ -612,54 +2531,1100 @@ async function doSearch(){
 document.getElementById("q").addEventListener("keydown",e=>{
   if(e.key==="Enter") doSearch();
 });
+
+// gợi ý tên khi gõ (bỏ dấu giống server để URL trùng -> CDN cache)
+let sugTimer=null;
+function foldVi(s){
+  return s.normalize("NFD").replace(/[\u0300-\u036f]/g,"").toLowerCase().trim().split(/\s+/).join(" ");
+}
+document.getElementById("q").addEventListener("input",e=>{
+  clearTimeout(sugTimer);
+  const p = foldVi(e.target.value);
+  if(p.length < {{suggest_min}}) return;
+  sugTimer = setTimeout(async ()=>{
+    try{
+      const res = await fetch(BASE + "/api/suggest?q=" + encodeURIComponent(p));
+      const js = await res.json();
+      const dl = document.getElementById("sug");
+      dl.innerHTML = "";
+      (js.names || []).forEach(n=>{
+        const o = document.createElement("option");
+        o.value = n;
+        dl.appendChild(o);
+      });
+    }catch(e){}
+  }, 150);
+});
 </script>
 
 </body>
 </html>
 """
 
+# trang chủ không phụ thuộc request -> render 1 lần (render_template_string compile lại mỗi lần gọi)
+_INDEX_PAGE: Optional[str] = None
+
+def _index_page() -> str:
+    global _INDEX_PAGE
+    if _INDEX_PAGE is None:
+        _INDEX_PAGE = render_template_string(INDEX_HTML, banner=BRAND_BANNER, footer=BRAND_FOOTER,
+                                             suggest_min=SUGGEST_MIN_PREFIX)
+    return _INDEX_PAGE
+
 @app.get("/")
 def index():
-    return render_template_string(INDEX_HTML, banner=BRAND_BANNER, footer=BRAND_FOOTER)
+    return _index_page()
+
+def _search_response(q: str, data: Dict[str, Any], t0: float) -> Tuple[Dict[str, Any], int]:
+    """Phần chung của POST / GET /api/search. Return (body, status)."""
+    _alog(_q=q, mode=data.get("mode") or "", scope=data.get("scope") or "")
+    if len(q) < 2:
+        _trace(q, data, 200, -1, t0)
+        return {"ok": False, "msg": "Tên quá ngắn"}, 200
+    try:
+        rows = _search(q, data.get("mode"), data.get("scope") or "")  # ✅ đã sort mới → cũ
+    except ValueError as e:
+        _alog_error(e)
+        _trace(q, data, 400, -1, t0)
+        return {"ok": False, "msg": str(e)}, 400
+
+    t1 = time.perf_counter()
+    items = [_item_card(r, idx) for idx, r in enumerate(rows, start=1)]
+    _alog_stage("render", t1)
+    _alog(n=len(items))
+
+    _trace(q, data, 200, len(items), t0)
+    return {"ok": True, "items": items, "version": _SNAP_BUILT_VERSION}, 200
+
+def _rate_limited(data: Dict[str, Any], t0: float) -> Optional[Response]:
+    wait = _SEARCH_LIMITER.hit(_client_ip())
+    if wait <= 0:
+        return None
+    retry = max(1, int(wait + 0.999))
+    _alog(limited=True)
+    _trace("", data, 429, -1, t0)
+    return _send({"ok": False, "msg": f"Bạn tra cứu quá nhanh, thử lại sau {retry} giây"},
+                 429, {"Retry-After": str(retry), "Cache-Control": "no-store"})
 
 @app.post("/api/search")
+@_profiled("search")
 def api_search():
+    t0 = time.perf_counter()
+    data: Dict[str, Any] = {}
+    q = ""
+    limited = _rate_limited(data, t0)
+    if limited is not None:
+        return limited
+
     try:
         data = request.get_json(silent=True) or {}
         q = (data.get("q") or "").strip()
-        if len(q) < 2:
-            return jsonify({"ok": False, "msg": "Tên quá ngắn"})
+        body, status = _search_response(q, data, t0)
+        return _send(body, status)
 
-        rows = _search_by_name(q)  # ✅ đã sort mới → cũ
+    except Exception as e:
+        _alog_error(e)
+        _trace(q, data, 500, -1, t0)
+        return _send({"ok": False, "msg": f"Lỗi server: {e}"}, 500)
 
-        items = []
-        for idx, r in enumerate(rows, start=1):
-                card = _build_card({
-                        "mvd": r.get("mvd", ""),
-                        "status": r.get("status", ""),
-                        "product": r.get("product", ""),
-                        "cod": r.get("cod", ""),
-                        "name": r.get("receiver", ""),
-                        "phone": r.get("phone", ""),
-                        "addr": r.get("addr", ""),
-                }, idx)
+# edge giữ kết quả tối đa chừng này giây kể cả khi TTL refresh dài hơn
+# (có webhook thì TTL = lưới an toàn 300s, nhưng sheet sửa là phải thấy sớm)
+SEARCH_EDGE_MAX_AGE = int(os.getenv("SEARCH_EDGE_MAX_AGE", "60"))
 
-                items.append(card)
+@app.get("/api/search")
+@_profiled("search")
+def api_search_get():
+    """
+    GET /api/search?q=<query đã bỏ dấu, chữ thường>&mode=&scope= — giống POST nhưng CDN cache được:
+    - URL chuẩn duy nhất cho mỗi query (q chưa chuẩn hoá / tham số lạ -> 301 về URL chuẩn)
+    - Cache-Control s-maxage + stale-while-revalidate theo TTL refresh snapshot
+    - ETag theo nội dung kết quả -> edge / trình duyệt revalidate nhận 304
+    """
+    t0 = time.perf_counter()
+    raw = (request.args.get("q") or "").strip()
+    data = {"mode": request.args.get("mode") or "", "scope": request.args.get("scope") or ""}
+    q = _norm(raw)
+    canon = [(k, v) for k, v in (("q", q), ("mode", data["mode"]), ("scope", data["scope"])) if v]
+    if q != raw or len(canon) != len(request.args):
+        resp = redirect(f"{request.script_root}{request.path}?{urlencode(canon, quote_via=quote)}", 301)
+        resp.headers["Cache-Control"] = "public, max-age=86400, s-maxage=86400"
+        return resp
+
+    limited = _rate_limited(data, t0)
+    if limited is not None:
+        return limited
+    try:
+        body, status = _search_response(q, data, t0)
+    except Exception as e:
+        _alog_error(e)
+        _trace(q, data, 500, -1, t0)
+        return _send({"ok": False, "msg": f"Lỗi server: {e}"}, 500, {"Cache-Control": "no-store"})
+    if status != 200:
+        return _send(body, status, {"Cache-Control": "no-store"})
+
+    # body cache ở edge không mang "version": bản cũ trả về kèm version cũ -> /api/watch
+    # báo đổi ngay -> tìm lại -> lại nhận bản cũ (vòng lặp tới 429). Version chỉ có ở POST.
+    # snapshot đổi ở đơn khách khác thì body y hệt -> ETag y hệt -> vẫn 304 được
+    body.pop("version", None)
+    etag = hashlib.blake2b(_dumps_json(body), digest_size=12).hexdigest()
+    ttl = max(1, int(min(_CACHE_TTL, SEARCH_EDGE_MAX_AGE)))
+    headers = {
+        "ETag": f'W/"{etag}"',
+        # trình duyệt luôn revalidate (max-age=0), edge giữ ttl giây + phục vụ bản cũ trong lúc refresh
+        "Cache-Control": f"public, max-age=0, s-maxage={ttl}, stale-while-revalidate={ttl * 2}",
+        "Server-Timing": f"search;dur={(time.perf_counter() - t0) * 1000.0:.3f}",
+    }
+    if request.if_none_match.contains_weak(etag):
+        _alog(revalidated=True)
+        resp = Response(status=304)
+        resp.headers.update(headers)
+        resp.headers["Vary"] = "Accept, Accept-Encoding"
+        return resp
+    return _send(body, 200, headers)
+
+@app.get("/api/watch")
+def api_watch():
+    """
+    Theo dõi đơn của 1 khách: ?q=<tên đúng đủ, hoặc SĐT nhận nếu SEARCH_BY_PHONE_MVD=1>&since=<version>
+    - mặc định long-poll: chờ tối đa ?wait= giây (<= WATCH_MAX_WAIT), có đổi thì trả ngay
+    - Accept: text/event-stream -> SSE, mỗi lần đổi 1 event "change" (id = version,
+      EventSource nối lại tự gửi Last-Event-ID làm since)
+    Kết quả: {"version", "reset", "changed": [card + row], "removed": [row]}
+    """
+    wait = _SEARCH_LIMITER.hit(_client_ip())
+    if wait > 0:
+        retry = max(1, int(wait + 0.999))
+        return _send({"ok": False, "msg": f"Thử lại sau {retry} giây"}, 429, {"Retry-After": str(retry)})
+
+    q = (request.args.get("q") or "").strip()
+    qn, pk = _watch_key(q)
+    if len(qn) < 2:
+        return _send({"ok": False, "msg": "Tên quá ngắn"}, 400)
+    try:
+        since = int(request.headers.get("Last-Event-ID") or request.args.get("since", "-1"))
+    except ValueError:
+        since = -1
+    try:
+        msg = _sync_snapshot()
+        if msg:
+            return _send({"ok": False, "msg": msg})
+    except Exception as e:
+        return _send({"ok": False, "msg": f"Lỗi server: {e}"}, 500)
+
+    # quá nhiều người đang chờ -> trả ngay, client hỏi lại sau
+    busy = _WATCH_STATE["waiters"] >= WATCH_MAX_WAITERS
+
+    if request.accept_mimetypes.best == "text/event-stream" and not busy:
+        def stream():
+            nonlocal since
+            yield "retry: 5000\n\n"
+            if not _watch_join():  # đầy trong lúc chờ bắt đầu -> đóng, EventSource tự nối lại
+                return
+            try:
+                end = time.time() + WATCH_SSE_MAX_S
+                while time.time() < end:
+                    since, d = _watch_wait(qn, pk, since, min(15.0, end - time.time()))
+                    if d is None:
+                        yield ": ping\n\n"  # giữ kết nối qua proxy
+                        continue
+                    yield f"event: change\nid: {since}\ndata: {_dumps_json(d).decode('utf-8')}\n\n"
+            finally:
+                _watch_leave()
+
+        return Response(stream(), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    joined = _watch_join()
+    try:
+        timeout = min(WATCH_MAX_WAIT, max(0.0, float(request.args.get("wait", WATCH_MAX_WAIT)))) if joined else 0.0
+        version, d = _watch_wait(qn, pk, since, timeout)
+    except Exception as e:
+        return _send({"ok": False, "msg": f"Lỗi server: {e}"}, 500)
+    finally:
+        if joined:
+            _watch_leave()
+    out = {"ok": True, "version": version, "reset": False, "changed": [], "removed": []}
+    if d is not None:
+        out.update(d)
+    return _send(out, headers={"Cache-Control": "no-store"})
+
+@app.get("/api/suggest")
+def api_suggest():
+    """
+    GET /api/suggest?q=<prefix>&k=5 — client gửi prefix đã bỏ dấu + chữ thường
+    để URL trùng nhau -> CDN cache được theo từng prefix.
+    """
+    t0 = time.perf_counter()
+    wait = _SEARCH_LIMITER.hit(_client_ip())
+    if wait > 0:
+        retry = max(1, int(wait + 0.999))
+        return _send({"ok": False, "msg": f"Thử lại sau {retry} giây"}, 429,
+                     {"Retry-After": str(retry), "Cache-Control": "no-store"})
+
+    prefix = _norm(request.args.get("q", ""))
+    try:
+        k = max(1, min(SUGGEST_MAX_K, int(request.args.get("k", str(SUGGEST_MAX_K)))))
+    except Exception:
+        k = SUGGEST_MAX_K
+
+    names: List[str] = []
+    if len(prefix) >= SUGGEST_MIN_PREFIX:
+        try:
+            _sync_snapshot()
+            names = _suggest(prefix, k)
+        except Exception:
+            names = []
+
+    ttl = max(1, int(_CACHE_TTL))
+    return _send({"ok": True, "q": prefix, "names": names}, 200, {
+        "Cache-Control": f"public, max-age={ttl}, s-maxage={ttl}, stale-while-revalidate={ttl * 2}",
+        "Server-Timing": f"suggest;dur={(time.perf_counter() - t0) * 1000.0:.3f}",
+    })
+
+def _is_admin() -> bool:
+    # chỉ nhận qua header: token trên query string sẽ nằm trong access log / log CDN
+    tok = request.headers.get("X-Admin-Token") or ""
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(tok.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+@app.get("/api/stats")
+def api_stats():
+    """
+    Số liệu cho chủ shop (cần ADMIN_TOKEN): đếm theo trạng thái, tổng COD,
+    COD chưa thu, đơn chưa có MVĐ. ?missing=1 -> kèm danh sách đơn chưa có MVĐ.
+    """
+    if not _is_admin():
+        return jsonify({"ok": False, "msg": "Không có quyền"}), 403
+    try:
+        msg = _sync_snapshot()
+        if msg:
+            return jsonify({"ok": False, "msg": msg})
+
+        tier = _HOT_TIER
+        out = {"ok": True, "version": tier["version"]}
+        # tiering: mặc định gộp cả đơn cũ trong archive; ?scope=hot -> chỉ vùng hot
+        if HOT_ROWS and request.args.get("scope") != "hot":
+            out.update(_agg_merge(tier["agg"], tier["cold"]["agg"]))
+        else:
+            out.update(tier["agg"])
+        if request.args.get("missing"):
+            try:
+                limit = int(request.args.get("limit", "500"))
+            except ValueError:
+                limit = 500
+            limit = max(1, min(limit, 5000))
+            snap = tier["items"]
+            rows = sorted(tier["missing"], reverse=True)[:limit]
+            out["missing_mvd_items"] = [_export_row(snap[r]) for r in rows if r in snap]
+        return jsonify(out)
+    except Exception as e:
+        return jsonify({"ok": False, "msg": f"Lỗi server: {e}"}), 500
+
+# chống replay: payload cũ hơn 5 phút bị từ chối
+_REFRESH_MAX_SKEW = 300
 
+@app.post("/api/refresh")
+@_profiled("refresh")
+def api_refresh():
+    """
+    Webhook cho Apps Script onEdit/onChange (xem apps_script/refresh_trigger.gs).
+    Body JSON: {"ts": <unix>, "row_start": 12, "row_end": 14}  -> chỉ tải lại dòng 12..14
+               {"ts": <unix>, "full": true}                    -> tải lại cả sheet
+    Header:    X-Signature: sha256=<hex HMAC-SHA256(body, REFRESH_WEBHOOK_SECRET)>
+
+    Test local:
+      body='{"ts":'$(date +%s)',"row_start":5,"row_end":5}'
+      sig=$(printf %s "$body" | openssl dgst -sha256 -hmac "$REFRESH_WEBHOOK_SECRET" | sed 's/^.* //')
+      curl -X POST localhost:5000/api/refresh -H "X-Signature: sha256=$sig" -d "$body"
+    """
+    if not REFRESH_WEBHOOK_SECRET:
+        return jsonify({"ok": False, "msg": "Webhook chưa bật"}), 404
+
+    body = request.get_data(cache=True) or b""
+    if not _verify_signature(body, request.headers.get("X-Signature", "")):
+        return jsonify({"ok": False, "msg": "Sai chữ ký"}), 401
+
+    try:
+        data = json.loads(body.decode("utf-8") or "{}")
+    except Exception:
+        data = None
+    if not isinstance(data, dict):
+        return jsonify({"ok": False, "msg": "Body không phải JSON"}), 400
+
+    try:
+        ts = float(data.get("ts") or 0)
+    except Exception:
+        ts = 0
+    if abs(time.time() - ts) > _REFRESH_MAX_SKEW:
+        return jsonify({"ok": False, "msg": "Payload hết hạn"}), 401
 
-        return jsonify({"ok": True, "items": items})
+    tab = (data.get("sheet") or "").strip()
+    if tab and tab != GOOGLE_SHEET_TAB:
+        # sửa ở tab khác -> không liên quan
+        return jsonify({"ok": True, "skipped": True, "version": _SNAPSHOT_VERSION})
 
+    try:
+        if data.get("full") or data.get("row_start") is None:
+            _refresh_snapshot(force=True)
+            rows = _SNAP_LEN
+        else:
+            row_start = int(data.get("row_start"))
+            row_end = int(data.get("row_end") or row_start)
+            rows = _refresh_rows(row_start, row_end)
+    except ValueError as e:
+        return jsonify({"ok": False, "msg": str(e)}), 400
     except Exception as e:
         return jsonify({"ok": False, "msg": f"Lỗi server: {e}"}), 500
 
+    return jsonify({"ok": True, "rows": rows, "version": _SNAPSHOT_VERSION})
+
+@app.get("/api/profiles")
+def api_profiles():
+    """Danh sách profile đang giữ (cần ADMIN_TOKEN), kèm top hàm tốn thời gian."""
+    if not _is_admin():
+        return jsonify({"ok": False, "msg": "Không có quyền"}), 403
+    out = [{k: v for k, v in p.items() if k != "stats"} for p in reversed(_PROFILES)]
+    for o, p in zip(out, reversed(_PROFILES)):
+        o["top"] = _profile_top(p["stats"], 5)
+    return jsonify({"ok": True, "enabled": _PROFILING, "sample": PROFILE_SAMPLE, "keep": PROFILE_KEEP,
+                    "profiles": out})
+
+@app.get("/api/profiles/<int:pid>")
+def api_profile(pid: int):
+    """
+    ?format=pstats (mặc định): file cho `python -m pstats x.prof` / snakeviz
+    ?format=speedscope: JSON mở ở https://www.speedscope.app
+    """
+    if not _is_admin():
+        return jsonify({"ok": False, "msg": "Không có quyền"}), 403
+    p = next((p for p in list(_PROFILES) if p["id"] == pid), None)
+    if p is None:
+        return jsonify({"ok": False, "msg": "Không có profile này (đã bị đẩy khỏi buffer?)"}), 404
+    if request.args.get("format") == "speedscope":
+        resp = Response(_dumps_json(_profile_speedscope(p)), mimetype="application/json")
+        fname = f"profile_{pid}.speedscope.json"
+    else:
+        resp = Response(marshal.dumps(p["stats"]), mimetype="application/octet-stream")
+        fname = f"profile_{pid}.prof"
+    resp.headers["Content-Disposition"] = f"attachment; filename={fname}"
+    return resp
+
+# =========================================================
+# Health: liveness / readiness không bao giờ gọi Google
+# =========================================================
+@app.get("/livez")
+def livez():
+    return jsonify({"ok": True})
+
+def _readiness() -> Dict[str, Any]:
+    now = time.time()
+    last_ok = _FETCH_STATE["last_ok_at"]
+    return {
+        "ready": _SNAP_BUILT_VERSION >= 0,
+        "tab": GOOGLE_SHEET_TAB,
+        "snapshot_version": _SNAP_BUILT_VERSION,
+        "snapshot_age_s": round(now - last_ok, 1) if last_ok else None,
+        "rows": _HOT_TIER["len"],
+        "items": len(_HOT_TIER["items"]),
+        "last_fetch_ms": _FETCH_STATE["last_fetch_ms"],
+        "last_error": _FETCH_STATE["last_error"],
+        "last_error_age_s": round(now - _FETCH_STATE["last_error_at"], 1) if _FETCH_STATE["last_error_at"] else None,
+        "fetch_errors": _FETCH_STATE["errors"],
+        "warmup": dict(_WARM_STATE),
+    }
+
+@app.get("/readyz")
+def readyz():
+    st = _readiness()
+    st["ok"] = st["ready"]
+    return jsonify(st), (200 if st["ready"] else 503)
+
 @app.get("/health")
 def health():
+    """
+    Mặc định: chỉ đọc trạng thái trong RAM (không network).
+    ?deep=1 + ADMIN_TOKEN: kết nối + fetch Google thật để kiểm tra.
+    """
+    out = _readiness()
+    out.update({"ok": True, "ratelimit": _SEARCH_LIMITER.stats(), "refresh": _refresh_stats(),
+                "snapshot": _snapshot_stats(), "serialization": _serial_stats(),
+                "tiers": _tier_stats(), "misses": _miss_stats(), "watch": _watch_stats(),
+                "access_log": _alog_stats(), "replication": _repl_stats()})
+    if not request.args.get("deep"):
+        return jsonify(out)
+
+    if not _is_admin():
+        return jsonify({"ok": False, "msg": "Không có quyền"}), 403
     try:
+        t0 = time.perf_counter()
         _connect_sheet()
-        return jsonify({"ok": True, "tab": GOOGLE_SHEET_TAB})
+        _refresh_snapshot(force=True)
+        out.update(_readiness())
+        out["deep_ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+        return jsonify(out)
     except Exception as e:
         return jsonify({"ok": False, "msg": str(e)}), 500
 
 
+# =========================================================
+# Replication: 1 primary fetch Google, các instance khác (region khác) kéo snapshot từ nó
+# -> số lần gọi Google không đổi khi thêm instance, các region lệch nhau tối đa REPLICATION_PULL_S
+# - primary giữ log op đã nén gzip: op đầu luôn là "full" (cả values), sau đó các "patch"
+#   (r0 + dòng đổi, None = giữ nguyên). Log patch dài quá -> lần fetch sau chụp full mới
+# - chỉ gửi các cột app dùng (_COL_WANTS), cột khác (Cookie...) để trống: dữ liệu nhạy cảm
+#   không rời primary. Dòng title/header gửi nguyên -> replica dò ra đúng header, đúng cột
+# - GET /api/replica/snapshot?epoch=&since= : replica gửi version đang có -> nhận đúng các op
+#   còn thiếu (hoặc full nếu primary đã khởi động lại / log đã cắt), không có gì mới -> 304
+# - REPLICATION_PEERS=<url,...> : primary đẩy op mới sang replica (POST /api/replica/push)
+#   ngay khi có, không phải chờ chu kỳ kéo; lệch version -> 409, replica tự kéo bù
+# - 2 process local:
+#     python sheets_sim.py --port 8089 &
+#     SHEETS_API_BASE=http://127.0.0.1:8089 GOOGLE_SHEET_ID=sim REPLICATION_ROLE=primary \
+#       REPLICATION_SECRET=s python app.py serve --port 5000
+#     REPLICA_OF=http://127.0.0.1:5000 REPLICATION_SECRET=s python app.py serve --port 5001
+#   (có HOT_ROWS: mỗi process cùng máy 1 ARCHIVE_PATH riêng)
+# =========================================================
+REPLICATION_PEERS = [u.strip().rstrip("/") for u in _cfg("replication_peers", "REPLICATION_PEERS").split(",")
+                     if u.strip()]
+REPLICATION_TIMEOUT = float(os.getenv("REPLICATION_TIMEOUT", "20"))
+REPLICATION_LOG_MIN_BYTES = 64 * 1024  # log patch nhỏ hơn mức này thì giữ, không chụp full lại
+
+_REPL_EPOCH = os.urandom(6).hex()  # đổi mỗi lần primary khởi động -> replica biết phải lấy full
+_REPL_LOG: List[Tuple[int, bytes]] = []  # [(version, gzip 1 dòng JSON op)], [0] luôn là full
+_REPL: Dict[str, Any] = {"want_full": False, "full_bytes": 0, "patch_bytes": 0,
+                         "cols": (-1, [])}  # (dòng header, các cột được gửi) của op full gần nhất
+_REPL_STATE: Dict[str, Any] = {"epoch": "", "version": -1}  # replica: đang ở op nào của primary
+_REPL_STATS: Dict[str, Any] = {"served": 0, "not_modified": 0, "bytes_out": 0, "pushes": 0, "push_errors": 0,
+                               "pulls": 0, "bytes_in": 0, "ops_applied": 0, "resyncs": 0, "rejected": 0}
+_REPL_HTTP = requests.Session()  # giữ kết nối tới primary / peer
+_REPL_PUSH_Q: "queue.Queue[Tuple[int, int, bytes]]" = queue.Queue(maxsize=64)
+_REPL_PUSH_THREAD: Optional[threading.Thread] = None
+
+def _repl_blob(op: Dict[str, Any]) -> bytes:
+    # mỗi op 1 member gzip: nối các member lại vẫn là 1 file gzip hợp lệ
+    return gzip.compress(_dumps_json(op) + b"\n", compresslevel=6)
+
+def _repl_columns(values: List[List[str]]) -> Tuple[int, List[int]]:
+    """Dò header giống lúc build snapshot -> (dòng header, các cột app dùng)."""
+    if not values:
+        return -1, []
+    hdr_idx = _detect_header_row(values)
+    if hdr_idx >= len(values):
+        hdr_idx = 0
+    mp = _build_header_map(values[hdr_idx])
+    return hdr_idx, sorted({c for c in (_pick_col(mp, w) for w in _COL_WANTS.values()) if c >= 0})
+
+def _repl_project(row: Optional[List[str]], r: int) -> Optional[List[str]]:
+    """Dòng đơn -> chỉ giữ cột app dùng (vị trí cột không đổi), cột khác để trống."""
+    hdr_idx, keep = _REPL["cols"]
+    if row is None or r <= hdr_idx:
+        return row
+    out = [""] * (keep[-1] + 1) if keep else []
+    for c in keep:
+        if c < len(row):
+            out[c] = row[c]
+    return out
+
+def _repl_publish_full(values: List[List[str]], version: int):
+    _REPL["cols"] = _repl_columns(values)
+    rows = [_repl_project(row, r) for r, row in enumerate(values)]
+    blob = _repl_blob({"v": version, "kind": "full", "values": rows})
+    _REPL_LOG[:] = [(version, blob)]
+    _REPL.update(want_full=False, full_bytes=len(blob), patch_bytes=0)
+    _repl_push(-1, version, blob)  # base -1: replica nào cũng nhận được
+
+def _repl_publish_patch(r0: int, rows: List[Optional[List[str]]], version: int):
+    global _COLD_AT
+    base = _REPL_LOG[-1][0]
+    rows = [_repl_project(row, r0 + i) for i, row in enumerate(rows)]
+    blob = _repl_blob({"v": version, "kind": "patch", "r0": r0, "rows": rows})
+    _REPL_LOG.append((version, blob))
+    _REPL["patch_bytes"] += len(blob)
+    if _REPL["patch_bytes"] > max(REPLICATION_LOG_MIN_BYTES, _REPL["full_bytes"]):
+        # replica mới phải tải full + cả chuỗi patch -> chụp full mới ở lần fetch cả sheet tới
+        _REPL["want_full"] = True
+        if HOT_ROWS:
+            _COLD_AT = 0.0
+    _repl_push(base, version, blob)
+
+def _repl_on_load(values: List[List[str]], hashes: List[int], version: int,
+                  full: bool = False, changed: bool = True):
+    """Primary: fetch cả sheet sắp vào snapshot -> ghi op (chỉ dòng đổi nếu được). values chưa bị tiêu thụ."""
+    if REPLICATION_ROLE != "primary":
+        return
+    if not changed:
+        if _REPL["want_full"]:
+            _repl_publish_full(values, version)
+        return
+    if full or _REPL["want_full"] or not _REPL_LOG or len(values) < 2:
+        return _repl_publish_full(values, version)
+    n = max(len(values), _SNAP_LEN)
+    dirty = [r for r in range(n) if (hashes[r] if r < len(hashes) else _EMPTY_ROW_HASH)
+             != _SNAP_ROW_HASH.get(r, _EMPTY_ROW_HASH)]
+    if not dirty:
+        return
+    if dirty[0] < _HEADER_SCAN_ROWS or len(dirty) * 2 > n:
+        return _repl_publish_full(values, version)  # có thể đổi header / đổi gần hết: full rẻ hơn
+    keep = set(dirty)
+    rows = [(values[r] if r < len(values) else []) if r in keep else None for r in range(dirty[0], dirty[-1] + 1)]
+    _repl_publish_patch(dirty[0], rows, version)
+
+def _repl_on_patch(r0: int, rows: List[Optional[List[str]]], version: int):
+    """Primary: sắp vá dòng r0.. (webhook / vùng hot) -> ghi op, bỏ dòng không đổi."""
+    if REPLICATION_ROLE != "primary" or not _REPL_LOG:
+        return
+    out = [row if row is not None and _row_hash(row) != _SNAP_ROW_HASH.get(r0 + i, _EMPTY_ROW_HASH) else None
+           for i, row in enumerate(rows)]
+    lo = next((i for i, row in enumerate(out) if row is not None), None)
+    if lo is None:
+        return
+    hi = max(i for i, row in enumerate(out) if row is not None)
+    _repl_publish_patch(r0 + lo, out[lo:hi + 1], version)
+
+def _repl_push(base: int, version: int, body: bytes):
+    """Xếp op mới vào hàng đẩy sang REPLICATION_PEERS (1 thread, giữ đúng thứ tự). Đầy -> bỏ, replica tự kéo."""
+    global _REPL_PUSH_THREAD
+    if not REPLICATION_PEERS:
+        return
+    try:
+        _REPL_PUSH_Q.put_nowait((base, version, body))
+    except queue.Full:
+        _REPL_STATS["push_errors"] += 1
+        return
+    if _REPL_PUSH_THREAD is None or not _REPL_PUSH_THREAD.is_alive():
+        _REPL_PUSH_THREAD = threading.Thread(target=_repl_push_loop, name="repl-push", daemon=True)
+        _REPL_PUSH_THREAD.start()
+
+def _repl_push_loop():
+    while True:
+        base, version, body = _REPL_PUSH_Q.get()
+        headers = {"X-Replica-Token": REPLICATION_SECRET, "X-Snapshot-Epoch": _REPL_EPOCH,
+                   "X-Snapshot-Base": str(base), "X-Snapshot-Version": str(version),
+                   "Content-Type": "application/gzip"}
+        for peer in REPLICATION_PEERS:
+            try:
+                r = _REPL_HTTP.post(peer + "/api/replica/push", data=body, headers=headers,
+                                    timeout=REPLICATION_TIMEOUT)
+                _REPL_STATS["pushes" if r.status_code == 200 else "push_errors"] += 1
+            except Exception:
+                _REPL_STATS["push_errors"] += 1
+
+def _repl_authorized() -> bool:
+    tok = request.headers.get("X-Replica-Token") or ""
+    return bool(REPLICATION_SECRET) and hmac.compare_digest(tok.encode("utf-8"), REPLICATION_SECRET.encode("utf-8"))
+
+def _repl_apply(epoch: str, base: int, body: bytes, now: float) -> bool:
+    """Replica: áp các op nhận từ primary. Return True nếu snapshot đổi."""
+    global _SNAPSHOT_VERSION
+    with _CACHE_LOCK:
+        changed = False
+        for line in gzip.decompress(body).splitlines():
+            if not line:
+                continue
+            op = json.loads(line)
+            if op["kind"] == "full":
+                changed = _load_full(op["values"], now) or changed
+            elif HOT_ROWS and op["r0"] < _HOT_START:
+                # patch vào vùng đã nằm trong archive cold -> lấy full lại cho chắc
+                _REPL_STATE.update(epoch="", version=-1)
+                _REPL_STATS["resyncs"] += 1
+                return changed
+            else:
+                _SNAPSHOT_VERSION += 1
+                _track_change(_patch_snapshot(op["r0"], op["rows"], _SNAPSHOT_VERSION), now)
+                changed = True
+            _REPL_STATE.update(epoch=epoch, version=op["v"])
+            _REPL_STATS["ops_applied"] += 1
+        return changed
+
+def _repl_pull(now: float) -> bool:
+    """Replica: hỏi primary các op sau version đang có. Primary lỗi mà đã có snapshot -> dùng tiếp bản cũ."""
+    global _CACHE_AT
+    t0 = time.perf_counter()
+    changed = False
+    try:
+        for _ in range(2):  # lần 2: vừa phải resync (patch vào vùng cold) -> lấy full ngay
+            r = _REPL_HTTP.get(f"{REPLICA_OF}/api/replica/snapshot",
+                               params={"epoch": _REPL_STATE["epoch"], "since": _REPL_STATE["version"]},
+                               headers={"X-Replica-Token": REPLICATION_SECRET}, timeout=REPLICATION_TIMEOUT)
+            _REPL_STATS["pulls"] += 1
+            if r.status_code == 304:
+                break
+            r.raise_for_status()
+            _REPL_STATS["bytes_in"] += len(r.content)
+            changed = _repl_apply(r.headers["X-Snapshot-Epoch"], int(r.headers["X-Snapshot-Base"]),
+                                  r.content, now) or changed
+            if _REPL_STATE["version"] >= 0:
+                break
+    except Exception as e:
+        _FETCH_STATE["last_error"] = f"replica pull: {e}"
+        _FETCH_STATE["last_error_at"] = time.time()
+        _FETCH_STATE["errors"] += 1
+        if _SNAP_BUILT_VERSION < 0:
+            raise
+        _CACHE_AT = now  # hỏi lại sau 1 chu kỳ
+        return changed
+    _FETCH_STATE["last_fetch_ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+    _FETCH_STATE["last_ok_at"] = time.time()
+    _CACHE_AT = now
+    return changed
+
+def _repl_stats() -> Dict[str, Any]:
+    out: Dict[str, Any] = {"role": "primary" if REPLICATION_ROLE == "primary" else ("replica" if REPLICA_OF else "")}
+    if not out["role"]:
+        return out
+    out.update(_REPL_STATS)
+    if REPLICA_OF:
+        out.update(primary=REPLICA_OF, primary_epoch=_REPL_STATE["epoch"], primary_version=_REPL_STATE["version"])
+    else:
+        out.update(epoch=_REPL_EPOCH, head=_REPL_LOG[-1][0] if _REPL_LOG else -1, log_ops=len(_REPL_LOG),
+                   log_bytes=_REPL["full_bytes"] + _REPL["patch_bytes"], peers=len(REPLICATION_PEERS))
+    return out
+
+@app.get("/api/replica/snapshot")
+def api_replica_snapshot():
+    """Primary: các op replica còn thiếu (body = gzip, mỗi dòng 1 op JSON)."""
+    if REPLICATION_ROLE != "primary":
+        return jsonify({"ok": False, "msg": "Không phải primary"}), 404
+    if not _repl_authorized():
+        return jsonify({"ok": False, "msg": "Không có quyền"}), 403
+    try:
+        _sync_snapshot()  # replica kéo = nhịp poll Google của primary (vẫn theo TTL)
+    except Exception as e:
+        if not _REPL_LOG:
+            return jsonify({"ok": False, "msg": f"Lỗi server: {e}"}), 503
+    log = list(_REPL_LOG)
+    if not log:
+        return jsonify({"ok": False, "msg": "Chưa có snapshot"}), 503
+
+    head = log[-1][0]
+    try:
+        since = int(request.args.get("since", "-1"))
+    except ValueError:
+        since = -1
+    same = request.args.get("epoch") == _REPL_EPOCH
+    headers = {"X-Snapshot-Epoch": _REPL_EPOCH, "X-Snapshot-Version": str(head), "Cache-Control": "no-store"}
+    if same and since >= head:
+        _REPL_STATS["not_modified"] += 1
+        resp = Response(status=304)
+        resp.headers.update(headers)
+        return resp
+    if same and since >= log[0][0]:
+        base, blobs = since, [b for v, b in log if v > since]
+    else:
+        base, blobs = -1, [b for _, b in log]
+    body = b"".join(blobs)
+    headers["X-Snapshot-Base"] = str(base)
+    _REPL_STATS["served"] += 1
+    _REPL_STATS["bytes_out"] += len(body)
+    resp = Response(body, mimetype="application/gzip")
+    resp.headers.update(headers)
+    return resp
+
+@app.post("/api/replica/push")
+def api_replica_push():
+    """Replica: nhận op primary đẩy sang. Không nối tiếp được version đang có -> 409, lần sau tự kéo."""
+    global _CACHE_AT
+    if not REPLICA_OF:
+        return jsonify({"ok": False, "msg": "Không phải replica"}), 404
+    if not _repl_authorized():
+        return jsonify({"ok": False, "msg": "Không có quyền"}), 403
+    epoch = request.headers.get("X-Snapshot-Epoch", "")
+    try:
+        base = int(request.headers.get("X-Snapshot-Base", "-1"))
+    except ValueError:
+        base = -2
+    with _CACHE_LOCK:
+        if base != -1 and (epoch != _REPL_STATE["epoch"] or base != _REPL_STATE["version"]):
+            _REPL_STATS["rejected"] += 1
+            _CACHE_AT = 0.0  # request sau kéo bù từ primary
+            return jsonify({"ok": False, "msg": "Lệch version", "version": _REPL_STATE["version"]}), 409
+        try:
+            changed = _repl_apply(epoch, base, request.get_data(), time.time())
+        except Exception as e:
+            _CACHE_AT = 0.0
+            return jsonify({"ok": False, "msg": f"Lỗi server: {e}"}), 500
+        _CACHE_AT = time.time()
+    return jsonify({"ok": True, "changed": changed, "version": _REPL_STATE["version"]})
+
+
+# =========================================================
+# Warm-up: build snapshot + index trước request đầu tiên
+# WARMUP=sync       -> build ngay lúc import (dùng với gunicorn --preload:
+#                      master build 1 lần, các worker fork ra dùng chung copy-on-write)
+# WARMUP=background -> thread riêng, server nhận request luôn, /readyz = 503 tới khi xong
+# WARMUP=off        -> lazy như cũ (tool offline / load test)
+#   gunicorn --preload -w 4 -e WARMUP=sync app:app
+# =========================================================
+WARMUP_MODE = _cfg("warmup", "WARMUP", "background").lower()
+if _TENANT and "warmup" not in _TENANT:
+    WARMUP_MODE = "off"  # tenant nạp lazy, để budget RAM quyết định shop nào được giữ snapshot
+
+_WARM_STATE: Dict[str, Any] = {"state": "off", "ms": None, "error": ""}
+
+def _warmup():
+    _WARM_STATE.update(state="running", error="")
+    t0 = time.perf_counter()
+    try:
+        with app.app_context():
+            _index_page()
+        _refresh_snapshot(force=True)
+        _name_keys()
+        _suggest_index()
+        _WARM_STATE["state"] = "done"
+    except Exception as e:
+        _WARM_STATE.update(state="error", error=str(e))
+    _WARM_STATE["ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+
+def _start_warmup(mode: str):
+    if mode == "off" or not (REPLICA_OF or (GOOGLE_SHEET_ID and (CREDS_JSON_RAW or SHEETS_API_BASE))):
+        return
+    if mode == "sync":
+        _warmup()
+        # đóng băng object đã có: GC không chạm vào -> trang bộ nhớ không bị copy sau fork
+        if hasattr(gc, "freeze"):
+            gc.freeze()
+    else:
+        _WARM_STATE["state"] = "pending"
+        threading.Thread(target=_warmup, name="warmup", daemon=True).start()
+
+if __name__ != "__main__" and not _PARSE_CHILD:
+    _start_warmup(WARMUP_MODE)
+
+
+# =========================================================
+# Multi-tenant: nhiều shop (mỗi shop 1 sheet) trong 1 process
+# TENANTS_JSON = {"shop1": {"sheet_id": "...", "tab": "...", "hosts": ["shop1.vn"],
+#                           "admin_token": "...", "hot_rows": 5000, ...}, ...}
+# -> mỗi shop là 1 bản module riêng của file này (global riêng, không đụng nhau),
+#    chọn theo Host hoặc prefix /t/<shop>/. Host lạ -> shop mặc định (env như cũ).
+# Tổng RAM snapshot (đo theo _snapshot_bytes) vượt TENANT_MEMORY_BUDGET_MB -> thả snapshot
+# shop lâu chưa dùng nhất (LRU), request sau của shop đó tự build lại từ sheet.
+# =========================================================
+TENANTS_JSON = os.getenv("TENANTS_JSON", "").strip()
+TENANT_MEMORY_BUDGET_MB = float(os.getenv("TENANT_MEMORY_BUDGET_MB", "256"))
+_MEM_SAMPLE = 256  # số đơn lấy mẫu để đo cỡ 1 item
+
+_TENANTS: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # thứ tự LRU, cuối = mới dùng
+_TENANT_HOSTS: Dict[str, str] = {}
+_TENANT_LOCK = threading.Lock()
+_TENANT_EVICTIONS = 0
+
+def _drop_snapshot():
+    """Thả snapshot + index khỏi RAM (bị evict); lần dùng sau build lại từ đầu."""
+    global _CACHE_AT, _COLD_AT, _COLD
+    with _CACHE_LOCK:
+        _snap_reset()
+        _COLD = _cold_new(loads=_COLD["loads"])
+        _snap_publish(-1)
+        _CACHE_AT = 0.0
+        _COLD_AT = 0.0
+        _SUGGEST.update(version=-1, keys=[], display=[], score=[])
+        _SUGGEST_CACHE.clear()
+
+# (version, cold) -> bytes: đo lại khi snapshot / archive đổi
+_MEM_MEASURED: Dict[str, Any] = {"key": None, "bytes": 0}
+
+def _snapshot_bytes() -> int:
+    """
+    RAM snapshot đo bằng sys.getsizeof: bảng băm thật của các dict (item, 3 index, hash dòng,
+    cold đã nạp) + cỡ item trung bình trên _MEM_SAMPLE đơn (dict + chuỗi, set dòng trùng key) x số đơn.
+    Chuỗi dùng chung (status intern) bị tính lặp -> hơi dư, an toàn cho budget.
+    """
+    tier = _HOT_TIER
+    cold = tier["cold"]
+    key = (tier["version"], id(cold), cold["loaded"])
+    if _MEM_MEASURED["key"] == key:
+        return _MEM_MEASURED["bytes"]
+    try:
+        total = _measure_tiers(tier, cold)
+    except RuntimeError:  # dict đổi cỡ khi đang duyệt (archive cold đang nạp...) -> dùng số cũ, lần sau đo lại
+        return _MEM_MEASURED["bytes"]
+    total += sys.getsizeof(_SNAP_ROW_HASH) + 32 * len(_SNAP_ROW_HASH)  # value int mỗi dòng
+    _MEM_MEASURED.update(key=key, bytes=total)
+    return total
+
+def _measure_tiers(*parts: Dict[str, Any]) -> int:
+    """Phần đo của _snapshot_bytes; duyệt dict có thể đang bị sửa -> có thể ném RuntimeError."""
+    total = 0
+    for part in parts:
+        items = part["items"]
+        idx = (part["name"], part["phone"], part["mvd"])
+        total += sum(sys.getsizeof(d) for d in (items,) + idx)
+        sample = list(islice(items.values(), _MEM_SAMPLE))
+        if sample:
+            per = sum(sys.getsizeof(it) + sum(sys.getsizeof(v) for v in it.values()) for it in sample)
+            total += per * len(items) // len(sample)
+        total += sum(sys.getsizeof(v) for d in idx for v in list(d.values()) if isinstance(v, set))
+    return total
+
+def _memory_estimate_mb() -> float:
+    return round(_snapshot_bytes() / (1024.0 * 1024.0), 2)
+
+def _load_tenants(raw: str):
+    cfgs = json.loads(raw)
+    for name, cfg in cfgs.items():
+        if not cfg.get("sheet_id"):
+            raise ValueError(f"TENANTS_JSON: shop {name!r} thiếu sheet_id")
+        _TENANTS[name] = {"cfg": dict(cfg, name=name), "mod": None, "requests": 0,
+                          "active": 0, "last_used": 0.0, "evictions": 0}
+        for h in cfg.get("hosts", []):
+            _TENANT_HOSTS[h.lower()] = name
+
+def _tenant_module(t: Dict[str, Any]):
+    """Nạp file này thêm 1 lần dưới tên khác, với _TENANT_CONFIG của shop (lazy)."""
+    if t["mod"] is None:
+        import importlib.util
+        name = f"_tenant_{t['cfg']['name']}"
+        spec = importlib.util.spec_from_file_location(name, __file__)
+        mod = importlib.util.module_from_spec(spec)
+        mod._TENANT_CONFIG = t["cfg"]
+        sys.modules[name] = mod
+        spec.loader.exec_module(mod)
+        t["mod"] = mod
+    return t["mod"]
+
+def _enforce_budget(keep: str):
+    """Evict LRU tới khi tổng ước lượng <= budget. Không đụng shop đang có request."""
+    global _TENANT_EVICTIONS
+    total = _memory_estimate_mb() + sum(t["mod"]._memory_estimate_mb() for t in _TENANTS.values() if t["mod"])
+    if total <= TENANT_MEMORY_BUDGET_MB:
+        return
+    for name, t in list(_TENANTS.items()):
+        if total <= TENANT_MEMORY_BUDGET_MB:
+            break
+        mod = t["mod"]
+        if name == keep or mod is None or t["active"] or mod._SNAP_BUILT_VERSION < 0:
+            continue
+        total -= mod._memory_estimate_mb()
+        mod._drop_snapshot()
+        t["evictions"] += 1
+        _TENANT_EVICTIONS += 1
+
+class _TenantDispatcher:
+    """WSGI: chọn app của shop theo Host hoặc /t/<shop>/..., còn lại -> app mặc định."""
+
+    def __init__(self, default_app):
+        self.default_app = default_app
+
+    def _pick(self, environ) -> str:
+        path = environ.get("PATH_INFO", "")
+        if path.startswith("/t/"):
+            name, _, rest = path[3:].partition("/")
+            if name in _TENANTS:
+                environ["SCRIPT_NAME"] = environ.get("SCRIPT_NAME", "") + "/t/" + name
+                environ["PATH_INFO"] = "/" + rest
+                return name
+        host = environ.get("HTTP_HOST", "").split(":")[0].lower()
+        return _TENANT_HOSTS.get(host, "")
+
+    def __call__(self, environ, start_response):
+        name = self._pick(environ)
+        if not name:
+            return self.default_app(environ, start_response)
+        with _TENANT_LOCK:
+            t = _TENANTS[name]
+            mod = _tenant_module(t)
+            _TENANTS.move_to_end(name)
+            t["requests"] += 1
+            t["active"] += 1
+            t["last_used"] = time.time()
+
+        def done():
+            with _TENANT_LOCK:
+                t["active"] -= 1
+                _enforce_budget(name)
+
+        try:
+            app_iter = mod.app.wsgi_app(environ, start_response)
+        except BaseException:
+            done()
+            raise
+        # body stream (SSE /api/watch, export...) còn đọc snapshot tới lúc server đóng response
+        return ClosingIterator(app_iter, done)
+
+def _tenant_stats() -> Dict[str, Any]:
+    now = time.time()
+    shops = {}
+    for name, t in _TENANTS.items():
+        mod = t["mod"]
+        shops[name] = {
+            "loaded": mod is not None,
+            "hosts": t["cfg"].get("hosts", []),
+            "requests": t["requests"],
+            "idle_s": round(now - t["last_used"], 1) if t["last_used"] else None,
+            "evictions": t["evictions"],
+            "items": len(mod._SNAP_ITEMS) if mod else 0,
+            "memory_mb": mod._memory_estimate_mb() if mod else 0.0,
+            "snapshot_version": mod._SNAP_BUILT_VERSION if mod else -1,
+        }
+    return {
+        "budget_mb": TENANT_MEMORY_BUDGET_MB,
+        "default_memory_mb": _memory_estimate_mb(),
+        "total_memory_mb": round(_memory_estimate_mb() + sum(s["memory_mb"] for s in shops.values()), 2),
+        "rss_mb": _rss_mb(),
+        "evictions": _TENANT_EVICTIONS,
+        "tenants": shops,
+    }
+
+@app.get("/api/tenants")
+def api_tenants():
+    if not _is_admin():
+        return jsonify({"ok": False, "msg": "Không có quyền"}), 403
+    out = {"ok": True}
+    out.update(_tenant_stats())
+    return jsonify(out)
+
+# chỉ module gốc mới dựng dispatcher; bản module của từng shop thì không
+if TENANTS_JSON and not _TENANT and not _PARSE_CHILD:
+    _load_tenants(TENANTS_JSON)
+    app.wsgi_app = _TenantDispatcher(app.wsgi_app)
+
+
+# =========================================================
+# CLI offline: lưu snapshot, tra hàng loạt, export (không qua HTTP)
+# =========================================================
+_EXPORT_FIELDS = ["row", "name", "receiver", "phone", "addr", "product", "status", "mvd", "cod"]
+
+def _use_values(values: List[List[str]]):
+    """Nạp values có sẵn (file snapshot) làm cache, không bao giờ hết hạn."""
+    global _CACHE_AT, _CACHE_TTL, _CACHE_TTL_MIN, _CACHE_TTL_MAX
+    with _CACHE_LOCK:
+        _CACHE_AT = time.time()
+        _CACHE_TTL = _CACHE_TTL_MIN = _CACHE_TTL_MAX = float("inf")
+        _load_values(values, _CACHE_AT)
+
+def _save_values_file(path: str, values: List[List[str]]):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wt", encoding="utf-8") as f:
+        json.dump({"tab": GOOGLE_SHEET_TAB, "saved_at": time.time(), "values": values}, f, ensure_ascii=False)
+
+def _load_values_file(path: str) -> List[List[str]]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        data = json.load(f)
+    return data["values"] if isinstance(data, dict) else data
+
+def _export_row(it: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "row": int(it["_row"]) + 1,  # số dòng trên sheet
+        "name": it.get("name_key", ""),
+        "receiver": it.get("receiver", ""),
+        "phone": it.get("phone", ""),
+        "addr": it.get("addr", ""),
+        "product": it.get("product", ""),
+        "status": it.get("status", ""),
+        "mvd": it.get("mvd", ""),
+        "cod": it.get("cod", ""),
+    }
+
+def _iter_queries(lines: Iterable[str]) -> Iterator[str]:
+    for line in lines:
+        q = line.strip()
+        if q and not q.startswith("#"):
+            yield q
+
+def _iter_lookup(queries: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    for q in queries:
+        rows = _search(q)
+        if not rows:
+            yield {"query": q, "found": 0}
+            continue
+        for it in rows:
+            out = {"query": q, "found": len(rows)}
+            out.update(_export_row(it))
+            yield out
+
+def _iter_export(status: str = "", missing_mvd: bool = False) -> Iterator[Dict[str, Any]]:
+    want = _fold(status)
+    for it in _read_items_from_sheet()[0]:
+        if missing_mvd and it.get("mvd"):
+            continue
+        if want and want not in _fold(it.get("status", "")):
+            continue
+        yield _export_row(it)
+
+def _write_records(records: Iterable[Dict[str, Any]], out, fmt: str, fields: List[str]) -> int:
+    n = 0
+    if fmt == "csv":
+        w = csv.DictWriter(out, fieldnames=fields, extrasaction="ignore")
+        w.writeheader()
+        for rec in records:
+            w.writerow(rec)
+            n += 1
+    else:
+        for rec in records:
+            out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            n += 1
+    return n
+
+def _cli(argv: List[str]) -> int:
+    global SEARCH_BY_PHONE_MVD
+    ap = argparse.ArgumentParser(prog="app.py", description="Tra cứu / export đơn hàng không qua web")
+    ap.add_argument("--snapshot", help="file snapshot (.json / .json.gz) thay vì gọi Google")
+    sub = ap.add_subparsers(dest="cmd")
+
+    sp = sub.add_parser("serve", help="chạy web (mặc định)")
+    sp.add_argument("--port", type=int, default=int(os.getenv("PORT", "5000")))
+
+    sp = sub.add_parser("snapshot", help="tải sheet về file để dùng offline")
+    sp.add_argument("out")
+
+    sp = sub.add_parser("lookup", help="tra hàng loạt: mỗi dòng 1 tên / SĐT / MVĐ")
+    sp.add_argument("file", help="file input, '-' = stdin")
+    sp.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+    sp.add_argument("--out", default="-")
+
+    sp = sub.add_parser("export", help="export đơn theo bộ lọc")
+    sp.add_argument("--status", default="", help="lọc trạng thái (chứa, không dấu)")
+    sp.add_argument("--missing-mvd", action="store_true", help="chỉ đơn chưa có MVĐ")
+    sp.add_argument("--format", choices=["jsonl", "csv"], default="csv")
+    sp.add_argument("--out", default="-")
+
+    args = ap.parse_args(argv)
+    cmd = args.cmd or "serve"
+
+    if cmd == "serve":
+        # debug reloader: chỉ process con (WERKZEUG_RUN_MAIN) mới phục vụ request
+        if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+            _start_warmup(WARMUP_MODE)
+        app.run(host="0.0.0.0", port=getattr(args, "port", int(os.getenv("PORT", "5000"))), debug=True)
+        return 0
+
+    if cmd == "snapshot":
+        vals = _load_values_file(args.snapshot) if args.snapshot else _fetch_values()
+        _save_values_file(args.out, vals)
+        print(f"Đã lưu {len(vals)} dòng -> {args.out}", file=sys.stderr)
+        return 0
+
+    # tra hàng loạt: file input có cả SĐT / MVĐ, không chỉ tên như trang web
+    SEARCH_BY_PHONE_MVD = True
+
+    # nạp snapshot đúng 1 lần cho cả lệnh
+    _use_values(_load_values_file(args.snapshot) if args.snapshot else _fetch_values())
+
+    msg = _sync_snapshot()
+    if msg:
+        print(msg, file=sys.stderr)
+        return 1
+
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8", newline="")
+    try:
+        if cmd == "lookup":
+            src = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")
+            try:
+                n = _write_records(_iter_lookup(_iter_queries(src)), out, args.format,
+                                   ["query", "found"] + _EXPORT_FIELDS)
+            finally:
+                if src is not sys.stdin:
+                    src.close()
+        else:
+            n = _write_records(_iter_export(args.status, args.missing_mvd), out, args.format, _EXPORT_FIELDS)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"{n} dòng", file=sys.stderr)
+    return 0
+
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=int(os.getenv("PORT", "5000")), debug=True)
+    sys.exit(_cli(sys.argv[1:]))
@@ -0,0 +1,60 @@
+/**
+ * NgânMiu.Store — báo web refresh cache khi sheet được sửa.
+ *
+ * Cài đặt (Extensions > Apps Script):
+ *   - Project Settings > Script properties:
+ *       REFRESH_URL    = https://<domain>/api/refresh
+ *       REFRESH_SECRET = <giống REFRESH_WEBHOOK_SECRET bên server>
+ *   - Triggers > Add trigger: onEditHook  (From spreadsheet / On edit)
+ *                             onChangeHook (From spreadsheet / On change)
+ *   (dùng installable trigger vì simple trigger không được gọi UrlFetchApp)
+ */
+
+function _post(payload) {
+  var props = PropertiesService.getScriptProperties();
+  var url = props.getProperty("REFRESH_URL");
+  var secret = props.getProperty("REFRESH_SECRET");
+  if (!url || !secret) return;
+
+  payload.ts = Math.floor(Date.now() / 1000);
+  var body = JSON.stringify(payload);
+  var raw = Utilities.computeHmacSha256Signature(body, secret, Utilities.Charset.UTF_8);
+  var hex = raw.map(function (b) {
+    return ("0" + (b & 0xff).toString(16)).slice(-2);
+  }).join("");
+
+  UrlFetchApp.fetch(url, {
+    method: "post",
+    contentType: "application/json",
+    payload: body,
+    headers: { "X-Signature": "sha256=" + hex },
+    muteHttpExceptions: true,
+  });
+}
+
+// sửa ô -> chỉ gửi khoảng dòng bị sửa
+function onEditHook(e) {
+  var r = e.range;
+  _post({
+    sheet: r.getSheet().getName(),
+    row_start: r.getRow(),
+    row_end: r.getLastRow(),
+  });
+}
+
+// các loại thay đổi làm lệch vị trí dòng/cột -> phải tải lại full
+// (EDIT đã có onEditHook lo; FORMAT, INSERT_GRID/REMOVE_GRID không đổi dữ liệu tab đơn)
+var _FULL_CHANGES = {
+  INSERT_ROW: true, REMOVE_ROW: true,
+  INSERT_COLUMN: true, REMOVE_COLUMN: true,
+  OTHER: true, // sort, dán đè vùng lớn...
+};
+
+// chèn/xoá dòng, sort... -> vị trí dòng bị lệch, tải lại full
+// onChange (installable) không cho biết tab nào bị đổi: getActiveSheet() ở đây là
+// tab mặc định chứ không phải tab người dùng đang sửa -> không gửi "sheet",
+// server coi như tab đơn và tải lại.
+function onChangeHook(e) {
+  if (!e || !_FULL_CHANGES[e.changeType]) return;
+  _post({ full: true });
+}
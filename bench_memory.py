@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+NgânMiu.Store — Đo RAM lúc refresh snapshot với sheet lớn
+Mỗi cỡ sheet chạy trong 1 process riêng (peak RSS không bị lẫn giữa các lần).
+--keep-raw giữ lại ma trận get_all_values như bản cũ (_CACHE_VALUES) để so sánh.
+
+  python bench_memory.py --rows 50000,200000
+  python bench_memory.py --rows 200000 --keep-raw
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+from typing import Dict, Any
+
+
+def _measure(rows: int, keep_raw: bool, seed: int) -> Dict[str, Any]:
+    import gc
+    os.environ.setdefault("WARMUP", "off")
+    import app as A
+    from loadtest import make_values
+
+    class SeededWorksheet:
+        """Sinh lại dữ liệu mỗi lần gọi, không giữ bản nào -> đo đúng RAM của app."""
+
+        def get_all_values(self):
+            return make_values(rows, max(100, rows // 10), seed)[0]
+
+    kept = []
+    fetch = A._fetch_values_hashed
+
+    def fetch_keep():
+        vals, hashes = fetch()
+        kept.append([list(r) for r in vals])  # bản sao giống _CACHE_VALUES cũ
+        return vals, hashes
+
+    A._SHEET_WS = SeededWorksheet()
+    if keep_raw:
+        A._fetch_values_hashed = fetch_keep  # _refresh_snapshot gọi hàm này
+    gc.collect()
+    base = A._rss_mb()
+    A._refresh_snapshot(force=True)
+    gc.collect()
+    if keep_raw and not kept:
+        raise RuntimeError("--keep-raw không có tác dụng: _refresh_snapshot không gọi _fetch_values_hashed")
+    last = A._SNAP_LAST_SYNC
+    return {
+        "rows": rows,
+        "keep_raw": keep_raw,
+        "items": len(A._SNAP_ITEMS),
+        "build_ms": last.get("ms"),
+        "rss_base_mb": base,
+        "rss_fetched_mb": last.get("rss_before_mb"),
+        "rss_after_mb": A._rss_mb(),
+        "peak_rss_mb": A._peak_rss_mb(),
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Đo peak RSS khi refresh snapshot")
+    ap.add_argument("--rows", default="20000,100000")
+    ap.add_argument("--keep-raw", action="store_true", help="giữ ma trận raw như bản cũ để so sánh")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(_measure(args.child, args.keep_raw, args.seed)))
+        return
+
+    print(f"{'rows':>9}{'raw':>6}{'items':>9}{'build ms':>10}{'base':>8}{'fetched':>9}{'after':>8}{'peak':>8}  (MB)")
+    for n in [int(x) for x in args.rows.split(",") if x.strip()]:
+        cmd = [sys.executable, __file__, "--child", str(n), "--seed", str(args.seed)]
+        if args.keep_raw:
+            cmd.append("--keep-raw")
+        r = json.loads(subprocess.check_output(cmd).decode("utf-8").strip().splitlines()[-1])
+        print(f"{r['rows']:>9}{'yes' if r['keep_raw'] else 'no':>6}{r['items']:>9}{r['build_ms']:>10}"
+              f"{r['rss_base_mb']:>8}{r['rss_fetched_mb']:>9}{r['rss_after_mb']:>8}{r['peak_rss_mb']:>8}")
+
+
+if __name__ == "__main__":
+    main()
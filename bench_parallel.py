@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+NgânMiu.Store — Đo build snapshot song song (PARSE_WORKERS) theo số core
+Mỗi cấu hình chạy trong 1 process riêng; build lần đầu (snapshot trống) như lúc khởi động.
+workers=1 là đường tuần tự (mặc định của app, PARSE_WORKERS=0), làm mốc tính speedup.
+
+  python bench_parallel.py --rows 300000
+  python bench_parallel.py --rows 100000,500000 --workers 1,2,4,8
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from typing import Dict, Any
+
+
+def _measure(rows: int, workers: int, seed: int) -> Dict[str, Any]:
+    os.environ.setdefault("WARMUP", "off")
+    os.environ["PARSE_WORKERS"] = str(workers)
+    os.environ["PARSE_PARALLEL_MIN_ROWS"] = "0"
+    import app as A
+    from loadtest import make_values
+
+    values = make_values(rows, max(100, rows // 10), seed)[0]
+    t0 = time.perf_counter()
+    A._use_values(values)
+    wall = (time.perf_counter() - t0) * 1000.0
+    last = A._SNAP_LAST_SYNC
+    return {
+        "rows": rows,
+        "workers": last.get("workers", 1),
+        "items": len(A._SNAP_ITEMS),
+        "build_ms": last.get("ms"),
+        "load_ms": round(wall, 1),  # gồm cả hash từng dòng (chưa song song)
+        "peak_rss_mb": A._peak_rss_mb(),
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Đo scaling build snapshot song song")
+    ap.add_argument("--rows", default="300000")
+    ap.add_argument("--workers", default="", help="vd 1,2,4 (mặc định 1,2,4.. tới số core)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    ap.add_argument("--child-workers", type=int, help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(_measure(args.child, args.child_workers, args.seed)))
+        return
+
+    cores = os.cpu_count() or 1
+    if args.workers:
+        workers = [int(x) for x in args.workers.split(",") if x.strip()]
+    else:
+        workers = [1]
+        while workers[-1] * 2 <= cores:
+            workers.append(workers[-1] * 2)
+    print(f"cpu cores: {cores}")
+    print(f"{'rows':>9}{'workers':>9}{'items':>9}{'build ms':>10}{'load ms':>10}{'speedup':>9}{'peak MB':>9}")
+    for n in [int(x) for x in args.rows.split(",") if x.strip()]:
+        base = None
+        for w in workers:
+            cmd = [sys.executable, __file__, "--child", str(n), "--child-workers", str(w), "--seed", str(args.seed)]
+            r = json.loads(subprocess.check_output(cmd).decode("utf-8").strip().splitlines()[-1])
+            base = base or r["build_ms"]
+            print(f"{r['rows']:>9}{r['workers']:>9}{r['items']:>9}{r['build_ms']:>10}{r['load_ms']:>10}"
+                  f"{base / r['build_ms']:>9.2f}{r['peak_rss_mb']:>9}")
+
+
+if __name__ == "__main__":
+    main()
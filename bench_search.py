@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+NgânMiu.Store — So sánh các strategy tìm tên (exact / prefix / substring / fuzzy)
+Cùng 1 sheet giả + cùng 1 bộ query, đo latency và recall:
+- full     : gõ đúng họ tên có dấu
+- nodiac   : gõ không dấu, chữ thường
+- prefix   : gõ thiếu phần cuối tên
+- partial  : chỉ gõ 1 phần giữa tên
+- typo     : gõ sai 1 ký tự
+recall = % query mà đơn của đúng khách có trong kết quả
+
+  python bench_search.py --rows 20000 --queries 500
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+from typing import Dict, List, Any
+
+os.environ.setdefault("WARMUP", "off")  # tool offline: không gọi Google lúc import
+import app as A  # noqa: E402
+from loadtest import install_fake_sheet
+
+KINDS = ["full", "nodiac", "prefix", "partial", "typo"]
+
+
+def _typo(rnd: random.Random, s: str) -> str:
+    i = rnd.randrange(len(s))
+    return s[:i] + rnd.choice("aeiouhnt") + s[i + 1:]
+
+def make_queries(names: List[str], n: int, seed: int) -> List[Dict[str, str]]:
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(n):
+        name = rnd.choice(names)
+        kind = rnd.choice(KINDS)
+        nn = A._norm(name)
+        if kind == "full":
+            q = name
+        elif kind == "nodiac":
+            q = nn
+        elif kind == "prefix":
+            q = nn[:max(2, len(nn) - rnd.randrange(1, 5))]
+        elif kind == "partial":
+            parts = nn.split()
+            q = " ".join(parts[1:3]) if len(parts) > 2 else parts[-1]
+        else:
+            q = _typo(rnd, nn)
+        out.append({"kind": kind, "q": q, "want": nn})
+    return out
+
+def run(queries: List[Dict[str, str]], strategies: List[str]) -> Dict[str, Any]:
+    rep: Dict[str, Any] = {}
+    for st in strategies:
+        lat: List[float] = []
+        hit: Dict[str, List[int]] = {k: [0, 0] for k in KINDS}
+        results = 0
+        for qq in queries:
+            t0 = time.perf_counter()
+            rows = A._search_by_name(qq["q"], st)
+            lat.append((time.perf_counter() - t0) * 1000.0)
+            results += len(rows)
+            ok = any(it["name_norm"] == qq["want"] for it in rows)
+            hit[qq["kind"]][0] += ok
+            hit[qq["kind"]][1] += 1
+        lat.sort()
+        total_ok = sum(v[0] for v in hit.values())
+        rep[st] = {
+            "p50_ms": round(lat[len(lat) // 2], 3),
+            "p99_ms": round(lat[min(len(lat) - 1, int(len(lat) * 0.99))], 3),
+            "recall": round(total_ok / len(queries), 3),
+            "recall_by_kind": {k: round(v[0] / v[1], 3) if v[1] else None for k, v in hit.items()},
+            "avg_results": round(results / len(queries), 2),
+        }
+    return rep
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="So sánh latency/recall các strategy tìm tên")
+    ap.add_argument("--rows", type=int, default=10000)
+    ap.add_argument("--customers", type=int, default=2000)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--strategies", default=",".join(A._STRATEGIES))
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    _, names = install_fake_sheet(args.rows, args.customers, args.seed)
+    A._sync_snapshot()
+    queries = make_queries(names, args.queries, args.seed)
+    rep = run(queries, [s.strip() for s in args.strategies.split(",") if s.strip()])
+
+    if args.json:
+        print(json.dumps(rep, ensure_ascii=False, indent=2))
+        return rep
+    print(f"rows={args.rows} customers={args.customers} queries={args.queries} seed={args.seed}")
+    print(f"{'strategy':<11}{'p50 ms':>9}{'p99 ms':>9}{'recall':>8}{'avg res':>9}  " + " ".join(f"{k:>7}" for k in KINDS))
+    for st, r in rep.items():
+        byk = " ".join(f"{r['recall_by_kind'][k] if r['recall_by_kind'][k] is not None else '-':>7}" for k in KINDS)
+        print(f"{st:<11}{r['p50_ms']:>9}{r['p99_ms']:>9}{r['recall']:>8}{r['avg_results']:>9}  {byk}")
+    return rep
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+NgânMiu.Store — Load test cho / và /api/search
+- Sheet giả (sinh theo seed) thay cho Google -> không tốn quota
+- Query mix: trúng (hit), trượt (miss), tên "hot" lặp lại, query quá ngắn
+- Báo cáo throughput + p50/p95/p99 theo route
+
+Ví dụ:
+  python loadtest.py --rows 20000 --requests 5000 --concurrency 16
+  python loadtest.py --mode werkzeug --concurrency 32      # qua socket thật
+  python loadtest.py --mode http --url http://127.0.0.1:8000  # gunicorn đang chạy
+      (server phải tự trỏ vào sheet giả/thật — mode http chỉ bắn request)
+"""
+
+import os
+import re
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Any
+
+os.environ.setdefault("WARMUP", "off")  # tool offline: không gọi Google lúc import
+import app as A  # noqa: E402
+
+HEADER = ["Tên", "Cookie", "MVĐ", "Trạng thái", "Người nhận", "SĐT nhận", "Địa chỉ", "Sản Phẩm", "COD"]
+
+_HO   = ["Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Huỳnh", "Phan", "Vũ", "Võ", "Đặng", "Bùi", "Đỗ"]
+_DEM  = ["Thị", "Văn", "Ngọc", "Minh", "Thu", "Hữu", "Thanh", "Kim", ""]
+_TEN  = ["Ngân", "Hùng", "Lan", "Mai", "Hương", "Tuấn", "Linh", "Trang", "Dũng", "Phương", "Hà", "Nam"]
+_STATUS = ["Chờ lấy hàng", "Đang giao", "Đã giao", "Hoàn hàng", ""]
+
+
+# =========================================================
+# Sheet giả
+# =========================================================
+class FakeWorksheet:
+    """Đủ API gspread mà app.py dùng (get_all_values / get_values)."""
+
+    def __init__(self, values: List[List[str]], latency: float = 0.0):
+        self.values = values
+        self.latency = latency
+        self.calls = 0
+
+    def get_all_values(self) -> List[List[str]]:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [list(r) for r in self.values]
+
+    def get_values(self, rng: str = "") -> List[List[str]]:
+        """Range kiểu "12:14", "A12:ZZ" (tới hết sheet), "A12:ZZ40"."""
+        self.calls += 1
+        if not rng:
+            return self.get_all_values()
+        a, b = rng.split(":")
+        start = int(re.sub(r"^[A-Z]+", "", a))
+        end_s = re.sub(r"^[A-Z]+", "", b)
+        end = int(end_s) if end_s else len(self.values)
+        return [list(r) for r in self.values[start - 1:end]]
+
+def _fake_name(rnd: random.Random, i: int) -> str:
+    ten = " ".join(p for p in (rnd.choice(_HO), rnd.choice(_DEM), rnd.choice(_TEN)) if p)
+    return f"{ten} {i % 997}"
+
+def make_values(rows: int, customers: int, seed: int) -> Tuple[List[List[str]], List[str]]:
+    """Return (values giống get_all_values, danh sách tên khách)."""
+    rnd = random.Random(seed)
+    names = [_fake_name(rnd, i) for i in range(customers)]
+    values = [["NgânMiu.Store - Book Shopee"], [""], list(HEADER)]
+    for i in range(rows):
+        nm = rnd.choice(names)
+        has_mvd = rnd.random() < 0.7
+        values.append([
+            nm,
+            "SPC_EC=" + str(rnd.getrandbits(32)),
+            f"SPXVN{rnd.randrange(10**9, 10**10)}" if has_mvd else "",
+            rnd.choice(_STATUS),
+            nm.rsplit(" ", 1)[0],
+            "09" + str(rnd.randrange(10**7, 10**8)),
+            f"{rnd.randrange(1, 500)} Lê Lợi, Quận {rnd.randrange(1, 13)}, TP.HCM",
+            f"Sản phẩm #{rnd.randrange(1, 300)}",
+            str(rnd.randrange(1, 50) * 1000),
+        ])
+    return values, names
+
+def install_fake_sheet(rows: int = 5000, customers: int = 1000, seed: int = 1,
+                       latency: float = 0.0) -> Tuple[FakeWorksheet, List[str]]:
+    values, names = make_values(rows, customers, seed)
+    ws = FakeWorksheet(values, latency)
+    A._SHEET_WS = ws
+    A._CACHE_AT = 0.0
+    A._SNAP_BUILT_VERSION = -1
+    A._SEARCH_LIMITER.rate = 0  # load test không bị rate limit chặn
+    return ws, names
+
+
+# =========================================================
+# Query mix
+# =========================================================
+def make_plan(names: List[str], n: int, seed: int, mix: Dict[str, float]) -> List[Tuple[str, str]]:
+    """
+    List (kind, q). kind: index | hit | hot | miss | short
+    hot = 20 tên lặp lại nhiều (khách vào check đi check lại)
+    """
+    rnd = random.Random(seed)
+    hot = rnd.sample(names, min(20, len(names)))
+    kinds = list(mix.keys())
+    weights = [mix[k] for k in kinds]
+    plan = []
+    for _ in range(n):
+        kind = rnd.choices(kinds, weights)[0]
+        if kind == "hit":
+            q = rnd.choice(names)
+            # khách gõ không dấu / chữ thường
+            if rnd.random() < 0.5:
+                q = A._norm(q)
+        elif kind == "hot":
+            q = rnd.choice(hot)
+        elif kind == "miss":
+            q = f"{rnd.choice(_TEN)} khong co {rnd.randrange(10**6)}"
+        elif kind == "short":
+            q = rnd.choice(["a", "N", " "])
+        else:
+            q = ""
+        plan.append((kind, q))
+    return plan
+
+
+# =========================================================
+# Drivers
+# =========================================================
+def _flask_driver():
+    local = threading.local()
+
+    def call(kind: str, q: str) -> int:
+        cl = getattr(local, "client", None)
+        if cl is None:
+            cl = local.client = A.app.test_client()
+        if kind == "index":
+            return cl.get("/").status_code
+        return cl.post("/api/search", json={"q": q}).status_code
+
+    return call
+
+def _http_driver(base: str):
+    base = base.rstrip("/")
+
+    def call(kind: str, q: str) -> int:
+        if kind == "index":
+            req = urllib.request.Request(base + "/")
+        else:
+            req = urllib.request.Request(
+                base + "/api/search",
+                data=json.dumps({"q": q}).encode("utf-8"),
+                headers={"Content-Type": "application/json"},
+            )
+        try:
+            with urllib.request.urlopen(req, timeout=30) as r:
+                r.read()
+                return r.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    return call
+
+def _serve_werkzeug(port: int) -> str:
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # không in log từng request
+    srv = make_server("127.0.0.1", port, A.app, threaded=True)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{srv.server_port}"
+
+
+# =========================================================
+# Run + report
+# =========================================================
+def _pct(xs: List[float], p: float) -> float:
+    if not xs:
+        return 0.0
+    k = min(len(xs) - 1, max(0, int(round(p / 100.0 * (len(xs) - 1)))))
+    return xs[k]
+
+def run(call, plan: List[Tuple[str, str]], concurrency: int) -> Dict[str, Any]:
+    lat: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def one(job):
+        kind, q = job
+        route = "/" if kind == "index" else "/api/search"
+        t0 = time.perf_counter()
+        try:
+            code = call(kind, q)
+        except Exception:
+            code = 0
+        dt = (time.perf_counter() - t0) * 1000.0
+        keys = [route] if kind == "index" else [route, f"/api/search[{kind}]"]
+        with lock:
+            for k in keys:
+                lat.setdefault(k, []).append(dt)
+            if code >= 500 or code == 0:
+                errors[route] = errors.get(route, 0) + 1
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        list(ex.map(one, plan))
+    wall = time.perf_counter() - t0
+
+    report = {"requests": len(plan), "concurrency": concurrency,
+              "wall_s": round(wall, 3), "rps": round(len(plan) / wall, 1) if wall else 0.0,
+              "routes": {}}
+    for route, xs in sorted(lat.items()):
+        xs.sort()
+        report["routes"][route] = {
+            "n": len(xs),
+            "p50_ms": round(_pct(xs, 50), 2),
+            "p95_ms": round(_pct(xs, 95), 2),
+            "p99_ms": round(_pct(xs, 99), 2),
+            "max_ms": round(xs[-1], 2) if xs else 0.0,
+            "errors": errors.get(route, 0),
+        }
+    return report
+
+def _print_report(mode: str, rep: Dict[str, Any]):
+    print(f"== mode={mode} requests={rep['requests']} concurrency={rep['concurrency']} "
+          f"wall={rep['wall_s']}s throughput={rep['rps']} req/s")
+    print(f"{'route':<26}{'n':>7}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}{'err':>6}")
+    for route, r in rep["routes"].items():
+        print(f"{route:<26}{r['n']:>7}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}"
+              f"{r['max_ms']:>10}{r['errors']:>6}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Load test /api/search với sheet giả")
+    ap.add_argument("--mode", choices=["flask", "werkzeug", "http"], default="flask",
+                    help="flask=test client in-process, werkzeug=server thật trong process, http=--url bên ngoài")
+    ap.add_argument("--url", default="http://127.0.0.1:5000")
+    ap.add_argument("--rows", type=int, default=5000)
+    ap.add_argument("--customers", type=int, default=1000)
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--sheet-latency", type=float, default=0.0, help="giả lập độ trễ get_all_values (giây)")
+    ap.add_argument("--mix", default="index=0.05,hit=0.45,hot=0.25,miss=0.2,short=0.05")
+    ap.add_argument("--json", action="store_true", help="in report dạng JSON")
+    args = ap.parse_args(argv)
+
+    mix = {}
+    for part in args.mix.split(","):
+        k, _, v = part.partition("=")
+        mix[k.strip()] = float(v)
+
+    _, names = install_fake_sheet(args.rows, args.customers, args.seed, args.sheet_latency)
+    plan = make_plan(names, args.requests, args.seed, mix)
+
+    if args.mode == "flask":
+        call = _flask_driver()
+    elif args.mode == "werkzeug":
+        call = _http_driver(_serve_werkzeug(0))
+    else:
+        call = _http_driver(args.url)
+
+    rep = run(call, plan, args.concurrency)
+    rep["mode"] = args.mode
+    rep["seed"] = args.seed
+    if args.json:
+        print(json.dumps(rep, ensure_ascii=False, indent=2))
+    else:
+        _print_report(args.mode, rep)
+    return rep
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+NgânMiu.Store — Replay trace query thật (TRACE_PATH của app.py) trên 1 snapshot cố định
+- Trace chỉ có hash của query -> dò ngược bằng tên / SĐT / MVĐ có trong snapshot
+  (cùng TRACE_SALT lúc ghi). Hash không dò được (gõ sai, khách không có đơn)
+  replay bằng chuỗi miss cùng độ dài, báo riêng là "unresolved".
+- Giữ nhịp thật (--speed 1 = đúng tốc độ lúc ghi, 0 = bắn liên tục)
+- Báo cáo latency (replay đo cả Flask test client, recorded_srv = chỉ trong handler lúc ghi),
+  so kết quả trúng/trượt với lúc ghi, độ lặp query (cache)
+
+Ví dụ:
+  python app.py snapshot snap.json.gz
+  python replay_trace.py trace.jsonl trace.jsonl.1 --snapshot snap.json.gz
+  python replay_trace.py trace.jsonl --snapshot snap.json.gz --speed 4 --concurrency 8 --mode substring
+"""
+
+import os
+import json
+import time
+import argparse
+import threading
+from collections import OrderedDict, Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+
+os.environ.setdefault("WARMUP", "off")  # tool offline: không gọi Google lúc import
+os.environ.pop("TRACE_PATH", None)      # replay không được ghi ngược vào trace
+import app as A  # noqa: E402
+from loadtest import _pct  # noqa: E402
+
+LRU_SIZES = [64, 256, 1024, 4096]
+
+
+def read_trace(paths: List[str]) -> List[Dict[str, Any]]:
+    recs = []
+    for p in paths:
+        with open(p, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    recs.append(json.loads(line))
+    recs.sort(key=lambda r: r["t"])
+    return recs
+
+def build_resolver() -> Dict[str, str]:
+    """hash -> query gõ lại được (tên chuẩn hoá / SĐT / MVĐ của các đơn trong snapshot)."""
+    out: Dict[str, str] = {}
+    for it in A._SNAP_ITEMS.values():
+        # cùng dạng chuẩn với A._trace_key lúc ghi
+        for q in (it["name_norm"], A._phone_key(it["phone"]), A._mvd_key(it["mvd"])):
+            if q:
+                out.setdefault(A._trace_hash(q), q)
+    return out
+
+def _miss_query(n: int) -> str:
+    return ("qzx" * (n // 3 + 1))[:n]
+
+def make_jobs(recs: List[Dict[str, Any]], resolver: Dict[str, str]) -> List[Dict[str, Any]]:
+    jobs = []
+    for r in recs:
+        h, n = r.get("h", ""), r.get("len", 0)
+        if n < 2:
+            kind, q = "short", "x" * n
+        elif h in resolver:
+            kind, q = "resolved", resolver[h]
+        else:
+            kind, q = "unresolved", _miss_query(n)
+        jobs.append({"t": r["t"], "h": h, "kind": kind, "q": q, "mode": r.get("mode", ""),
+                     "scope": r.get("scope", ""), "rec_n": r.get("n", -1), "rec_ms": r.get("ms", 0.0)})
+    return jobs
+
+def cache_profile(recs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Độ lặp của query: 1 cache kết quả LRU cỡ N sẽ trúng bao nhiêu %."""
+    keys = [r["h"] for r in recs if r.get("len", 0) >= 2]
+    cnt = Counter(keys)
+    lru_hits = {}
+    for size in LRU_SIZES:
+        lru: "OrderedDict[str, None]" = OrderedDict()
+        hits = 0
+        for k in keys:
+            if k in lru:
+                hits += 1
+                lru.move_to_end(k)
+            else:
+                lru[k] = None
+                if len(lru) > size:
+                    lru.popitem(last=False)
+        lru_hits[str(size)] = round(hits / len(keys), 4) if keys else 0.0
+    per_sec = Counter(int(r["t"]) for r in recs)
+    return {
+        "queries": len(keys),
+        "distinct": len(cnt),
+        "repeat_ratio": round(1 - len(cnt) / len(keys), 4) if keys else 0.0,
+        "top10_share": round(sum(c for _, c in cnt.most_common(10)) / len(keys), 4) if keys else 0.0,
+        "lru_hit_ratio": lru_hits,
+        "peak_rps": max(per_sec.values(), default=0),
+        "span_s": round(recs[-1]["t"] - recs[0]["t"], 1) if recs else 0.0,
+    }
+
+def replay(jobs: List[Dict[str, Any]], speed: float, concurrency: int,
+           mode: Optional[str]) -> Dict[str, Any]:
+    local = threading.local()
+    lat: Dict[str, List[float]] = {}
+    mismatch = {"hit_now_miss": 0, "miss_now_hit": 0}
+    errors = [0]
+    lock = threading.Lock()
+
+    def one(job):
+        cl = getattr(local, "client", None)
+        if cl is None:
+            cl = local.client = A.app.test_client()
+        body = {"q": job["q"], "mode": mode or job["mode"] or None, "scope": job["scope"]}
+        t0 = time.perf_counter()
+        res = cl.post("/api/search", json=body)
+        dt = (time.perf_counter() - t0) * 1000.0
+        js = res.get_json(silent=True) or {}
+        n = len(js.get("items", [])) if js.get("ok") else -1
+        with lock:
+            lat.setdefault("all", []).append(dt)
+            lat.setdefault(job["kind"], []).append(dt)
+            if res.status_code >= 500:
+                errors[0] += 1
+            if job["kind"] == "resolved" and job["rec_n"] >= 0 and (job["rec_n"] > 0) != (n > 0):
+                mismatch["hit_now_miss" if job["rec_n"] > 0 else "miss_now_hit"] += 1
+
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        base = jobs[0]["t"] if jobs else 0.0
+        for job in jobs:
+            if speed > 0:
+                wait = (job["t"] - base) / speed - (time.perf_counter() - t_start)
+                if wait > 0:
+                    time.sleep(wait)
+            ex.submit(one, job)
+    wall = time.perf_counter() - t_start
+
+    rep: Dict[str, Any] = {"requests": len(jobs), "wall_s": round(wall, 3),
+                           "rps": round(len(jobs) / wall, 1) if wall else 0.0,
+                           "errors": errors[0], "outcome_mismatch": mismatch, "latency": {}}
+    for k, xs in sorted(lat.items()):
+        xs.sort()
+        rep["latency"][k] = {"n": len(xs), "p50_ms": round(_pct(xs, 50), 3),
+                             "p95_ms": round(_pct(xs, 95), 3), "p99_ms": round(_pct(xs, 99), 3),
+                             "max_ms": round(xs[-1], 3)}
+    rec = sorted(j["rec_ms"] for j in jobs if j["kind"] != "short")
+    rep["recorded_server_ms"] = {"p50_ms": round(_pct(rec, 50), 3), "p95_ms": round(_pct(rec, 95), 3),
+                                 "p99_ms": round(_pct(rec, 99), 3)}
+    return rep
+
+def _print_report(rep: Dict[str, Any]):
+    print(f"== replay requests={rep['requests']} wall={rep['wall_s']}s throughput={rep['rps']} req/s "
+          f"errors={rep['errors']} resolved={rep['resolve']['resolved']} "
+          f"unresolved={rep['resolve']['unresolved']}")
+    print(f"{'class':<14}{'n':>7}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for k, r in rep["latency"].items():
+        print(f"{k:<14}{r['n']:>7}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['max_ms']:>10}")
+    r = rep["recorded_server_ms"]
+    print(f"{'recorded_srv':<14}{'':>7}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+    print("outcome mismatch:", rep["outcome_mismatch"])
+    print("cache:", json.dumps(rep["cache"], ensure_ascii=False))
+    print("app fetches during replay:", rep["app_fetches"])
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Replay trace /api/search trên snapshot cố định")
+    ap.add_argument("trace", nargs="+", help="file trace (kể cả bản đã xoay .1 .2 ...)")
+    ap.add_argument("--snapshot", required=True, help="file từ `python app.py snapshot`")
+    ap.add_argument("--speed", type=float, default=0.0, help="1 = nhịp thật, 0 = bắn liên tục")
+    ap.add_argument("--concurrency", type=int, default=1)
+    ap.add_argument("--mode", default=None, help="ép strategy khác lúc ghi (so sánh)")
+    ap.add_argument("--json", action="store_true", help="in report dạng JSON")
+    args = ap.parse_args(argv)
+    if not A.TRACE_SALT:
+        ap.error("thiếu TRACE_SALT (phải giống lúc ghi trace)")
+
+    A._SEARCH_LIMITER.rate = 0  # replay không bị rate limit chặn
+    A._use_values(A._load_values_file(args.snapshot))
+    recs = read_trace(args.trace)
+    jobs = make_jobs(recs, build_resolver())
+
+    fetches = A._FETCH_COUNT
+    rep = replay(jobs, args.speed, args.concurrency, args.mode)
+    kinds = Counter(j["kind"] for j in jobs)
+    rep["resolve"] = {"resolved": kinds["resolved"], "unresolved": kinds["unresolved"], "short": kinds["short"]}
+    rep["cache"] = cache_profile(recs)
+    rep["app_fetches"] = A._FETCH_COUNT - fetches
+    if args.json:
+        print(json.dumps(rep, ensure_ascii=False, indent=2))
+    else:
+        _print_report(rep)
+    return rep
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+NgânMiu.Store — Giả lập Google Sheets API v4 (đủ phần gspread mà app.py gọi)
+- GET /v4/spreadsheets/<id>                -> metadata (open_by_key / worksheet)
+- GET /v4/spreadsheets/<id>/values/<range> -> get_all_values / get_values("A12:ZZ")
+Dữ liệu lấy từ file snapshot (`python app.py snapshot`) hoặc sheet giả của loadtest.
+Bơm lỗi: độ trễ, 429 (hết quota, theo xác suất hoặc giới hạn đọc/phút), 5xx,
+sửa dữ liệu giữa chừng (tự động theo chu kỳ hoặc qua /_sim/edit).
+
+  python sheets_sim.py --rows 20000 --latency 0.8 --jitter 0.4 --p429 0.05 --p5xx 0.02
+  python sheets_sim.py --rows 200000 --latency 0.3 --ms-per-1k-rows 40   # tab lớn (FETCH_CHUNK_ROWS)
+  SHEETS_API_BASE=http://127.0.0.1:8089 GOOGLE_SHEET_ID=sim python app.py
+
+Điều khiển lúc đang test (JSON):
+  POST /_sim/config {"latency": 2.0, "p429": 0.5}         đổi kiểu lỗi
+  POST /_sim/edit   {"row": 12, "values": ["Tên", ...]}   sửa dòng 12 (1-based)
+  POST /_sim/edit   {"append": [[...], [...]]}            thêm dòng cuối
+  POST /_sim/edit   {"delete": 12}                        xoá dòng 12
+  GET  /_sim/stats                                        số request / lỗi đã bơm
+"""
+
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, unquote
+from typing import Dict, List, Any, Optional, Tuple
+
+_RANGE_RE = re.compile(r"^([A-Z]*)(\d*)$")
+
+# lỗi y như Google trả -> gspread.exceptions.APIError parse được
+_ERRORS = {
+    429: ("RESOURCE_EXHAUSTED", "Quota exceeded for quota metric 'Read requests' and limit "
+                                "'Read requests per minute per user'"),
+    500: ("INTERNAL", "Internal error encountered."),
+    503: ("UNAVAILABLE", "The service is currently unavailable."),
+}
+
+
+def _col_index(letters: str) -> int:
+    n = 0
+    for ch in letters:
+        n = n * 26 + (ord(ch) - 64)
+    return n
+
+def _parse_a1(rng: str) -> Tuple[str, int, int, int, int]:
+    """
+    "'Tab'!A12:ZZ40" -> (tab, row0, row1, col0, col1), 1-based, 0 = mở (tới hết).
+    Hỗ trợ "Tab", "'Tab'!A12:ZZ", "'Tab'!12:14".
+    """
+    tab, _, cells = rng.rpartition("!")
+    if not tab:
+        tab, cells = cells, ""
+    tab = tab.strip("'").replace("''", "'")
+    if not cells:
+        return tab, 0, 0, 0, 0
+    a, _, b = cells.partition(":")
+    b = b or a
+    ca, ra = _RANGE_RE.match(a).groups()
+    cb, rb = _RANGE_RE.match(b).groups()
+    return tab, int(ra or 0), int(rb or 0), _col_index(ca), _col_index(cb)
+
+
+class Sim:
+    """Trạng thái sheet giả + cấu hình lỗi, dùng chung cho mọi thread của server."""
+
+    def __init__(self, values: List[List[str]], sheet_id: str, tab: str, seed: int = 1):
+        self.values = values
+        self.sheet_id = sheet_id
+        self.tab = tab
+        self.cfg: Dict[str, Any] = {"latency": 0.0, "jitter": 0.0, "p429": 0.0, "p5xx": 0.0,
+                                    "quota_per_min": 0, "edit_every": 0.0, "ms_per_1k_rows": 0.0}
+        self.stats = {"requests": 0, "metadata": 0, "values": 0, "rows_served": 0,
+                      "injected_429": 0, "injected_5xx": 0, "quota_429": 0, "edits": 0}
+        self.lock = threading.Lock()
+        self.rnd = random.Random(seed)
+        self._reads: List[float] = []
+        self._last_edit = time.time()
+
+    # ---------- lỗi / độ trễ ----------
+    def fault(self) -> int:
+        """Return mã lỗi cần trả (0 = không lỗi). Gọi 1 lần / request."""
+        with self.lock:
+            self.stats["requests"] += 1
+            self._auto_edit()
+            lim = self.cfg["quota_per_min"]
+            now = time.time()
+            if lim:
+                self._reads = [t for t in self._reads if now - t < 60.0]
+                if len(self._reads) >= lim:
+                    self.stats["quota_429"] += 1
+                    return 429
+                self._reads.append(now)
+            x = self.rnd.random()
+            if x < self.cfg["p429"]:
+                self.stats["injected_429"] += 1
+                return 429
+            if x < self.cfg["p429"] + self.cfg["p5xx"]:
+                self.stats["injected_5xx"] += 1
+                return self.rnd.choice([500, 503])
+            delay = self.cfg["latency"] + self.rnd.random() * self.cfg["jitter"]
+        if delay > 0:
+            time.sleep(delay)
+        return 0
+
+    # ---------- sửa dữ liệu ----------
+    def _auto_edit(self):
+        """edit_every giây: đổi trạng thái 1 dòng ngẫu nhiên + thêm 1 đơn mới (giống lúc live)."""
+        every = self.cfg["edit_every"]
+        if not every or time.time() - self._last_edit < every or len(self.values) < 4:
+            return
+        self._last_edit = time.time()
+        r = self.rnd.randrange(3, len(self.values))
+        row = list(self.values[r])
+        if len(row) > 3:
+            row[3] = self.rnd.choice(["Chờ lấy hàng", "Đang giao", "Đã giao", "Hoàn hàng"])
+        self.values[r] = row
+        self.values.append(list(self.values[self.rnd.randrange(3, len(self.values))]))
+        self.stats["edits"] += 2
+
+    def edit(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        with self.lock:
+            if "row" in body:
+                r = int(body["row"])
+                while len(self.values) < r:
+                    self.values.append([])
+                self.values[r - 1] = [str(v) for v in body.get("values", [])]
+            if "append" in body:
+                self.values.extend([str(v) for v in row] for row in body["append"])
+            if "delete" in body:
+                del self.values[int(body["delete"]) - 1]
+            self.stats["edits"] += 1
+            return {"ok": True, "rows": len(self.values)}
+
+    # ---------- dữ liệu theo API ----------
+    def metadata(self) -> Dict[str, Any]:
+        with self.lock:
+            self.stats["metadata"] += 1
+            cols = max((len(r) for r in self.values), default=1)
+            return {
+                "spreadsheetId": self.sheet_id,
+                "properties": {"title": "sheets_sim", "locale": "vi_VN", "timeZone": "Asia/Ho_Chi_Minh"},
+                "sheets": [{"properties": {
+                    "sheetId": 0, "title": self.tab, "index": 0, "sheetType": "GRID",
+                    "gridProperties": {"rowCount": max(1000, len(self.values)), "columnCount": max(26, cols)},
+                }}],
+            }
+
+    def get_range(self, rng: str) -> Optional[Dict[str, Any]]:
+        tab, r0, r1, c0, c1 = _parse_a1(rng)
+        if tab != self.tab:
+            return None
+        with self.lock:
+            self.stats["values"] += 1
+            rows = self.values[(r0 or 1) - 1:(r1 or len(self.values))]
+            out = []
+            for row in rows:
+                row = row[(c0 or 1) - 1:(c1 or len(row))]
+                # Google bỏ ô rỗng cuối dòng và dòng rỗng cuối range
+                n = len(row)
+                while n and not row[n - 1]:
+                    n -= 1
+                out.append(list(row[:n]))
+            while out and not out[-1]:
+                out.pop()
+            self.stats["rows_served"] += len(out)
+            per_row = self.cfg["ms_per_1k_rows"] / 1e6
+        if per_row > 0:
+            time.sleep(len(out) * per_row)  # range lớn -> Google đọc / trả lâu hơn
+        res: Dict[str, Any] = {"range": rng, "majorDimension": "ROWS"}
+        if out:
+            res["values"] = out
+        return res
+
+
+class Handler(BaseHTTPRequestHandler):
+    sim: Sim = None  # gán khi tạo server
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):  # không in log từng request
+        pass
+
+    def _json(self, code: int, obj: Any):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, code: int, status: str = "", message: str = ""):
+        if not status:
+            status, message = _ERRORS[code]
+        self._json(code, {"error": {"code": code, "message": message, "status": status}})
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/_sim/stats":
+            return self._json(200, dict(self.sim.stats, rows=len(self.sim.values), config=self.sim.cfg))
+
+        m = re.match(r"^/v4/spreadsheets/([^/]+)(?:/values/(.+))?$", path)
+        if not m:
+            return self._error(404, "NOT_FOUND", "Requested entity was not found.")
+        if m.group(1) != self.sim.sheet_id:
+            return self._error(404, "NOT_FOUND", "Requested entity was not found.")
+        code = self.sim.fault()
+        if code:
+            return self._error(code)
+        if m.group(2) is None:
+            return self._json(200, self.sim.metadata())
+        res = self.sim.get_range(unquote(m.group(2)))
+        if res is None:
+            return self._error(400, "INVALID_ARGUMENT", f"Unable to parse range: {unquote(m.group(2))}")
+        return self._json(200, res)
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        n = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(n) or b"{}")
+        if path == "/_sim/config":
+            with self.sim.lock:
+                self.sim.cfg.update({k: v for k, v in body.items() if k in self.sim.cfg})
+            return self._json(200, {"ok": True, "config": self.sim.cfg})
+        if path == "/_sim/edit":
+            return self._json(200, self.sim.edit(body))
+        return self._error(404, "NOT_FOUND", "Requested entity was not found.")
+
+
+def make_server(sim: Sim, host: str = "127.0.0.1", port: int = 8089) -> ThreadingHTTPServer:
+    srv = ThreadingHTTPServer((host, port), type("SimHandler", (Handler,), {"sim": sim}))
+    srv.daemon_threads = True
+    return srv
+
+def serve(sim: Sim, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Chạy server ở thread nền (dùng trong test). Return server (srv.server_port, srv.shutdown())."""
+    srv = make_server(sim, host, port)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Giả lập Google Sheets API cho app.py (offline)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--sheet-id", default="sim", help="GOOGLE_SHEET_ID app.py phải dùng")
+    ap.add_argument("--tab", default="Book Shopee", help="GOOGLE_SHEET_TAB app.py phải dùng")
+    ap.add_argument("--fixture", help="file snapshot .json / .json.gz (python app.py snapshot)")
+    ap.add_argument("--rows", type=int, default=5000, help="không có --fixture: sinh sheet giả")
+    ap.add_argument("--customers", type=int, default=1000)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--latency", type=float, default=0.0, help="độ trễ mỗi request (giây)")
+    ap.add_argument("--jitter", type=float, default=0.0, help="cộng thêm ngẫu nhiên 0..jitter giây")
+    ap.add_argument("--p429", type=float, default=0.0, help="xác suất trả 429")
+    ap.add_argument("--p5xx", type=float, default=0.0, help="xác suất trả 500/503")
+    ap.add_argument("--quota-per-min", type=int, default=0, help="giới hạn đọc/phút như Google (0 = tắt)")
+    ap.add_argument("--edit-every", type=float, default=0.0, help="tự sửa dữ liệu mỗi N giây (0 = tắt)")
+    ap.add_argument("--ms-per-1k-rows", type=float, default=0.0,
+                    help="độ trễ thêm theo cỡ range (ms / 1000 dòng trả về), như Google đọc range lớn")
+    args = ap.parse_args(argv)
+
+    if args.fixture:
+        import gzip
+        opener = gzip.open if args.fixture.endswith(".gz") else open
+        with opener(args.fixture, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        values = data["values"] if isinstance(data, dict) else data
+    else:
+        from loadtest import make_values
+        values, _ = make_values(args.rows, args.customers, args.seed)
+
+    sim = Sim(values, args.sheet_id, args.tab, args.seed)
+    sim.cfg.update(latency=args.latency, jitter=args.jitter, p429=args.p429, p5xx=args.p5xx,
+                   quota_per_min=args.quota_per_min, edit_every=args.edit_every,
+                   ms_per_1k_rows=args.ms_per_1k_rows)
+    srv = make_server(sim, args.host, args.port)
+    print(f"sheets_sim: http://{args.host}:{srv.server_port}  sheet_id={args.sheet_id} "
+          f"tab={args.tab!r} rows={len(values)}")
+    print(f"  SHEETS_API_BASE=http://{args.host}:{srv.server_port} GOOGLE_SHEET_ID={args.sheet_id} "
+          f"GOOGLE_SHEET_TAB={args.tab!r}")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Fixture chung: app.py chạy với sheet giả trong RAM (loadtest.FakeWorksheet),
+không gọi Google, không warm-up. Mỗi test dựng lại snapshot từ đầu.
+  python -m pytest -q
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("WARMUP", "off")
+
+import pytest  # noqa: E402
+
+import app as A  # noqa: E402
+import loadtest  # noqa: E402
+
+HEADER = loadtest.HEADER
+TITLE = [["NgânMiu.Store - Book Shopee"], [""]]
+
+
+def order(name, phone="0901234567", mvd="", status="Đang giao", cod="10000"):
+    """1 dòng đơn theo đúng thứ tự cột HEADER."""
+    return [name, "SPC_EC=secret", mvd, status, name, phone, "1 Lê Lợi, Quận 1", "Sách", cod]
+
+
+@pytest.fixture
+def sheet(monkeypatch):
+    """
+    sheet(rows) -> FakeWorksheet có title + header + rows, snapshot trống.
+    Sửa ws.values rồi A._refresh_snapshot(force=True) để giả lập sheet đổi.
+    """
+    monkeypatch.setattr(A._SEARCH_LIMITER, "rate", 0.0)
+    monkeypatch.setattr(A._SEARCH_LIMITER, "_buckets", A.OrderedDict())
+    for name in ("_CACHE_TTL", "_CACHE_TTL_MIN", "_CACHE_TTL_MAX", "SEARCH_BY_PHONE_MVD"):
+        monkeypatch.setattr(A, name, getattr(A, name))  # test (vd CLI) có sửa thì trả lại
+
+    def install(rows):
+        ws = loadtest.FakeWorksheet(TITLE + [list(HEADER)] + [list(r) for r in rows])
+        A._drop_snapshot()
+        A._SHEET_WS = ws
+        A._CACHE_HASH = None
+        A._SNAP_HEADER = (-1, ())
+        A._NEG_CACHE.clear()
+        return ws
+
+    yield install
+    A._drop_snapshot()
+    A._SHEET_WS = None
+
+
+@pytest.fixture
+def client():
+    return A.app.test_client()
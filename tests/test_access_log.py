@@ -0,0 +1,62 @@
+import json
+import queue
+import logging
+
+import pytest
+
+import app as A
+from conftest import order
+
+
+@pytest.fixture
+def alog(monkeypatch, tmp_path):
+    """Bật access log ghi ra file tạm; trả về hàm đọc các dòng đã ghi (dừng listener để flush)."""
+    path = tmp_path / "access.jsonl"
+    monkeypatch.setattr(A, "ACCESS_LOG", str(path))
+    monkeypatch.setattr(A, "TRACE_SALT", b"salt")
+    monkeypatch.setattr(A, "_ALOG_STATS", {k: 0 for k in A._ALOG_STATS})
+    log, listener = A._access_logger()
+    monkeypatch.setattr(A, "_ACCESS_LOG", log)
+    monkeypatch.setattr(A, "_ACCESS_LISTENER", listener)
+
+    def read():
+        listener.stop()
+        return [json.loads(line) for line in path.read_text("utf-8").splitlines()]
+
+    yield read
+    listener.stop()
+
+
+def test_search_record_has_stages_and_no_raw_query(sheet, client, alog):
+    sheet([order("Phạm Hùng", phone="0912345678")])
+    assert client.post("/api/search", json={"q": "Phạm Hùng"}).status_code == 200
+    client.get("/api/search?q=0912345678")
+    recs = alog()
+    first = recs[0]
+    assert first["m"] == "POST" and first["route"] == "/api/search" and first["st"] == 200
+    assert {"sync", "hot"} <= set(first["stages"]) and first["qtype"] == "name" and first["qlen"] == 9
+    assert first["qh"] == A._trace_hash("pham hung")
+    assert recs[1]["qtype"] == "phone"
+    raw = json.dumps(recs, ensure_ascii=False)
+    assert "Phạm Hùng" not in raw and "pham hung" not in raw and "0912345678" not in raw
+
+
+def test_sampling_keeps_errors_and_slow_requests(sheet, client, alog, monkeypatch):
+    sheet([order("Phạm Hùng")])
+    monkeypatch.setattr(A, "ACCESS_LOG_SAMPLE", 0.0)
+    client.post("/api/search", json={"q": "pham hung"})
+    monkeypatch.setattr(A, "_search_response", lambda *a: 1 / 0)
+    assert client.post("/api/search", json={"q": "pham hung"}).status_code == 500
+    recs = alog()
+    assert len(recs) == 1 and recs[0]["st"] == 500 and recs[0]["err"].startswith("ZeroDivisionError")
+    assert recs[0]["sample"] == 0.0
+    assert A._ALOG_STATS["sampled_out"] == 1
+
+
+def test_full_queue_drops_instead_of_blocking(monkeypatch):
+    monkeypatch.setattr(A, "_ALOG_STATS", {k: 0 for k in A._ALOG_STATS})
+    h = A._DropQueueHandler(queue.Queue(maxsize=1))
+    rec = logging.LogRecord("x", logging.INFO, "", 0, {"st": 200}, None, None)
+    for _ in range(3):
+        h.emit(rec)
+    assert A._ALOG_STATS["queued"] == 1 and A._ALOG_STATS["dropped"] == 2
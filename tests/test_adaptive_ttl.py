@@ -0,0 +1,48 @@
+import app as A
+from conftest import order
+
+
+def test_ttl_grows_while_unchanged_and_halves_on_change(sheet, monkeypatch):
+    monkeypatch.setattr(A, "_CACHE_TTL", 10.0)
+    monkeypatch.setattr(A, "_CACHE_TTL_MIN", 5.0)
+    monkeypatch.setattr(A, "_CACHE_TTL_MAX", 120.0)
+    ws = sheet([order("Phạm Hùng")])
+    A._refresh_snapshot(force=True)
+    assert A._CACHE_TTL == 10.0  # lần fetch đầu không tính
+
+    for _ in range(3):
+        A._refresh_snapshot(force=True)
+    assert A._CACHE_TTL == 10.0 * 1.5 ** 3
+
+    ws.values.append(order("Lê Lan"))
+    A._refresh_snapshot(force=True)
+    assert A._CACHE_TTL == 10.0 * 1.5 ** 3 / 2
+    assert A._refresh_stats()["changes"] >= 1
+
+
+def test_ttl_is_clamped(sheet, monkeypatch):
+    monkeypatch.setattr(A, "_CACHE_TTL", 100.0)
+    monkeypatch.setattr(A, "_CACHE_TTL_MAX", 120.0)
+    sheet([order("Phạm Hùng")])
+    for _ in range(5):
+        A._refresh_snapshot(force=True)
+    assert A._CACHE_TTL == 120.0
+
+
+def test_no_refetch_within_ttl(sheet, monkeypatch):
+    monkeypatch.setattr(A, "_CACHE_TTL", 60.0)
+    ws = sheet([order("Phạm Hùng")])
+    A._search("pham hung")
+    calls = ws.calls
+    A._search("pham hung")
+    assert ws.calls == calls
+
+
+def test_changes_last_hour_drops_old_entries(monkeypatch):
+    for name in ("_CACHE_TTL", "_FETCH_COUNT", "_CHANGE_COUNT", "_CHANGE_EWMA"):
+        monkeypatch.setattr(A, name, getattr(A, name))  # khôi phục sau test
+    monkeypatch.setattr(A, "_CACHE_HASH", 1)
+    monkeypatch.setattr(A, "_CHANGE_TIMES", A.deque([0.0, 100.0, 4000.0], maxlen=3600))
+    assert A._track_change(2, now=4000.0 + 200.0)
+    assert list(A._CHANGE_TIMES) == [4000.0, 4200.0]
+    assert A._refresh_stats()["changes_last_hour"] == 2
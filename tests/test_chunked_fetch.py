@@ -0,0 +1,76 @@
+import pytest
+
+import app as A
+import loadtest
+from conftest import order
+
+
+class ChunkSheet(loadtest.FakeWorksheet):
+    """Giống API thật: có row_count (cả lưới), range không trả dòng trắng ở cuối; fail[rng] = số lần lỗi."""
+
+    def __init__(self, values, grid_rows, fail=None):
+        super().__init__(values)
+        self.row_count = grid_rows
+        self.fail = dict(fail or {})
+        self.ranges = []
+
+    def get_values(self, rng=""):
+        self.ranges.append(rng)
+        if self.fail.get(rng, 0) > 0:
+            self.fail[rng] -= 1
+            raise ConnectionError("chunk timeout")
+        rows = super().get_values(rng)
+        while rows and not any(c.strip() for c in rows[-1]):
+            rows.pop()
+        return rows
+
+
+@pytest.fixture
+def chunked(sheet, monkeypatch):
+    monkeypatch.setattr(A, "FETCH_CHUNK_ROWS", 10)
+    monkeypatch.setattr(A, "_CHUNK_STATS", {k: (None if k == "last_slowest_ms" else 0) for k in A._CHUNK_STATS})
+    monkeypatch.setattr(A.time, "sleep", lambda s: None)
+    rows = [order(f"Khách {i}") for i in range(25)]
+    rows[6] = rows[7] = [""] * 9  # dòng 10, 11 trắng: cuối chunk 1 (API không trả) + đầu chunk 2
+    sheet(rows)
+
+    def install(fail=None):
+        ws = ChunkSheet(A._SHEET_WS.values, grid_rows=40, fail=fail)
+        A._SHEET_WS = ws
+        return ws
+
+    return install
+
+
+def test_chunks_join_to_the_same_values_as_one_fetch(chunked):
+    ws = chunked()
+    values, hashes = A._fetch_values_hashed()
+    want = ws.get_all_values()
+    assert sorted(ws.ranges) == ["A11:ZZ20", "A1:ZZ10", "A21:ZZ30", "A31:ZZ"]
+    # dòng trắng cuối chunk API không trả -> đệm [] đúng chỗ, dòng trắng cuối sheet bị bỏ
+    assert [r or [""] * 9 for r in values] == want
+    assert hashes == [A._row_hash(r) for r in values]
+    assert A._CHUNK_STATS["last_chunks"] == 4
+
+    A._refresh_snapshot(force=True)
+    assert [it["_row"] for it in A._search("khach 24")] == [27]
+
+
+def test_failed_chunk_is_retried_alone(chunked):
+    ws = chunked(fail={"A11:ZZ20": 2})
+    values, _ = A._fetch_values_hashed()
+    assert len(values) == 28 and values[27][0] == "Khách 24"
+    assert A._CHUNK_STATS["retries"] == 2
+    assert ws.ranges.count("A11:ZZ20") == 3 and ws.ranges.count("A1:ZZ10") == 1
+
+
+def test_chunk_out_of_retries_keeps_last_snapshot(chunked, monkeypatch):
+    chunked()
+    A._refresh_snapshot(force=True)
+    version = A._SNAP_BUILT_VERSION
+    monkeypatch.setattr(A, "FETCH_CHUNK_RETRIES", 1)
+    chunked(fail={"A21:ZZ30": 5})
+    with pytest.raises(ConnectionError):
+        A._refresh_snapshot(force=True)
+    assert A._CHUNK_STATS["failed"] == 1 and A._CHUNK_STATS["retries"] == 1
+    assert A._SNAP_BUILT_VERSION == version and A._search("khach 3")
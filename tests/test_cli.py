@@ -0,0 +1,48 @@
+import io
+import json
+
+import app as A
+from conftest import HEADER, TITLE, order
+
+
+def _snapshot_file(tmp_path, rows):
+    path = tmp_path / "snap.json.gz"
+    A._save_values_file(str(path), TITLE + [list(HEADER)] + rows)
+    return str(path)
+
+
+def _run(capsys, argv):
+    assert A._cli(argv) == 0
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+ROWS = [
+    order("Phạm Hùng", phone="0911111111", mvd="SPXVN1", status="Đang giao"),
+    order("Lê Lan", phone="0922222222", status="Đang giao"),
+    order("Trần Mai", phone="0933333333", mvd="SPXVN3", status="Đã giao"),
+]
+
+
+def test_export_status_filter_folds_d(sheet, tmp_path, capsys, monkeypatch):
+    sheet([])
+    snap = _snapshot_file(tmp_path, ROWS)
+    accented = _run(capsys, ["--snapshot", snap, "export", "--format", "jsonl", "--status", "đang giao"])
+    plain = _run(capsys, ["--snapshot", snap, "export", "--format", "jsonl", "--status", "dang giao"])
+    assert len(accented) == 2
+    assert plain == accented
+    assert [r["name"] for r in _run(capsys, ["--snapshot", snap, "export", "--format", "jsonl", "--status", "da giao"])] == ["Trần Mai"]
+
+
+def test_export_missing_mvd(sheet, tmp_path, capsys, monkeypatch):
+    sheet([])
+    snap = _snapshot_file(tmp_path, ROWS)
+    assert [r["name"] for r in _run(capsys, ["--snapshot", snap, "export", "--format", "jsonl", "--missing-mvd"])] == ["Lê Lan"]
+
+
+def test_lookup_by_name_phone_and_mvd(sheet, tmp_path, capsys, monkeypatch):
+    sheet([])
+    snap = _snapshot_file(tmp_path, ROWS)
+    monkeypatch.setattr("sys.stdin", io.StringIO("pham hung\n0922 222 222\n# ghi chú\nSPXVN3\nkhong co\n"))
+    out = _run(capsys, ["--snapshot", snap, "lookup", "-"])
+    assert [(r["query"], r.get("name")) for r in out] == [
+        ("pham hung", "Phạm Hùng"), ("0922 222 222", "Lê Lan"), ("SPXVN3", "Trần Mai"), ("khong co", None)]
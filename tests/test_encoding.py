@@ -0,0 +1,43 @@
+import gzip
+import json
+
+import pytest
+
+import app as A
+from conftest import order
+
+
+@pytest.fixture
+def many(sheet, monkeypatch):
+    monkeypatch.setattr(A, "COMPRESS_MIN_BYTES", 64)
+    sheet([order("Phạm Hùng", mvd=f"SPXVN{i}") for i in range(10)])
+
+
+def test_gzip_when_br_not_accepted(many, client):
+    r = client.post("/api/search", json={"q": "pham hung"}, headers={"Accept-Encoding": "gzip"})
+    assert r.headers["Content-Encoding"] == "gzip"
+    assert len(json.loads(gzip.decompress(r.data))["items"]) == 10
+    assert "Accept-Encoding" in r.headers["Vary"]
+
+
+def test_brotli_preferred(many, client):
+    brotli = pytest.importorskip("brotli")
+    r = client.post("/api/search", json={"q": "pham hung"}, headers={"Accept-Encoding": "gzip, br"})
+    assert r.headers["Content-Encoding"] == "br"
+    assert json.loads(brotli.decompress(r.data))["ok"] is True
+
+
+def test_msgpack_only_when_asked(many, client):
+    msgpack = pytest.importorskip("msgpack")
+    r = client.post("/api/search", json={"q": "pham hung"}, headers={"Accept": "application/msgpack"})
+    assert r.mimetype == "application/msgpack"
+    assert len(msgpack.unpackb(r.data)["items"]) == 10
+    r = client.post("/api/search", json={"q": "pham hung"}, headers={"Accept": "*/*"})
+    assert r.mimetype == "application/json"
+
+
+def test_small_body_not_compressed(sheet, client):
+    sheet([order("Phạm Hùng")])
+    r = client.post("/api/search", json={"q": "x"}, headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in r.headers
+    assert r.get_json()["msg"] == "Tên quá ngắn"
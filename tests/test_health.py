@@ -0,0 +1,36 @@
+import app as A
+from conftest import order
+
+
+def test_livez_never_touches_sheet(sheet, client):
+    ws = sheet([order("Phạm Hùng")])
+    assert client.get("/livez").status_code == 200
+    assert ws.calls == 0
+
+
+def test_readyz_follows_snapshot(sheet, client):
+    ws = sheet([order("Phạm Hùng")])
+    r = client.get("/readyz")
+    assert r.status_code == 503 and r.get_json()["ready"] is False
+    A._refresh_snapshot(force=True)
+    calls = ws.calls
+    js = client.get("/readyz").get_json()
+    assert js["ready"] is True and js["items"] == 1
+    assert ws.calls == calls  # probe chỉ đọc trạng thái trong RAM
+
+
+def test_readyz_reports_fetch_error(sheet, client):
+    ws = sheet([order("Phạm Hùng")])
+    A._refresh_snapshot(force=True)
+
+    def boom():
+        raise RuntimeError("quota")
+
+    ws.get_all_values = boom
+    try:
+        A._refresh_snapshot(force=True)
+    except RuntimeError:
+        pass
+    js = client.get("/readyz").get_json()
+    assert js["ready"] is True  # còn snapshot cũ thì vẫn phục vụ được
+    assert js["last_error"] == "quota"
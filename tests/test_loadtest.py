@@ -0,0 +1,28 @@
+import loadtest
+
+
+def test_loadtest_flask_mode_reports_every_route(monkeypatch):
+    monkeypatch.setattr(loadtest.A._SEARCH_LIMITER, "rate", 0.0)
+    rep = loadtest.main(["--rows", "500", "--customers", "100", "--requests", "200",
+                         "--concurrency", "4", "--seed", "3", "--json"])
+    assert rep["requests"] == 200
+    routes = rep["routes"]
+    assert sum(r["n"] for k, r in routes.items() if "[" not in k) == 200
+    assert all(r["errors"] == 0 for r in routes.values())
+    for r in routes.values():
+        assert r["p50_ms"] <= r["p95_ms"] <= r["p99_ms"] <= r["max_ms"]
+
+
+def test_make_plan_is_seeded():
+    names = ["Phạm Hùng", "Lê Lan", "Trần Mai"]
+    mix = {"hit": 0.5, "miss": 0.3, "short": 0.2}
+    assert loadtest.make_plan(names, 50, 7, mix) == loadtest.make_plan(names, 50, 7, mix)
+
+
+def test_bench_memory_keep_raw_wraps_the_fetch_refresh_uses(sheet, monkeypatch):
+    import bench_memory
+    A = loadtest.A
+    monkeypatch.setattr(A, "_fetch_values_hashed", A._fetch_values_hashed)
+    sheet([])
+    r = bench_memory._measure(300, True, 1)  # lỗi nếu bản giữ raw không được gọi
+    assert r["keep_raw"] and r["items"] == 300
@@ -0,0 +1,33 @@
+import app as A
+from conftest import order
+
+
+def _view():
+    hot = A._HOT_TIER
+    items = {r: {k: v for k, v in it.items()} for r, it in hot["items"].items()}
+    return items, hot["name"], hot["phone"], hot["mvd"], hot["agg"], set(hot["missing"])
+
+
+def test_spawn_pool_builds_same_snapshot_as_serial(sheet, monkeypatch):
+    rows = [order(f"Khách {i % 7}", phone=f"09{i:08d}", mvd=f"SPXVN{i}" if i % 3 else "",
+                  status="Đã giao" if i % 2 else "Đang giao") for i in range(60)]
+    sheet(rows)
+    A._refresh_snapshot(force=True)
+    assert A._SNAP_LAST_SYNC["workers"] == 1  # mặc định tắt
+    serial = _view()
+
+    monkeypatch.setattr(A, "PARSE_WORKERS", 2)
+    monkeypatch.setattr(A, "PARSE_PARALLEL_MIN_ROWS", 0)
+    monkeypatch.setattr(A, "_PARSE_POOL_BROKEN", False)
+    sheet(rows)
+    A._refresh_snapshot(force=True)
+    assert A._SNAP_LAST_SYNC["workers"] == 2
+    assert _view() == serial
+
+
+def test_below_threshold_stays_serial(sheet, monkeypatch):
+    monkeypatch.setattr(A, "PARSE_WORKERS", 2)
+    monkeypatch.setattr(A, "PARSE_PARALLEL_MIN_ROWS", 1000)
+    sheet([order("Phạm Hùng")])
+    A._refresh_snapshot(force=True)
+    assert A._SNAP_LAST_SYNC["workers"] == 1
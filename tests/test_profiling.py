@@ -0,0 +1,52 @@
+import marshal
+import time
+
+import app as A
+from conftest import order
+
+ADMIN = {"X-Admin-Token": "t0k"}
+
+
+def _enable(monkeypatch, sample=0.0, secret=""):
+    monkeypatch.setattr(A, "ADMIN_TOKEN", "t0k")
+    monkeypatch.setattr(A, "_PROFILING", True)
+    monkeypatch.setattr(A, "PROFILE_SAMPLE", sample)
+    monkeypatch.setattr(A, "PROFILE_SECRET", secret)
+    monkeypatch.setattr(A, "_PROFILES", A.deque(maxlen=5))
+
+
+def test_sampled_refresh_is_listed_and_downloadable(sheet, client, monkeypatch):
+    _enable(monkeypatch, sample=1.0)
+    sheet([order("Phạm Hùng"), order("Lê Lan")])
+    A._refresh_snapshot(force=True)
+
+    assert client.get("/api/profiles").status_code == 403
+    js = client.get("/api/profiles", headers=ADMIN).get_json()
+    p = js["profiles"][0]
+    assert p["kind"] == "refresh" and p["trigger"] == "sample" and p["top"]
+
+    raw = client.get(f"/api/profiles/{p['id']}", headers=ADMIN)
+    assert raw.headers["Content-Disposition"].endswith(".prof")
+    assert isinstance(marshal.loads(raw.data), dict)
+
+    ss = client.get(f"/api/profiles/{p['id']}?format=speedscope", headers=ADMIN).get_json()
+    prof = ss["profiles"][0]
+    assert prof["type"] == "sampled" and len(prof["samples"]) == len(prof["weights"]) > 0
+    assert all(i < len(ss["shared"]["frames"]) for s in prof["samples"] for i in s)
+
+    assert client.get("/api/profiles/999999", headers=ADMIN).status_code == 404
+
+
+def test_signed_header_triggers_only_when_valid_and_fresh(monkeypatch):
+    _enable(monkeypatch, secret="s3cret")
+
+    def trigger(header):
+        with A.app.test_request_context("/api/search", headers={"X-Profile": header}):
+            return A._profile_trigger()
+
+    ts = str(int(time.time()))
+    assert trigger(f"{ts}.{A._profile_sig(ts)}") == "header"
+    assert trigger(f"{ts}.{'0' * 64}") == ""
+    old = str(int(time.time()) - 2 * A._REFRESH_MAX_SKEW)
+    assert trigger(f"{old}.{A._profile_sig(old)}") == ""
+    assert trigger("") == ""
@@ -0,0 +1,33 @@
+import app as A
+from conftest import order
+
+
+def test_token_bucket_allows_burst_then_limits():
+    lim = A._RateLimiter(rate=1.0, burst=3, max_keys=10)
+    assert [lim.hit("1.1.1.1") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert lim.hit("1.1.1.1") > 0
+    assert lim.hit("2.2.2.2") == 0.0  # bucket riêng từng IP
+    assert lim.stats()["limited"] == 1
+
+
+def test_lru_evicts_oldest_key():
+    lim = A._RateLimiter(rate=1.0, burst=1, max_keys=2)
+    for ip in ("a", "b", "c"):
+        lim.hit(ip)
+    assert lim.evicted == 1
+    assert lim.hit("a") == 0.0  # "a" bị đẩy ra -> bucket mới đầy
+
+
+def test_api_search_returns_429_with_retry_after(sheet, client, monkeypatch):
+    sheet([order("Phạm Hùng")])
+    monkeypatch.setattr(A._SEARCH_LIMITER, "rate", 0.5)
+    monkeypatch.setattr(A._SEARCH_LIMITER, "burst", 2)
+    hdr = {"X-Forwarded-For": "203.0.113.9"}
+    codes = [client.post("/api/search", json={"q": "pham hung"}, headers=hdr).status_code for _ in range(3)]
+    assert codes == [200, 200, 429]
+    r = client.post("/api/search", json={"q": "pham hung"}, headers=hdr)
+    assert r.status_code == 429
+    assert int(r.headers["Retry-After"]) >= 1
+    # IP khác không bị ảnh hưởng
+    assert client.post("/api/search", json={"q": "pham hung"},
+                       headers={"X-Forwarded-For": "203.0.113.10"}).status_code == 200
@@ -0,0 +1,39 @@
+import json
+import time
+
+import app as A
+from conftest import order
+
+
+def _post(client, payload, secret="s3cret"):
+    body = json.dumps(dict(payload, ts=payload.get("ts", int(time.time())))).encode("utf-8")
+    sig = A._sign_payload(body) if secret else "sha256=00"
+    return client.post("/api/refresh", data=body, headers={"X-Signature": sig})
+
+
+def test_webhook_patches_only_edited_rows(sheet, client, monkeypatch):
+    monkeypatch.setattr(A, "REFRESH_WEBHOOK_SECRET", "s3cret")
+    # dòng 1..10 có thể là header -> sửa ở đó thì tải full; sửa dòng 14
+    ws = sheet([order(f"Khách {i}") for i in range(10)] + [order("Lê Lan")])
+    A._refresh_snapshot(force=True)
+    calls = ws.calls
+    ws.values[13] = order("Lê Lan", mvd="SPXVN123")
+
+    r = _post(client, {"row_start": 14, "row_end": 14})
+    assert r.status_code == 200 and r.get_json()["rows"] == 1
+    assert ws.calls == calls + 1  # chỉ 1 lần get_values(range), không tải cả sheet
+    assert [it["mvd"] for it in A._search("le lan")] == ["SPXVN123"]
+
+
+def test_webhook_rejects_bad_signature_and_stale_payload(sheet, client, monkeypatch):
+    monkeypatch.setattr(A, "REFRESH_WEBHOOK_SECRET", "s3cret")
+    sheet([order("Phạm Hùng")])
+    assert _post(client, {"full": True}, secret="").status_code == 401
+    assert _post(client, {"full": True, "ts": int(time.time()) - 3600}).status_code == 401
+
+
+def test_webhook_skips_other_tab(sheet, client, monkeypatch):
+    monkeypatch.setattr(A, "REFRESH_WEBHOOK_SECRET", "s3cret")
+    sheet([order("Phạm Hùng")])
+    r = _post(client, {"sheet": "Tab khác", "full": True})
+    assert r.get_json()["skipped"] is True
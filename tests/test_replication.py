@@ -0,0 +1,54 @@
+import gzip
+import json
+import time
+
+import pytest
+
+import app as A
+from conftest import HEADER, order
+
+TOKEN = {"X-Replica-Token": "s"}
+ROWS = [order(f"Khách {i}", phone=f"09{i:08d}", mvd=f"SPXVN{i}") for i in range(12)] + [order("Phạm Hùng")]
+
+
+@pytest.fixture
+def primary(sheet, monkeypatch):
+    monkeypatch.setattr(A, "REPLICATION_ROLE", "primary")
+    monkeypatch.setattr(A, "REPLICATION_SECRET", "s")
+    monkeypatch.setattr(A, "REPLICATION_PEERS", [])
+    monkeypatch.setattr(A, "_REPL_LOG", [])
+    monkeypatch.setattr(A, "_REPL", {"want_full": False, "full_bytes": 0, "patch_bytes": 0, "cols": (-1, [])})
+    ws = sheet(ROWS)
+    A._refresh_snapshot(force=True)
+    return ws
+
+
+def _ops(client, since=-1):
+    r = client.get("/api/replica/snapshot", query_string={"epoch": A._REPL_EPOCH, "since": since}, headers=TOKEN)
+    assert r.status_code == 200
+    return r, [json.loads(line) for line in gzip.decompress(r.data).splitlines() if line]
+
+
+def test_replica_ops_carry_only_used_columns(primary, client):
+    r, ops = _ops(client)
+    assert [op["kind"] for op in ops] == ["full"]
+    full = ops[0]["values"]
+    assert b"SPC_EC" not in gzip.decompress(r.data)
+    assert full[2] == HEADER  # header gửi nguyên -> replica dò cột như primary
+    assert full[3][0] == "Khách 0" and full[3][1] == "" and full[3][2] == "SPXVN0"
+
+    # patch (webhook) cũng chỉ mang cột được dùng
+    primary.values[15] = order("Phạm Hùng", mvd="SPXVN99")
+    primary.values[15][1] = "SPC_EC=new-secret"
+    A._refresh_rows(16, 16)
+    r2, ops2 = _ops(client, int(r.headers["X-Snapshot-Version"]))
+    assert [op["kind"] for op in ops2] == ["patch"] and ops2[0]["rows"][0][2] == "SPXVN99"
+    assert b"SPC_EC" not in gzip.decompress(r2.data)
+
+    # dựng snapshot từ các op đã chiếu cột -> kết quả tìm y hệt primary
+    want = {q: A._search(q) for q in ("pham hung", "khach 3")}
+    A._drop_snapshot()
+    assert A._repl_apply(r.headers["X-Snapshot-Epoch"], -1, r.data + r2.data, time.time())
+    A._CACHE_AT, calls = time.time(), primary.calls  # như _repl_pull: vừa kéo xong
+    assert {q: A._search(q) for q in want} == want
+    assert primary.calls == calls  # không đọc lại sheet
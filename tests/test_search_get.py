@@ -0,0 +1,33 @@
+import app as A
+from conftest import order
+
+ROWS = [order(f"Khách {i}") for i in range(12)] + [order("Phạm Hùng"), order("Lê Lan")]
+
+
+def test_get_body_has_no_version_and_etag_tracks_payload(sheet, client):
+    ws = sheet(ROWS)
+    r = client.get("/api/search?q=pham hung")
+    js = r.get_json()
+    assert js["ok"] and len(js["items"]) == 1 and "version" not in js
+    assert "version" in client.post("/api/search", json={"q": "pham hung"}).get_json()
+    etag = r.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    # sửa đơn khách khác -> version đổi nhưng body y hệt -> 304
+    ws.values[16] = order("Lê Lan", mvd="SPXVN1")
+    A._refresh_rows(17, 17)
+    r2 = client.get("/api/search?q=pham hung", headers={"If-None-Match": etag})
+    assert r2.status_code == 304 and r2.headers["ETag"] == etag
+
+    # đơn của chính khách này đổi -> ETag mới
+    ws.values[15] = order("Phạm Hùng", mvd="SPXVN2")
+    A._refresh_rows(16, 16)
+    r3 = client.get("/api/search?q=pham hung", headers={"If-None-Match": etag})
+    assert r3.status_code == 200 and r3.headers["ETag"] != etag
+    assert "SPXVN2" in r3.get_json()["items"][0]["html"]
+
+
+def test_get_redirects_to_canonical_query(sheet, client):
+    sheet(ROWS)
+    r = client.get("/api/search?q=Phạm Hùng&x=1")
+    assert r.status_code == 301 and r.headers["Location"].endswith("/api/search?q=pham%20hung")
@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import app as A
+import sheets_sim
+from conftest import HEADER, ROOT, TITLE, order
+
+
+@pytest.fixture
+def sim(sheet, monkeypatch):
+    sheet([])
+    s = sheets_sim.Sim(TITLE + [list(HEADER)] + [order(f"Khách {i}") for i in range(30)] + [order("Phạm Hùng")],
+                       "sim", A.GOOGLE_SHEET_TAB)
+    srv = sheets_sim.serve(s)
+    monkeypatch.setattr(A, "SHEETS_API_BASE", f"http://127.0.0.1:{srv.server_port}")
+    monkeypatch.setattr(A, "GOOGLE_SHEET_ID", "sim")
+    A._SHEET_WS = None
+    yield s
+    srv.shutdown()
+    A._SHEET_WS = None
+
+
+def test_app_reads_through_gspread_against_sim(sim):
+    assert [it["name_key"] for it in A._search("pham hung")] == ["Phạm Hùng"]
+    assert sim.stats["metadata"] >= 1 and sim.stats["values"] >= 1
+
+    sim.edit({"append": [order("Trần Mai")]})
+    A._refresh_snapshot(force=True)
+    assert len(A._search("tran mai")) == 1
+
+    rows = A._SHEET_WS.get_values("A34:ZZ")  # range mở tới hết sheet
+    assert rows == [order("Phạm Hùng"), order("Trần Mai")]
+
+
+def test_injected_errors_keep_last_snapshot(sim):
+    A._refresh_snapshot(force=True)
+    sim.cfg["p5xx"] = 1.0
+    with pytest.raises(Exception):
+        A._refresh_snapshot(force=True)
+    assert sim.stats["injected_5xx"] >= 1
+    assert A._FETCH_STATE["errors"] >= 1
+    assert len(A._search("pham hung")) == 1  # vẫn phục vụ từ snapshot cũ
+
+
+def test_quota_per_minute_returns_429(sim):
+    A._refresh_snapshot(force=True)
+    sim.cfg["quota_per_min"] = 1
+    A._refresh_snapshot(force=True)  # lượt đọc duy nhất trong phút
+    with pytest.raises(Exception):
+        A._refresh_snapshot(force=True)
+    assert sim.stats["quota_429"] >= 1
+
+
+@pytest.mark.parametrize("script", ["app.py", "back.py"])
+def test_cli_lookup_reads_sheet_once(sim, script, tmp_path):
+    q = tmp_path / "q.txt"
+    q.write_text("pham hung\n", encoding="utf-8")
+    env = dict(os.environ, WARMUP="background", SHEETS_API_BASE=A.SHEETS_API_BASE, GOOGLE_SHEET_ID="sim",
+               GOOGLE_SHEET_TAB=A.GOOGLE_SHEET_TAB)
+    before = sim.stats["values"]
+    out = subprocess.run([sys.executable, os.path.join(ROOT, script), "lookup", str(q)], env=env,
+                         capture_output=True, check=True, timeout=60).stdout.decode("utf-8")
+    assert "Phạm Hùng" in out
+    assert sim.stats["values"] - before == 1  # không có warm-up lúc import đọc thêm lần nữa
@@ -0,0 +1,100 @@
+import sys
+import threading
+
+import app as A
+from conftest import HEADER, order
+
+
+def _names(items):
+    return sorted(it["name_key"] for it in items)
+
+
+def test_incremental_refresh_updates_indexes(sheet):
+    ws = sheet([order("Phạm Hùng", phone="0911111111"), order("Lê Lan")])
+    A._refresh_snapshot(force=True)
+    assert len(A._search("pham hung")) == 1
+
+    ws.values[3] = order("Phạm Hùng Anh", phone="0911111111")
+    ws.values.append(order("Phạm Hùng"))
+    A._refresh_snapshot(force=True)
+    sync = A._SNAP_LAST_SYNC
+    assert (sync["inserted"], sync["updated"], sync["deleted"]) == (1, 1, 0)
+    assert [it["_row"] for it in A._search("pham hung")] == [5]
+    assert len(A._search("pham hung anh")) == 1
+
+    del ws.values[5]
+    A._refresh_snapshot(force=True)
+    assert A._search("pham hung") == []
+    assert A._snapshot_stats()["items"] == 2
+
+
+def test_phone_and_mvd_fallback_is_opt_in(sheet, monkeypatch):
+    sheet([order("Phạm Hùng", phone="0911 111 111", mvd="SPXVN0001")])
+    assert A._search("0911111111") == []
+    assert A._search("SPXVN0001") == []
+
+    monkeypatch.setattr(A, "SEARCH_BY_PHONE_MVD", True)
+    A._NEG_CACHE.clear()
+    assert _names(A._search("0911111111")) == ["Phạm Hùng"]
+    assert _names(A._search("spxvn0001")) == ["Phạm Hùng"]
+
+
+def test_header_change_rebuild_is_not_visible_until_done(sheet, monkeypatch):
+    ws = sheet([order(f"Khách {i}") for i in range(50)] + [order("Phạm Hùng")])
+    A._refresh_snapshot(force=True)
+    before = A._search("pham hung")
+    assert len(before) == 1
+
+    # đổi thứ tự cột -> build lại từ đầu; giữa chừng request vẫn phải thấy bản cũ đầy đủ
+    swap = [1, 0] + list(range(2, len(HEADER)))
+    ws.values = [[r[i] for i in swap] if len(r) == len(HEADER) else r for r in ws.values]
+    seen = []
+    parse = A._parse_row
+
+    def spy(row, cols, r):
+        if r == 30:
+            seen.append((A._search("pham hung"), A._snapshot_stats()["items"], A._sync_snapshot()))
+        return parse(row, cols, r)
+
+    monkeypatch.setattr(A, "_parse_row", spy)
+    A._refresh_snapshot(force=True)
+    assert seen == [(before, 51, "")]
+    assert len(A._search("pham hung")) == 1
+    assert A._SNAP_LAST_SYNC["inserted"] == 51
+
+
+def test_multi_row_patch_is_never_seen_half_applied(sheet):
+    # khách đổi chỗ giữa dòng 14..17 trong 1 lần vá: người đọc luôn thấy đúng 1 đơn, tổng đơn không đổi
+    rows = [order(f"Khách {i}") for i in range(15)]
+    ws = sheet(rows)
+    A._refresh_snapshot(force=True)
+    total = A._HOT_TIER["agg"]["orders"]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # đổi thread dày -> người đọc chen vào giữa lần vá
+    stop = threading.Event()
+    bad = []
+
+    def reader():
+        while not stop.is_set():
+            hot = A._HOT_TIER
+            got = A._rows_to_items(A._match_exact("pham hung", hot), hot["items"])
+            if len(got) != 1 or hot["agg"]["orders"] != total:
+                bad.append((len(got), hot["agg"]["orders"]))
+
+    ws.values[13] = order("Phạm Hùng")
+    A._refresh_rows(14, 14)
+    threads = [threading.Thread(target=reader) for _ in range(2)]
+    for t in threads:
+        t.start()
+    try:
+        for k in range(600):
+            at = 13 + (k + 1) % 4
+            for r in range(13, 17):
+                ws.values[r] = order("Phạm Hùng") if r == at else order(f"Khách {r - 3}")
+            A._refresh_rows(14, 17)
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+        sys.setswitchinterval(interval)
+    assert not bad, bad[:5]
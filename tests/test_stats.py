@@ -0,0 +1,46 @@
+import app as A
+from conftest import order
+
+ADMIN = {"X-Admin-Token": "t0k"}
+
+
+def _stats(client, qs="", headers=ADMIN):
+    return client.get("/api/stats" + qs, headers=headers)
+
+
+def test_cod_pending_excludes_delivered(sheet, client, monkeypatch):
+    monkeypatch.setattr(A, "ADMIN_TOKEN", "t0k")
+    ws = sheet([
+        order("Phạm Hùng", status="Đã giao", cod="100000", mvd="SPXVN1"),
+        order("Lê Lan", status="Đang giao", cod="20.000"),
+        order("Trần Mai", status="Hoàn hàng", cod="5000", mvd="SPXVN3"),
+    ])
+    js = _stats(client).get_json()
+    assert js["orders"] == 3
+    assert js["cod_total"] == 125000
+    assert js["cod_pending"] == 20000
+    assert js["missing_mvd"] == 1 and js["missing_mvd_cod"] == 20000
+    assert js["by_status"]["Đã giao"] == {"orders": 1, "cod": 100000, "missing_mvd": 0}
+
+    # tổng hợp cộng/trừ theo dòng khi sheet đổi
+    ws.values[4] = order("Lê Lan", status="Đã giao", cod="20000", mvd="SPXVN2")
+    A._refresh_snapshot(force=True)
+    js = _stats(client).get_json()
+    assert js["cod_pending"] == 0 and js["missing_mvd"] == 0
+
+
+def test_missing_list_limit_is_guarded(sheet, client, monkeypatch):
+    monkeypatch.setattr(A, "ADMIN_TOKEN", "t0k")
+    sheet([order(f"Khách {i}") for i in range(5)])
+    r = _stats(client, "?missing=1&limit=abc")
+    assert r.status_code == 200 and len(r.get_json()["missing_mvd_items"]) == 5
+    assert len(_stats(client, "?missing=1&limit=2").get_json()["missing_mvd_items"]) == 2
+    assert len(_stats(client, "?missing=1&limit=-3").get_json()["missing_mvd_items"]) == 1
+
+
+def test_admin_token_only_from_header(sheet, client, monkeypatch):
+    monkeypatch.setattr(A, "ADMIN_TOKEN", "t0k")
+    sheet([order("Phạm Hùng")])
+    assert _stats(client, "?token=t0k", headers={}).status_code == 403
+    assert _stats(client, headers={"X-Admin-Token": "sai"}).status_code == 403
+    assert _stats(client).status_code == 200
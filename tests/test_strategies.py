@@ -0,0 +1,36 @@
+import pytest
+
+import app as A
+from conftest import order
+
+ROWS = [order("Phạm Hùng"), order("Phạm Hà"), order("Hùng Anh"), order("Lê Lan")]
+
+
+def _names(items):
+    return sorted(it["name_key"] for it in items)
+
+
+@pytest.mark.parametrize("mode,q,want", [
+    ("exact", "pham hung", ["Phạm Hùng"]),
+    ("exact", "hung", []),
+    ("prefix", "pham h", ["Phạm Hà", "Phạm Hùng"]),
+    ("substring", "hung", ["Hùng Anh", "Phạm Hùng"]),
+    ("fuzzy", "pham hunh", ["Phạm Hùng"]),
+    ("fuzzy", "le lan", ["Lê Lan"]),
+])
+def test_strategy(sheet, mode, q, want):
+    sheet(ROWS)
+    assert _names(A._search(q, mode)) == want
+
+
+def test_unknown_strategy_is_400(sheet, client):
+    sheet(ROWS)
+    r = client.post("/api/search", json={"q": "pham hung", "mode": "regex"})
+    assert r.status_code == 400 and not r.get_json()["ok"]
+
+
+def test_results_newest_first_and_capped(sheet):
+    sheet([order("Phạm Hùng") for _ in range(A._SEARCH_LIMIT + 5)])
+    rows = [it["_row"] for it in A._search("pham hung")]
+    assert len(rows) == A._SEARCH_LIMIT
+    assert rows == sorted(rows, reverse=True)
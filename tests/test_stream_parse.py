@@ -0,0 +1,20 @@
+import app as A
+from conftest import HEADER, TITLE, order
+
+
+def test_load_values_consumes_matrix(sheet):
+    sheet([])
+    values = TITLE + [list(HEADER)] + [order(f"Khách {i}") for i in range(20)]
+    assert A._load_values(values, 0.0, rebuild=True)
+    assert all(row is None for row in values)  # từng dòng được thả sau khi parse
+    assert A._snapshot_stats()["items"] == 20
+    assert A._SNAP_LAST_SYNC["scanned"] == 23
+
+
+def test_iter_release_drops_rows_as_it_goes():
+    values = [[1], [2], [3]]
+    seen = []
+    for r, row in A._iter_release(values, 1):
+        seen.append((r, row, values[r]))
+    assert seen == [(1, [2], None), (2, [3], None)]
+    assert values[0] == [1]
@@ -0,0 +1,43 @@
+import app as A
+from conftest import order
+
+
+def test_suggest_prefix_newest_first(sheet, client):
+    sheet([order("Phạm Hà"), order("Phạm Hùng"), order("Lê Lan"), order("Phạm Hà")])
+    js = client.get("/api/suggest?q=pham&k=5").get_json()
+    assert js["names"] == ["Phạm Hà", "Phạm Hùng"]  # Phạm Hà có đơn mới nhất
+    assert client.get("/api/suggest?q=le l").get_json()["names"] == ["Lê Lan"]
+
+
+def test_suggest_short_prefix_and_cache_headers(sheet, client):
+    sheet([order("Phạm Hùng")])
+    r = client.get("/api/suggest?q=ph")
+    assert r.get_json()["names"] == []
+    assert "s-maxage" in r.headers["Cache-Control"]
+
+
+def test_suggest_sees_new_names_after_refresh(sheet, client):
+    ws = sheet([order("Phạm Hùng")])
+    assert client.get("/api/suggest?q=tran").get_json()["names"] == []
+    ws.values.append(order("Trần Mai"))
+    A._refresh_snapshot(force=True)
+    assert client.get("/api/suggest?q=tran").get_json()["names"] == ["Trần Mai"]
+
+
+def test_suggest_caps_names_and_needs_longer_prefix(sheet, client):
+    sheet([order(f"Phạm Khách {i}") for i in range(12)])
+    assert client.get("/api/suggest?q=pha").get_json()["names"] == []
+    assert len(client.get("/api/suggest?q=pham&k=50").get_json()["names"]) == A.SUGGEST_MAX_K == 5
+    assert b"p.length < 4" in client.get("/").data  # JS dùng đúng ngưỡng của server
+
+
+def test_suggest_is_rate_limited_with_search(sheet, client, monkeypatch):
+    sheet([order("Phạm Hùng")])
+    monkeypatch.setattr(A._SEARCH_LIMITER, "rate", 0.5)
+    monkeypatch.setattr(A._SEARCH_LIMITER, "burst", 2)
+    hdr = {"X-Forwarded-For": "203.0.113.20"}
+    codes = [client.get(f"/api/suggest?q=pham{'h' * i}", headers=hdr).status_code for i in range(3)]
+    assert codes == [200, 200, 429]
+    r = client.get("/api/suggest?q=pham", headers=hdr)
+    assert r.status_code == 429 and int(r.headers["Retry-After"]) >= 1
+    assert r.headers["Cache-Control"] == "no-store"  # CDN không được cache 429
@@ -0,0 +1,68 @@
+import types
+
+import pytest
+from werkzeug.test import Client
+
+import app as A
+from conftest import order
+
+
+def _stub_tenant(body_chunks, seen):
+    """Module shop giả: body trả theo stream, ghi lại số request đang active lúc đang stream."""
+
+    def wsgi_app(environ, start_response):
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        for chunk in body_chunks:
+            seen.append(A._TENANTS["shop"]["active"])
+            yield chunk
+
+    mod = types.SimpleNamespace(app=types.SimpleNamespace(wsgi_app=wsgi_app),
+                                _SNAP_BUILT_VERSION=0, _memory_estimate_mb=lambda: 0.0,
+                                _drop_snapshot=lambda: None)
+    return mod
+
+
+@pytest.fixture
+def shop(monkeypatch):
+    monkeypatch.setattr(A, "_TENANTS", A.OrderedDict())
+    monkeypatch.setattr(A, "_TENANT_HOSTS", {})
+    A._load_tenants('{"shop": {"sheet_id": "x", "hosts": ["shop.test"]}}')
+    yield A._TENANTS["shop"]
+
+
+def test_active_count_held_until_streamed_body_closes(shop):
+    seen = []
+    shop["mod"] = _stub_tenant([b"a", b"b", b"c"], seen)
+    c = Client(A._TenantDispatcher(A.app.wsgi_app))
+    resp = c.get("/t/shop/stream", buffered=False)
+    assert shop["active"] == 1
+    assert b"".join(resp.response) == b"abc"
+    assert seen == [1, 1, 1]  # chưa bị trừ khi đang stream -> không bị evict giữa chừng
+    resp.close()
+    assert shop["active"] == 0 and shop["requests"] == 1
+
+
+def test_memory_estimate_is_measured_from_snapshot(sheet):
+    sheet([order(f"Khách {i}", phone=f"09{i:08d}", mvd=f"SPXVN{i}") for i in range(2000)])
+    A._refresh_snapshot(force=True)
+    small = A._snapshot_bytes()
+    per_item = small / 2000
+    assert 200 < per_item < 5000
+
+    A._SHEET_WS.values.extend(order(f"Mới {i}", phone=f"08{i:08d}") for i in range(2000))
+    A._refresh_snapshot(force=True)
+    assert A._snapshot_bytes() > 1.5 * small
+    assert A._memory_estimate_mb() == round(A._snapshot_bytes() / 1048576.0, 2)
+
+
+def test_memory_estimate_survives_concurrent_resize(sheet, monkeypatch):
+    class Resizing(dict):
+        def values(self):
+            raise RuntimeError("dictionary changed size during iteration")
+
+    sheet([order("Phạm Hùng")])
+    A._refresh_snapshot(force=True)
+    before = A._snapshot_bytes()
+    cold = dict(A._HOT_TIER["cold"], mvd=Resizing(), loaded=True)  # archive đang nạp dở
+    monkeypatch.setattr(A, "_HOT_TIER", dict(A._HOT_TIER, cold=cold))
+    assert A._snapshot_bytes() == before
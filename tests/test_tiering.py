@@ -0,0 +1,102 @@
+import random
+import threading
+
+import pytest
+
+import app as A
+from conftest import order
+
+N = 2000
+
+
+@pytest.fixture
+def tiered(sheet, monkeypatch, tmp_path):
+    monkeypatch.setattr(A, "HOT_ROWS", 200)
+    monkeypatch.setattr(A, "ARCHIVE_PATH", str(tmp_path / "cold.jsonl.gz"))
+    monkeypatch.setattr(A, "_CACHE_TTL", 3600.0)
+    monkeypatch.setattr(A, "_CACHE_TTL_MIN", 3600.0)
+    ws = sheet([order(f"Khách {i}", phone=f"09{i:08d}") for i in range(N)])
+    A._refresh_snapshot(force=True)
+    yield ws
+    A._COLD_AT = 0.0
+
+
+def test_hot_rows_in_ram_old_rows_in_archive(tiered, client, monkeypatch):
+    st = A._tier_stats()
+    assert st["hot_items"] == 200 and st["cold_rows"] == N - 200
+    assert not st["cold_loaded"]
+    assert [it["_row"] for it in A._search(f"khach {N - 1}")] == [N - 1 + 3]
+    assert [it["_row"] for it in A._search("khach 5")] == [5 + 3]  # từ archive
+    assert A._tier_stats()["cold_loaded"]
+
+    monkeypatch.setattr(A, "ADMIN_TOKEN", "t")
+    js = client.get("/api/stats", headers={"X-Admin-Token": "t"}).get_json()
+    assert js["orders"] == N  # gộp cả cold
+
+
+def test_searches_stay_correct_during_full_refresh(tiered):
+    stop = threading.Event()
+    errors = []
+    checked = [0]
+
+    def reader(seed):
+        rnd = random.Random(seed)
+        while not stop.is_set():
+            i = rnd.randrange(N)
+            got = [it["_row"] for it in A._search(f"khach {i}")]
+            checked[0] += 1
+            if got != [i + 3]:
+                errors.append((i, got))
+
+    threads = [threading.Thread(target=reader, args=(s,)) for s in range(3)]
+    for t in threads:
+        t.start()
+    try:
+        for k in range(6):
+            # đơn mới vào -> ranh giới hot/cold dịch xuống, build lại từ đầu + compact lại archive
+            tiered.values.extend(order(f"Mới {k} {j}") for j in range(50))
+            A._refresh_snapshot(force=True)
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+    assert checked[0] > 0
+    assert errors == []
+
+
+def test_bloom_skips_archive_and_neg_cache_answers_repeats(tiered, monkeypatch):
+    monkeypatch.setattr(A, "_MISS_STATS", {k: 0 for k in A._MISS_STATS})
+    assert A._search("khong co ai ten nay") == []
+    st = A._miss_stats()
+    assert st["bloom_checks"] == 1 and st["bloom_rejects"] == 1 and st["cold_loads_avoided"] == 1
+    assert not A._tier_stats()["cold_loaded"]
+
+    assert A._search("khong co ai ten nay") == []
+    st = A._miss_stats()
+    assert st["neg_hits"] == 1 and st["bloom_checks"] == 1  # lần 2 không tới Bloom
+
+    # đơn mới vào -> version đổi, negative cache xoá, thấy ngay
+    tiered.values.append(order("Không Có Ai Tên Này"))
+    A._refresh_snapshot(force=True)
+    assert [it["_row"] for it in A._search("khong co ai ten nay")] == [N + 3]
+
+
+def test_stale_miss_is_not_cached_for_newer_snapshot(sheet, monkeypatch):
+    ws = sheet([order("Phạm Hùng")])
+    A._refresh_snapshot(force=True)
+    real = A._search_tier
+    fired = []
+
+    def slow_tier(q, fn, tier):
+        out = real(q, fn, tier)
+        if not fired:
+            fired.append(1)
+            # trong lúc tìm trên bản cũ: đơn mới vào + request khác đã dọn cache cho version mới
+            ws.values.append(order("Lê Lan"))
+            A._refresh_snapshot(force=True)
+            A._neg_hit(("x", "", "x"))
+        return out
+
+    monkeypatch.setattr(A, "_search_tier", slow_tier)
+    assert A._search("le lan") == []  # tìm trên snapshot cũ
+    assert [it["name_key"] for it in A._search("le lan")] == ["Lê Lan"]
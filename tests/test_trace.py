@@ -0,0 +1,62 @@
+import json
+import logging
+
+import pytest
+
+import app as A
+import replay_trace
+from conftest import HEADER, TITLE, order
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(json.loads(record.getMessage()))
+
+
+@pytest.fixture
+def trace(monkeypatch):
+    monkeypatch.setattr(A, "TRACE_SALT", b"test-salt")
+    monkeypatch.setattr(A, "TRACE_SAMPLE", 1.0)
+    log = logging.getLogger("checkdonhang.trace.test")
+    log.propagate = False
+    h = _ListHandler()
+    log.handlers = [h]
+    log.setLevel(logging.INFO)
+    monkeypatch.setattr(A, "_TRACE_LOG", log)
+    return h.lines
+
+
+def test_trace_never_logs_raw_query(trace):
+    A._trace("Phạm Hùng", {}, 200, 1, 0.0)
+    rec = trace[0]
+    assert "Phạm" not in json.dumps(rec, ensure_ascii=False)
+    assert rec["h"] == A._trace_hash("pham hung") and rec["len"] == 9
+
+
+def test_phone_and_mvd_hash_in_canonical_form(trace):
+    for q in ("0911 111 111", "+84 911 111 111", "spxvn12345", " SPXVN12345 "):
+        A._trace(q, {}, 200, 1, 0.0)
+    assert trace[0]["h"] == trace[1]["h"] == A._trace_hash("0911111111")
+    assert trace[2]["h"] == trace[3]["h"] == A._trace_hash("SPXVN12345")
+
+
+def test_replay_resolver_matches_recorded_hashes(sheet, trace):
+    sheet([])
+    A._use_values(TITLE + [list(HEADER)] + [order("Phạm Hùng", phone="+84 911 111 111", mvd="spxvn 12345")])
+    A._sync_snapshot()
+    for q in ("pham hung", "0911111111", "SPXVN12345"):
+        A._trace(q, {}, 200, 1, 0.0)
+    jobs = replay_trace.make_jobs(trace, replay_trace.build_resolver())
+    assert [j["kind"] for j in jobs] == ["resolved"] * 3
+
+
+def test_no_trace_without_salt(monkeypatch, tmp_path):
+    monkeypatch.setattr(A, "TRACE_PATH", str(tmp_path / "t.jsonl"))
+    monkeypatch.setattr(A, "TRACE_SALT", b"")
+    assert A._trace_logger() is None
+    with pytest.raises(SystemExit):
+        replay_trace.main(["x.jsonl", "--snapshot", "x.json"])
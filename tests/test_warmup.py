@@ -0,0 +1,27 @@
+import app as A
+from conftest import order
+
+
+def test_warmup_builds_snapshot_and_indexes(sheet, monkeypatch):
+    ws = sheet([order("Phạm Hùng"), order("Phạm Hà")])
+    monkeypatch.setattr(A, "_WARM_STATE", {"state": "off", "ms": None, "error": ""})
+    A._warmup()
+    assert A._WARM_STATE["state"] == "done"
+    assert A._SNAP_BUILT_VERSION >= 0
+    assert A._SUGGEST["version"] == A._SNAP_BUILT_VERSION
+    calls = ws.calls
+    assert len(A._search("pham hung")) == 1
+    assert ws.calls == calls  # request đầu tiên không phải fetch
+
+
+def test_warmup_error_is_reported(sheet, monkeypatch):
+    ws = sheet([order("Phạm Hùng")])
+    monkeypatch.setattr(A, "_WARM_STATE", {"state": "off", "ms": None, "error": ""})
+
+    def boom():
+        raise RuntimeError("không kết nối được")
+
+    ws.get_all_values = boom
+    A._warmup()
+    assert A._WARM_STATE["state"] == "error"
+    assert "kết nối" in A._WARM_STATE["error"]
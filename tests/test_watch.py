@@ -0,0 +1,77 @@
+import json
+import threading
+import time
+
+import app as A
+from conftest import order
+
+# 12 đơn đầu để dòng của khách nằm ngoài vùng quét header (sửa ở đó là refresh full)
+ROWS = [order(f"Khách {i}", phone=f"09{i:08d}") for i in range(12)] + [order("Phạm Hùng", phone="0912345678")]
+ROW = 15  # 0-based trong snapshot, = dòng 16 trên sheet
+
+
+def _watch(client, q, since, wait=0):
+    return client.get("/api/watch", query_string={"q": q, "since": since, "wait": wait}).get_json()
+
+
+def test_first_watch_resets_then_idle_returns_nothing(sheet, client):
+    sheet(ROWS)
+    js = _watch(client, "Phạm Hùng", -1)
+    assert js["reset"] and [c["row"] for c in js["changed"]] == [ROW]
+    idle = _watch(client, "pham hung", js["version"])
+    assert idle["changed"] == [] and idle["removed"] == [] and idle["version"] == js["version"]
+    # SĐT nhận: tắt mặc định như /api/search, không lộ thẻ đơn theo số điện thoại
+    assert _watch(client, "0912 345 678", -1)["changed"] == []
+
+
+def test_watch_by_phone_only_when_enabled(sheet, client, monkeypatch):
+    sheet(ROWS)
+    monkeypatch.setattr(A, "SEARCH_BY_PHONE_MVD", True)
+    assert [c["row"] for c in _watch(client, "0912 345 678", -1)["changed"]] == [ROW]
+
+
+def test_change_published_between_diff_and_wait_is_not_skipped(sheet, monkeypatch):
+    ws = sheet(ROWS)
+    qn, pk = A._watch_key("Phạm Hùng")
+    since, _ = A._watch_diff(qn, pk, -1)
+    real = A._watch_diff
+
+    def diff_then_patch(*a):
+        out = real(*a)
+        if out[1] is None and ws.values[ROW][2] == "":
+            # đơn đổi ngay sau khi xét xong, trước khi vòng chờ cập nhật since
+            ws.values[ROW] = order("Phạm Hùng", phone="0912345678", mvd="SPXVN7")
+            A._refresh_rows(ROW + 1, ROW + 1)
+        return out
+
+    monkeypatch.setattr(A, "_watch_diff", diff_then_patch)
+    version, d = A._watch_wait(qn, pk, since, 2.0)
+    assert d is not None and [c["row"] for c in d["changed"]] == [ROW] and version > since
+
+
+def test_long_poll_returns_when_the_row_changes(sheet, client):
+    ws = sheet(ROWS)
+    since = _watch(client, "Phạm Hùng", -1)["version"]
+    box = {}
+
+    def poll():
+        t0 = time.time()
+        box["js"] = _watch(A.app.test_client(), "Phạm Hùng", since, wait=10)
+        box["s"] = time.time() - t0
+
+    t = threading.Thread(target=poll)
+    t.start()
+    time.sleep(0.2)
+    ws.values[ROW] = order("Phạm Hùng", phone="0912345678", mvd="SPXVN999")
+    A._refresh_rows(ROW + 1, ROW + 1)
+    t.join(10)
+    js = box["js"]
+    assert box["s"] < 5 and not js["reset"]
+    assert [c["row"] for c in js["changed"]] == [ROW] and "SPXVN999" in json.dumps(js["changed"])
+    assert js["version"] > since
+
+    # đổi tên -> đơn không còn của khách này: báo removed
+    ws.values[ROW] = order("Lê Lan", phone="0900000000")
+    A._refresh_rows(ROW + 1, ROW + 1)
+    js2 = _watch(client, "Phạm Hùng", js["version"])
+    assert js2["changed"] == [] and js2["removed"] == [ROW]